@@ -4,8 +4,10 @@
 import serial
 import time
 import os
+import threading
 import numpy as np
 from datetime import datetime, timedelta
+import ads1256_io
 
 # Handle zoneinfo import for Python 3.9
 try:
@@ -13,7 +15,7 @@ try:
 except ImportError:
     from backports.zoneinfo import ZoneInfo
 
-VERSION = "ADS1256 log v0.3 24-May-2025 JPB"
+VERSION = "ADS1256 log v0.7 18-Oct-2026"
 
 
 def sendSer(s):
@@ -37,10 +39,14 @@ def sendSer(s):
 
 outDir = r"/home/john/Documents/source"
 
+storeMode = "csv"  # "csv": text line per packet, "npy": binary chunks (see ads1256_io.py)
+logMode = "raw"    # "raw": log every packet in storeMode, "stats": Vavg, uVstd, vMin, vMax rows
+statsWindow = 1.0  # stats mode: seconds per output row (60 = per minute, 0 = per packet)
+archiveRaw = True  # stats mode: also keep every packet in storeMode, alongside the stats log
+
 now = datetime.now()
 fstr = now.strftime("%Y%m%d-%H%M")
-logFile = ("%s_adc1256-log2.csv" % fstr)
-logPath = os.path.join(outDir, logFile)
+logStem = os.path.join(outDir, "%s_adc1256-log2" % fstr)
 port = "/dev/ttyACM2"  # Replace with your serial port
 #port = "/dev/ttyACM0"  # Replace with your serial port
 baudrate = 115200
@@ -73,12 +79,18 @@ s1 = "F8" # set sample rate to 60 Hz
 #s1 = "F3" # set sample rate to 3750 Hz
 s2 = "P6" # set PGA gain to max (PGA64)
 s3 = "Md0"  # set Mux to diff set 0 (A0,A1 pair)
-s4 = "J15"  # get binary packet with N 4-byte words
+s4 = "J15"  # binary packet with N 4-byte words (now sent by ads1256_io.start_stream)
+framed = True  # ask for "K15" packets with sync word, sequence number + CRC (falls back to J15)
 eol_str = "\n"  # end of line string in file output
 pktlen = 60  # how many bytes in binary packet
+statusEvery = 1000  # npy mode: print a status line after this many packets
+ringSlots = 4096  # packets buffered between serial reader and log writer threads
+writeBlock = 256  # max packets the writer takes from the ring at once
 
 # VREF = 2.500 volts, PGA = 64
 # voltage = ((2 * VREF) / 8388608) * raw_counts / (pow(2, PGA));
+VREF = 2.500
+PGA = 6  # PGA code as set by s2 "P6": gain = 2**PGA
 
 print (VERSION)
 
@@ -92,6 +104,97 @@ def get_next_rotation_time():
                         timedelta(days=1))
     return next_rotation
 
+def openLogs(logStem, notes):
+    """Open the log(s) for one rotation period. Returns (log, logPath, rawLog)"""
+    if logMode == "stats":
+        log = ads1256_io.StatsLog(logStem + "_stats.csv", VERSION, notes,
+                                  statsWindow, ads1256_io.volts_per_count(VREF, PGA))
+        rawLog = None
+        if archiveRaw:
+            rawLog, rawPath = ads1256_io.open_log(storeMode, logStem, VERSION,
+                                                  pktlen // 4, notes)
+            print("Archiving raw packets to: %s" % rawPath)
+        return log, log.path, rawLog
+    log, logPath = ads1256_io.open_log(storeMode, logStem, VERSION, pktlen // 4, notes)
+    return log, logPath, None
+
+def closeLogs():
+    log.close()
+    if rawLog is not None:
+        rawLog.close()
+
+def counterNote():
+    """Dropped-packet, framing and ring buffer counters, for log header and console"""
+    lost = parser.lost if parser is not None else 0
+    return ("dropped: %d (link %d, ring full %d)  ring high-water: %d/%d  %s"
+            % (lost + ring.dropped, lost, ring.dropped, ring.highWater, ring.slots,
+               parser.note() if parser is not None else ""))
+
+def serialReader():
+    """Reader thread: only moves packets from the serial port into the ring"""
+    try:
+        while not stopEvent.is_set():
+            inbuf = ser.read(max(1, ser.in_waiting))  # large reads, framing sorts out boundaries
+            epoch = time.time()
+            for pkt in parser.feed(inbuf):
+                ring.put(pkt, epoch)
+    except Exception as e:
+        print(f"Reader error: {e}")
+    finally:
+        stopEvent.set()
+
+def logWriter():
+    """Writer thread: formats, writes and rotates the log file"""
+    global log, logPath, rawLog
+    try:
+        next_rotation = get_next_rotation_time()
+        pktCount = 0
+        draining = False
+        while True:
+            if not draining and stopEvent.is_set():
+                reader.join(timeout=2)  # no new packets, then empty the ring before exiting
+                draining = True
+            now = datetime.now(ZoneInfo("America/Los_Angeles"))
+
+            # Check if it's time to rotate
+            if not draining and now >= next_rotation:
+                closeLogs()
+                print(f"Log file {logPath} closed at rotation time. {counterNote()}")
+
+                # Create new log file
+                fstr = now.strftime("%Y%m%d-%H%M")
+                logStem = os.path.join(outDir, f"{fstr}_adc1256-log2")
+                log, logPath, rawLog = openLogs(logStem, [counterNote()])
+                print(f"New log file opened: {logPath}")
+
+                # Calculate next rotation time
+                next_rotation = get_next_rotation_time()
+
+            epochs, pkts = ring.get(writeBlock, timeout=0 if draining else 0.5)
+            if len(epochs) == 0:
+                if draining:
+                    break
+                continue
+            if rawLog is not None:
+                rawLog.write_block(epochs, pkts)
+            lines = log.write_block(epochs, pkts)  # CSV / stats lines, or empty in binary mode
+            for outbuf in lines:
+                print (outbuf)
+            if (pktCount // statusEvery) != ((pktCount + len(epochs)) // statusEvery):
+                if not lines:
+                    print("%.2f packets: %d  %s" % (epochs[-1], pktCount + len(epochs),
+                                                    counterNote()))
+            pktCount += len(epochs)
+    except Exception as e:
+        print(f"Writer error: {e}")
+    finally:
+        stopEvent.set()
+
+ring = ads1256_io.PacketRing(ringSlots, pktlen)
+parser = None                 # FrameParser, set once the packet stream is started
+rawLog = None                 # stats mode: raw packet archive
+stopEvent = threading.Event()
+
 try:
     # Open the serial port
     ser = serial.Serial(port, baudrate, timeout=timeout)
@@ -116,60 +219,33 @@ try:
     sendSer(s2)    
     sendSer(s3)    
 
-    f = open(logPath, 'a')  # open log file    
-    f.write ("epoch_time, Vavg, uVstd, vMin, vMax\n")
-    f.write ("# %s\n" % VERSION)
+    parser = ads1256_io.start_stream(ser, pktlen // 4, framed)
+    log, logPath, rawLog = openLogs(logStem, [counterNote()])
     print("Writing to logfile: %s" % logPath)
-
-    ser.write(s4.encode())
     print("Starting run")
 
+    reader = threading.Thread(target=serialReader, daemon=True)
+    writer = threading.Thread(target=logWriter, daemon=True)
+    reader.start()
+    writer.start()
+    while not stopEvent.is_set():  # main thread just waits for Ctrl-C or a thread error
+        stopEvent.wait(1.0)
 
-    next_rotation = get_next_rotation_time()
-    while True:
-        now = datetime.now(ZoneInfo("America/Los_Angeles"))
-        
-        # Check if it's time to rotate
-        if now >= next_rotation:
-            f.close()
-            print(f"Log file {logPath} closed at rotation time")
-            
-            # Create new log file
-            fstr = now.strftime("%Y%m%d-%H%M")
-            logFile = f"{fstr}_adc1256-log2.csv"
-            logPath = os.path.join(outDir, logFile)
-            f = open(logPath, 'a')
-            f.write("epoch_time, Vavg, uVstd, vMin, vMax\n")
-            f.write(f"# {VERSION}\n")
-            print(f"New log file opened: {logPath}")
-            
-            # Calculate next rotation time
-            next_rotation = get_next_rotation_time()
-
-        inbuf = ser.read(pktlen)
-        byteCount = len(inbuf)
-        if (byteCount != pktlen):  # skip if not enough bytes read
-            continue
-
-        wordBufB = np.frombuffer(inbuf, dtype=np.int32)   # Convert raw bytes to 32-bit integers
-        wordBuf = wordBufB.byteswap()                     # Swap byte order for endianness
-        epoch = time.time()                               # Get current Unix timestamp
-        wordString = ",".join(map(str, wordBuf))          # Convert integers to comma-separated string
-        outbuf = ("%.2f" % epoch) + ', ' + wordString     # Add timestamp to start of string
-        print (outbuf)
-        f.write (outbuf)
-        f.write (eol_str)
-
-     
-
+except KeyboardInterrupt:
+    print("\nStopping. %s" % counterNote())
 except serial.SerialException as e:
     print(f"Error: {e}")
 except Exception as e:
     print(f"Error: {e}")
 
 finally:
-    if 'f' in locals() and not f.closed:
-        f.close
+    stopEvent.set()
+    if 'writer' in locals():
+        writer.join(timeout=10)  # let the writer drain the ring
+    if 'writer' in locals() and writer.is_alive():
+        print("Writer still busy, log file %s left open" % logPath)
+    elif 'log' in locals():
+        closeLogs()
         print("Log file %s closed" % logPath)
     if 'ser' in locals() and ser.is_open:
         ser.close()
@@ -5,8 +5,10 @@ import serial
 import time
 import os
 import numpy as np
+from datetime import datetime
+import ads1256_io
 
-VERSION = "ADS1256 log v0.2 22-Mar-2025 JPB"
+VERSION = "ADS1256 log v0.4 18-Oct-2026"
 
 
 def sendSer(s):
@@ -23,6 +25,7 @@ def sendSer(s):
 outDir = r"/home/john/Documents/source"
 logFile = "adc1256-log.csv"
 logPath = os.path.join(outDir, logFile)
+storeMode = "csv"  # "csv": text line per packet, "npy": binary chunks (see ads1256_io.py)
 #port = "/dev/ttyACM2"  # Replace with your serial port
 port = "/dev/ttyACM0"  # Replace with your serial port
 baudrate = 115200
@@ -55,9 +58,11 @@ s1 = "F10" # set sample rate to 30 Hz
 #s1 = "F3" # set sample rate to 3750 Hz
 s2 = "P6" # set PGA gain to max (PGA64)
 s3 = "Md0"  # set Mux to diff set 0 (A0,A1 pair)
-s4 = "J15"  # get binary packet with N 4-byte words
+s4 = "J15"  # binary packet with N 4-byte words (now sent by ads1256_io.start_stream)
+framed = True  # ask for "K15" packets with sync word, sequence number + CRC (falls back to J15)
 eol_str = "\n"  # end of line string in file output
 pktlen = 60  # how many bytes in binary packet
+statusEvery = 1000  # npy mode: print a status line after this many packets
 
 # VREF = 2.500 volts, PGA = 64
 # voltage = ((2 * VREF) / 8388608) * raw_counts / (pow(2, PGA));
@@ -80,33 +85,35 @@ try:
     sendSer(s2)    
     sendSer(s3)    
 
-    f = open(logPath, 'a')  # open log file    
-    f.write ("epoch_time, Vavg, uVstd, vMin, vMax\n")
-    f.write ("# %s" % VERSION)
+    if storeMode == "npy":  # binary chunks can't be appended to, so give each run its own name
+        fstr = datetime.now().strftime("%Y%m%d-%H%M")
+        stem = os.path.join(outDir, "%s_adc1256-log" % fstr)
+    else:
+        stem = os.path.splitext(logPath)[0]
+    log, logPath = ads1256_io.open_log(storeMode, stem, VERSION, pktlen // 4)
+    print("Writing to logfile: %s" % logPath)
 
-    ser.write(s4.encode())
+    parser = ads1256_io.start_stream(ser, pktlen // 4, framed)
     print("Starting run")
 
 
+    pktCount = 0
     while True:
-        inbuf = ser.read(pktlen)
-        byteCount = len(inbuf)
-        if (byteCount != pktlen):
-            continue
+        inbuf = ser.read(max(1, ser.in_waiting))  # whatever has arrived, packet boundaries or not
+        epoch = time.time()         
 
         #hex_list = ['{:02x} '.format(byte) for byte in inbuf]
         #hex_string = ''.join(hex_list)
         #print(hex_string)
         #continue
 
-        wordBufB = np.frombuffer(inbuf, dtype=np.int32)
-        wordBuf = wordBufB.byteswap()
-        epoch = time.time()         
-        wordString = ",".join(map(str, wordBuf))
-        outbuf = ("%.2f" % epoch) + ', ' + wordString # assemble output string
-        print (outbuf)
-        f.write (outbuf)
-        f.write (eol_str)
+        for pkt in parser.feed(inbuf):
+            outbuf = log.write(epoch, pkt)  # CSV line, or None in binary mode
+            pktCount += 1
+            if outbuf is not None:
+                print (outbuf)
+            elif (pktCount % statusEvery) == 0:
+                print("%.2f %s" % (epoch, parser.note()))
 
      
 
@@ -116,7 +123,11 @@ except Exception as e:
     print(f"Error: {e}")
 
 finally:
-    f.close
+    if 'parser' in locals():
+        print(parser.note())
+    if 'log' in locals():
+        log.close()
+        print("Log file %s closed" % logPath)
     if 'ser' in locals() and ser.is_open:
         ser.close()
         print("Serial port closed")
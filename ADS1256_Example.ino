@@ -68,6 +68,21 @@ int registerToRead = 0; //Register number to be read
 int registerToWrite = 0; //Register number to be written
 int registerValueToWrite = 0; //Value to be written in the selected register
 
+// CRC-16/XMODEM (poly 0x1021, init 0), same as Python binascii.crc_hqx(data, 0)
+uint16_t crc16(const byte *data, int len)
+{
+  uint16_t crc = 0;
+  for (int i = 0; i < len; i++)
+  {
+    crc ^= ((uint16_t) data[i]) << 8;
+    for (int b = 0; b < 8; b++)
+    {
+      crc = (crc & 0x8000) ? ((crc << 1) ^ 0x1021) : (crc << 1);
+    }
+  }
+  return crc;
+}
+
 void setup()
 {
   Serial.begin(115200); //The value does not matter if you use an MCU with native USB
@@ -227,6 +242,48 @@ void loop()
         }
         A.stopConversion();
         break;
+      //--------------------------------------------------------------------------------------------------------
+      case 'K': //Like J, but framed: A5 5A, 16-bit sequence number, N words, CRC16 (K15 = 15-word packet, 66 bytes)
+        {
+          while (!Serial.available());
+          int sampleCount = Serial.parseInt(); // Parse the number of words per packet
+          if (sampleCount > 254) sampleCount = 254;  // frame must fit in buf[]
+          long last;         // previous value
+          int p;
+          int32_t value;     // number to write to output
+          uint16_t seq = 0;  // packet sequence number, lets the receiver count lost packets
+          uint16_t crc;
+          int dataEnd = 4 + 4*sampleCount;
+          buf[0] = 0xA5;     // sync word
+          buf[1] = 0x5A;
+          while (Serial.read() != 's') // stopped by a character from the serial port
+          {
+              buf[2] = (byte) (seq >> 8);
+              buf[3] = (byte) seq;
+              for (int i=0;i<sampleCount;i++) {
+                p = 4 + 4*i;
+                int32_t raw = A.readSingleContinuous();  // analog reading in raw counts
+                if (i==0) {
+                  value = raw;
+                } else {
+                  value = raw - last;
+                }
+                last = raw;
+                buf[p] = (byte) (value >> 24);   // convert 4-byte long into separate bytes
+                buf[p+1] = (byte) (value >> 16);
+                buf[p+2] = (byte) (value >> 8);
+                buf[p+3] = (byte) value;
+                delayMicroseconds(50);  // annoying extra delay needed for DRDY line to return inactive
+              }
+              crc = crc16(&buf[2], dataEnd - 2);  // covers sequence number and data words
+              buf[dataEnd] = (byte) (crc >> 8);
+              buf[dataEnd+1] = (byte) crc;
+              Serial.write(buf, dataEnd + 2);   // send the framed packet
+              seq++;
+          }
+        }
+        A.stopConversion();
+        break;
 
       //--------------------------------------------------------------------------------------------------------
       case 'C': //Cycle single ended inputs (A0+GND, A1+GND ... A7+GND)
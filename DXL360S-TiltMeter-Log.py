@@ -9,6 +9,7 @@
 
 from serial import *
 import time, datetime, os, sys
+from logwriter import LogWriter
 
 LOGDIR = "/home/john/Documents/Spectrometer"
 LOGFILE = "AngleLog.csv"
@@ -28,7 +29,7 @@ dstring = datetime.datetime.today().strftime('%Y-%m-%d_%H%M%S_')
 
 fnameout = os.path.join(LOGDIR, (dstring+LOGFILE))
 print("Writing data to %s" % fnameout)
-f = open(fnameout, 'w')  # open log file
+f = LogWriter(fnameout, 'w', flush_lines=50, max_latency=60)  # open log file
 print("%s" % VERSION)
 print("%s" % CSV_HEADER)
 f.write ("%s\n" % CSV_HEADER)
@@ -90,9 +91,7 @@ while True:
         f.write (outbuf)
         f.write (eol_str)
         lines += 1
-        if (lines % 50 == 0):  # save it out to actual file, every so often
-            f.flush()
 
 
-f.close                  # close log file
+f.close()                # close log file
 ser.close()            # close serial port when done. If we ever are...
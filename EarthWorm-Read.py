@@ -2,47 +2,228 @@
 
 # ObsPy code to get data from Earthworm waveserver on BBShark+RPi
 # 2020-Dec-23 J.Beale
+#
+# Incremental version: "sync" fetches only data newer than what is already in
+# the local archive, for every NSLC (net.sta.loc.chan) the waveserver lists.
+# The last archived time per NSLC is kept in a JSON state file. New data is
+# requested in bounded chunks, several at a time, and appended in order to
+# day files of a MiniSEED archive in SDS layout:
+#    archive/YEAR/NET/STA/CHAN.D/NET.STA.LOC.CHAN.D.YEAR.DAY
+# "export" writes the last `hours` from the archive, without contacting the
+# server, one file per trace (gap-free segment) in the chosen format:
+#    csv    text, same format as before (slow: np.savetxt)
+#    mseed  MiniSEED via obspy (raw counts, lossless)
+#    f32    raw little-endian float32 + .json sidecar with the trace metadata
+#    mat    Matlab .mat via scipy savemat
+# "bench" times each format on a synthetic trace of `hours` at 100 Hz.
+#
+# Usage: EarthWorm-Read.py [sync | export | both | bench] [hours] [format]   (default: both)
 
 from obspy.clients.earthworm import Client
+from obspy.clients.filesystem.sds import Client as SDSClient
 import obspy
 from scipy.io import savemat   # for export to Matlab format file
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
 import sys            # for writing file
+import tempfile
+import time
 import numpy as np    # for writing
 # ------------------------------------------------------------------
 
 hours = 2  # how many hours of data to export into CSV file
 calibration = 1.0   # multiply data by this scale factor
 
-client = Client("192.168.1.227", 16022) # IP and port of EW server
-response = client.get_availability('*', '*', channel='EHZ')
-print(response)
-  
-tStart = response[0][4]      # date/time of beginning of data record
-tEnd = response[0][5]        # date/time of end of data record
-StationName = response[0][1] # eg. 'SHARK'
+server = ("192.168.1.227", 16022)   # IP and port of EW server
+channel = 'EHZ'                      # channel(s) to sync, wildcards allowed
+archive = "EW-archive"               # local MiniSEED archive (SDS layout)
+stateFile = os.path.join(archive, "sync-state.json")
+chunkSecs = 10*60       # request at most this much data at a time
+workers = 4             # parallel requests to the waveserver
+firstHours = hours      # first sync of a new NSLC goes back at most this far
+exportFormat = "csv"    # csv, mseed, f32, mat
 
-dur = 60*60*hours  # 60 seconds * 60 minutes * hours
+# ------------------------------------------------------------------
+
+def load_state():
+    if not os.path.exists(stateFile):
+        return {}
+    with open(stateFile) as f:
+        return json.load(f)
+
+def save_state(state):
+    tmp = stateFile + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, stateFile)       # never leave a half-written state file
 
-winEnd = tEnd  # fixed end time
-winStart = tEnd - dur
+def day_file(tr):
+    s = tr.stats
+    t = s.starttime
+    d = os.path.join(archive, "%d" % t.year, s.network, s.station, s.channel + ".D")
+    os.makedirs(d, exist_ok=True)
+    return os.path.join(d, "%s.%s.%s.%s.D.%d.%03d" % (s.network, s.station, s.location,
+                                                   s.channel, t.year, t.julday))
 
-print("Requesting " + str(winStart) + " - " + str(winEnd))
+def append_archive(st):
+    "Append traces to the archive day files, split at midnight."
+    for tr in st:
+        t = tr.stats.starttime
+        while t <= tr.stats.endtime:
+            midnight = obspy.UTCDateTime(t.year, t.month, t.day) + 86400
+            part = tr.slice(t, midnight - tr.stats.delta/2, nearest_sample=False)
+            if part.stats.npts > 0:
+                with open(day_file(part), "ab") as f:
+                    part.write(f, format="MSEED")
+            t = midnight
 
-startStr = str(winStart)
-fname = startStr[0:13]+startStr[14:16]+"_"+StationName+".csv"
+def fetch(nslc, t0, t1):
+    "One chunk [t0, t1): samples from t0 up to but not including t1."
+    net, sta, loc, cha = nslc.split(".")
+    client = Client(*server)         # one connection per thread
+    st = client.get_waveforms(net, sta, loc, cha, t0, t1)
+    st.merge()
+    for tr in st:
+        half = tr.stats.delta / 2
+        tr.trim(t0 - half, t1 - half, nearest_sample=False)   # each sample in exactly one chunk
+    return obspy.Stream([tr for tr in st if tr.stats.npts > 0])
 
-# Specify: network, station, location, channel, startTime, endTime
-st = client.get_waveforms('PA', 'SHARK', '00', 'EHZ', winStart, winEnd)
-print(st)
+def sync():
+    "Fetch everything new since the last run into the archive."
+    os.makedirs(archive, exist_ok=True)
+    state = load_state()
+    client = Client(*server)
+    response = client.get_availability('*', '*', channel=channel)
+    print(response)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for net, sta, loc, cha, tStart, tEnd in response:
+            loc = "" if loc == "--" else loc
+            nslc = "%s.%s.%s.%s" % (net, sta, loc, cha)
+            if nslc in state:
+                t = obspy.UTCDateTime(state[nslc])
+            else:
+                t = max(tStart, tEnd - 3600*firstHours)
+            if t >= tEnd:
+                print("%s: up to date (%s)" % (nslc, t))
+                continue
+            n = int(np.ceil((tEnd - t) / chunkSecs))
+            edges = [t + i*chunkSecs for i in range(n)] + [tEnd]
+            print("%s: requesting %s - %s in %d chunks" % (nslc, t, tEnd, len(edges) - 1))
+            jobs = [pool.submit(fetch, nslc, a, b) for a, b in zip(edges[:-1], edges[1:])]
+            npts = 0
+            for (a, b), job in zip(zip(edges[:-1], edges[1:]), jobs):
+                try:
+                    st = job.result()
+                except Exception as e:        # stop here, retry from this chunk next run
+                    print("%s: %s - %s failed: %s" % (nslc, a, b, e))
+                    for j in jobs:            # don't fetch chunks whose results would be dropped
+                        j.cancel()
+                    break
+                if len(st) == 0:
+                    print("%s: no data %s - %s" % (nslc, a, b))
+                append_archive(st)
+                npts += sum(tr.stats.npts for tr in st)
+                state[nslc] = str(b)
+                save_state(state)
+            print("%s: %d samples archived, now at %s" % (nslc, npts, state.get(nslc)))
 
-print("Writing %s\n" % fname)    # DEBUG verbose show filename
-for i, tr in enumerate(st):
+def export_name(tr):
+    "File name (without extension) for one exported trace."
+    startStr = str(tr.stats.starttime)
+    return startStr[0:13]+startStr[14:16]+"_"+tr.stats.station+"."+tr.stats.channel
+
+def write_csv(tr, base):
+    fname = base + ".csv"
     f = open("%s" % fname, "w")
-    f.write("%s\n" % StationName)
+    f.write("%s\n" % tr.stats.station)
     f.write("# STATION %s\n" % (tr.stats.station))
     f.write("# CHANNEL %s\n" % (tr.stats.channel))
-    f.write("# START_TIME %s\n" % (str(winStart)))
+    f.write("# START_TIME %s\n" % (str(tr.stats.starttime)))
     f.write("# SAMP_FREQ %f\n" % (tr.stats.sampling_rate))
     f.write("# NDAT %d\n" % (tr.stats.npts))
     np.savetxt(f, tr.data * calibration, fmt="%6.0f")
-    f.close()  
+    f.close()
+    return fname
+
+def write_mseed(tr, base):
+    fname = base + ".mseed"
+    if calibration != 1.0:
+        tr = tr.copy()
+        tr.data = (tr.data * calibration).astype(np.float32)
+    tr.write(fname, format="MSEED")
+    return fname
+
+def write_f32(tr, base):
+    fname = base + ".f32"
+    (tr.data * calibration).astype("<f4").tofile(fname)
+    s = tr.stats
+    meta = {"network": s.network, "station": s.station, "location": s.location,
+            "channel": s.channel, "starttime": str(s.starttime),
+            "sampling_rate": s.sampling_rate, "npts": int(s.npts),
+            "calibration": calibration, "dtype": "<f4", "data_file": os.path.basename(fname)}
+    with open(base + ".json", "w") as f:
+        json.dump(meta, f, indent=1)
+    return fname
+
+def write_mat(tr, base):
+    fname = base + ".mat"
+    s = tr.stats
+    savemat(fname, {"data": tr.data * calibration, "fs": s.sampling_rate,
+                    "starttime": str(s.starttime), "station": s.station,
+                    "channel": s.channel, "nslc": tr.id}, do_compression=False)
+    return fname
+
+WRITERS = {"csv": write_csv, "mseed": write_mseed, "f32": write_f32, "mat": write_mat}
+
+def export(hours=hours, fmt=exportFormat):
+    "Write the last `hours` of each archived NSLC, one file per trace."
+    write = WRITERS[fmt]
+    state = load_state()
+    sds = SDSClient(archive)
+    for nslc, tLast in sorted(state.items()):
+        net, sta, loc, cha = nslc.split(".")
+        winEnd = obspy.UTCDateTime(tLast)
+        winStart = winEnd - 60*60*hours
+        st = sds.get_waveforms(net, sta, loc, cha, winStart, winEnd)
+        st.merge()
+        st = st.split()                  # one file per gap-free segment
+        if len(st) == 0:
+            print("%s: no archived data %s - %s" % (nslc, winStart, winEnd))
+            continue
+        for tr in st:
+            fname = write(tr, export_name(tr))
+            print("Wrote %s (%d samples)" % (fname, tr.stats.npts))
+
+def benchmark(hours=hours):
+    "Time every export format on a synthetic 100 Hz trace."
+    rng = np.random.default_rng(0)
+    npts = int(hours * 3600 * 100)
+    tr = obspy.Trace((rng.normal(0, 2000, npts)).astype(np.int32))
+    tr.stats.update(dict(network="PA", station="SHARK", location="00", channel="EHZ",
+                         sampling_rate=100.0, starttime=obspy.UTCDateTime()))
+    print("%g hours, %d samples" % (hours, npts))
+    print("format   seconds   MB     Msamples/s  speedup")
+    with tempfile.TemporaryDirectory() as d:
+        base = os.path.join(d, "bench")
+        tText = None
+        for fmt, write in WRITERS.items():
+            t0 = time.perf_counter()
+            fname = write(tr, base)
+            dt = time.perf_counter() - t0
+            tText = tText or dt            # csv (the old path) is first
+            print("%-7s %8.3f %6.1f %10.2f %8.1fx" % (fmt, dt, os.path.getsize(fname)/1e6,
+                                                     npts/dt/1e6, tText/dt))
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "both"
+    if len(sys.argv) > 2:
+        hours = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        exportFormat = sys.argv[3]
+    if mode == "bench":
+        benchmark(hours)
+    if mode in ("sync", "both"):
+        sync()
+    if mode in ("export", "both"):
+        export(hours, exportFormat)
@@ -3,6 +3,7 @@
 # tested with Python 3.6.5 (default, Apr  1 2018, 05:46:30) 
 import serial, datetime, time
 import termios  # strange USB serial vodoo
+from logwriter import LogWriter
 
 path = "/home/pi/FMES/"    # path to log file
 
@@ -12,15 +13,15 @@ device='/dev/ttyUSB0'      # USB-serial device
 baudrate=115200             # serial device baud rate
 
 FLIM = 100  # flush buffer after writing this many lines
+FSEC = 60   # ... or when the oldest unwritten line is this many seconds old
 
 # time.sleep(45)  # when run at bootup, delay to make sure network time has been set
 
 t = datetime.datetime.utcnow()
 ts = t.strftime("%y%m%d_%H%M%S")         # for example: 190516_183009
 fname = path + ts + "_FMES.csv"          # data log filename with start date/time
-f = open(fname, 'w')                        # open log file
+f = LogWriter(fname, 'w', flush_lines=FLIM, max_latency=FSEC)  # open log file
 
-fctr = FLIM - 5  # saved-line counter (flush buffer after FLIM lines, except at start)
 pctr = 5  # sample decimation counter 
 firstline = 1  # have not yet finished the first line
 
@@ -55,8 +56,4 @@ with serial.Serial(device, baudrate, timeout=1) as ser:
         oldm=m
 
       f.write("\n")
-      fctr += 1
-      if (fctr > FLIM):
-        f.flush()
-        fctr = 0
       # print(s,end='')
@@ -5,12 +5,14 @@
 from smbus import SMBus
 from time import sleep
 import datetime    # for time of day datestamp
+from logwriter import LogWriter
 # ---------------------
 
 path = "/home/pi/FMES/"    # path to log file
 tInt = 2.0                 # sampling interval in seconds (1 set of 4 channels)
 
 fInterval = 100            # how many lines to write before flushing to filesystem
+fLatency = 300             # ... or seconds before the oldest unwritten line is flushed
 eol = "\n"           # end of line string in file output
 sep = ","            # separator between data elements on one CSV line
 # ----------------------------
@@ -65,7 +67,7 @@ def getadreading(address,adcConfig):
 t = datetime.datetime.utcnow()
 tsUTC = t.strftime("%y%m%d_%H%M%S")  # for example: 190516_183009
 fname = path + tsUTC + "_3MCP.csv"          # data log filename with start date/time
-f = open(fname, 'w')                 # open log file
+f = LogWriter(fname, 'w', flush_lines=fInterval, max_latency=fLatency)  # open log file
 
 f.write("Vtilt, Vc1, Vc2, degC, sec" + eol)
 f.write("# FMES Seismometer AUX channels: MCP3424 4-Ch ADC log v0.2" + eol)
@@ -74,8 +76,6 @@ f.write("# Start: " + str(t) + " UTC" + eol)
 # restart ADC conversion + read prev result which is junk because previous settings unknown
 junk = getadreading(adc_address, channels[0]) # I2C address, config register with channel #
 
-linecount = fInterval-5   # number of lines written to output file
-
 while ( True ):
   # sleep(1/3.75) # MCP3424: 3.75 samples per second at 18 bit resolution
   sleep(tInterval - 3*tacq) # MCP3424: 3.75 samples per second at 18 bit resolution
@@ -92,8 +92,3 @@ while ( True ):
   for i in range(0,cnum):
     f.write( "{:+.{}f}".format( scalefac[i] * raw[i], 4 ) + sep)  # each ADC channel reading
   f.write( "{0:.3f}".format(sectime) + eol )  # ADC read started, second of the UTC minute [0...60)
-
-  linecount += 1
-  if (linecount > fInterval):
-    f.flush()
-    linecount = 0
@@ -6,6 +6,7 @@
 import serial, time
 from datetime import datetime
 import subprocess                # to execute external shell script
+from logwriter import LogWriter
 
  
 #SERPORT = "/dev/ttyUSB0" # input serial port
@@ -41,7 +42,8 @@ except Exception as e:
     print ("error open serial port: " + str(e))
     exit()
 
-with open(logFilePath, 'a') as fLog:  # append to logfile, if exists
+# data is occasional but time-sensitive: write out within 10 seconds
+with LogWriter(logFilePath, 'a', flush_lines=None, max_latency=10) as fLog:  # append to logfile, if exists
 
   if ser.isOpen():
     try:
@@ -92,7 +94,6 @@ with open(logFilePath, 'a') as fLog:  # append to logfile, if exists
           print("%s" % (recLine), end="")
           #fLog.write("%.3f, %s" % (unixTime,recLine))
           fLog.write("%s" % (recLine))
-          #fLog.flush()                              # data is occasional but time-sensitive
 
           
 
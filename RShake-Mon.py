@@ -1,116 +1,200 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
-# Print out data stream from 50 Hz single-channel Raspberry Shake
+# Print out data stream from a Raspberry Shake, RMS energy in 3 bands
 # J.Beale 07-April-2018
 # See also: https://manual.raspberryshake.org/udp.html#udp
 # https://groups.google.com/forum/#!topic/raspberryshake/vZOybDRDpHw
+#
+# Python 3 version: each UDP datagram  {'EHZ', 1587340800.120, 12, -3, ...}
+# is parsed into a numpy array, with sample times from the packet header.
+# Any number of channels (EHZ, ENx, HDF ...) at any sample rate. Bands are
+# real IIR filters (Butterworth, state carried between packets) instead of
+# averaging by 10; each channel keeps a short ring (deque) of per-second
+# sums of squares per band, and the RMS windows are taken from it:
+#   HP  = 2.5 - 25 Hz   RMS over the last 2 s
+#   LP  = 0.5 - 2.5 Hz  RMS over the last 2 s
+#   LLP = 0.05 - 0.5 Hz RMS over the last 20 s
+# printed once per second of data time, per channel. Missing, duplicate
+# and late packets are reported as "#" lines, nothing is padded.
 
 import socket as s
-import math, time
+import sys
+import time
+from collections import deque
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+VERSION = "RShake-Mon v2.0 18-Oct-2026"
 
 host = ""                   # can be blank for localhost
 port = 8888                             # Port to bind to
-sock = s.socket(s.AF_INET, s.SOCK_DGRAM | s.SO_REUSEADDR)
-sock.bind((host, port))     # connect to this socket
-
-def plist( list ):
-  "Print out elements of list, one per line"
-  for elem in list:
-    print elem
-
-# from http://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
-# standard deviation is square-root of variance
-def variance( dat ):
-  "Calculate variance of elements"
-  n = int(0)
-  mean= float(0)
-  m2 = float(0)
-  for elem in dat:
-    x = float(elem)
-    n += 1
-    delta = x - mean
-    mean += delta/n
-    m2 += (delta * (x - mean))
-  var = ( m2/(n-1) )
-  return (var,mean)
-
-def avg10( elems ):
-  "Return new list 1/10 size, each elem avg of 10 elements input"
-  i = int(0)
-  j = int(0)
-  sum = float(0.0)
-  ret = [float(0)] * 10
-  for e in elems:
-    i += 1
-    sum += float(e)
-    if (i == 10):
-      ret[j] = sum/10
-      i = 0
-      j += 1
-      sum = 0.0
-  return ret
-
-def ps( elems ):
-  "Print out RMS energy in 3 frequency bands"
-  global LPbuf    # circular buffer of 1-second averages
-  global LPidx
-  global LPelems
-  n = len(elems)
-  if (n != 100):  # all input should always have 100 elements
-    print("# ERROR: n= %d" % n)
-
-  (LPsq,mean) = variance(avg10(elems))  # low-pass 0.5-2.5 Hz
-  (APsq,mean2) =  variance(elems)       # all-pass 0.5-25 Hz
-  HP = math.sqrt(abs(APsq - LPsq))   # high-pass 2.5-25 Hz
-  LP = math.sqrt(LPsq)
-  LPbuf[LPidx] = mean
-  LPidx += 1           # crank handle on circular buffer
-  if LPidx == LPelems:
-    LPidx = 0  
-  (LLPvar, mean3) = variance(LPbuf)
-  LLP = math.sqrt( LLPvar ) # low-low-pass: 0.05 - 0.5 Hz
-  print("%.1f, %.1f, %.2f" % (HP,LP,LLP ) )
 
-# --------------------------------------------------------------------
-def force50( L ):        # crop or extend L so it contains exactly 50 elements
-    Lmiss = 50 - len(L)
-    if (Lmiss > 0):      # if less than 50 elements, extend last element through 50
-      for i in range(0, Lmiss):
-        L.append(L[-1])    # add on copy of last element
-    if (Lmiss < 0):      # if more than 50 elements, crop off any beyond 50
-      L = L[0:50]        # crop off excess elements 
-    return L
+BANDS = [("HP", 2.5, 25.0, 2),     # name, low Hz, high Hz, RMS window (s)
+         ("LP", 0.5, 2.5, 2),
+         ("LLP", 0.05, 0.5, 20)]
+ORDER = 2                   # Butterworth order (per band edge)
+LATE_SECS = 2.0             # warn if a packet arrives this long after its last sample
+FS = {}                     # fixed sample rate per channel, eg. {"EHZ": 100}; others are measured
 
 # --------------------------------------------------------------------
-def get50( sock ):                      # get exactly 50 elements of data from R-Shake
-    data, addr = sock.recvfrom(1024)    # wait to receive data from R-Shake
-    LL = data.translate(None, '{}').split(",") # remove brackets, separate elements
-    L = force50( LL[2:] )               # force list to have exactly 50 elements
-    return L
+def parse_packet(data):
+  "Parse one datagram. Returns (channel, epoch of first sample, int samples)."
+  text = data.decode("ascii", errors="ignore").strip().strip("{}")
+  fields = text.split(",")
+  channel = fields[0].strip().strip("'\"")
+  t0 = float(fields[1])
+  samples = np.array(fields[2:], dtype=np.float64).astype(np.int64)
+  return channel, t0, samples
+
+def guess_rate(n, dt):
+  "Sample rate from a packet of n samples starting dt seconds after the previous one."
+  fs = n / dt
+  for r in (50.0, 100.0, 200.0, 250.0, 500.0):    # rates a Shake actually uses
+    if abs(fs - r) < 0.1 * r:
+      return r
+  return round(fs)
+
+class Channel:
+  "Filters, per-second band energies and packet bookkeeping for one channel."
+  def __init__(self, name, fs, t0, x0):
+    self.name = name
+    self.fs = fs
+    nyq = 0.5 * fs
+    self.sos = []
+    for band, lo, hi, win in BANDS:
+      if hi >= 0.95 * nyq:       # band reaches Nyquist: high-pass only
+        self.sos.append(butter(ORDER, lo, btype="highpass", fs=fs, output="sos"))
+      else:
+        self.sos.append(butter(ORDER, [lo, hi], btype="bandpass", fs=fs, output="sos"))
+    self.reset(x0)
+    self.hist = [deque(maxlen=win) for band, lo, hi, win in BANDS]  # per-second (sum sq, n)
+    self.sec = int(np.floor(t0))   # data second being accumulated
+    self.acc = np.zeros(len(BANDS))
+    self.nacc = 0
+    self.tNext = None              # expected time of next packet's first sample
+    self.packets = 0
+    self.gaps = 0
+    self.missing = 0               # samples lost in gaps
+    self.dups = 0                  # packets overlapping data already seen
+    self.late = 0
+    self.maxLatency = 0.0
+
+  def reset(self, x0):
+    "Start the filters in steady state at level x0 (startup, after a gap)."
+    self.zi = [sosfilt_zi(sos) * x0 for sos in self.sos]
+
+  def add(self, t0, x, arrival):
+    "One packet. Returns list of output lines."
+    out = []
+    n = len(x)
+    dt = 1.0 / self.fs
+    if self.tNext is not None:
+      err = t0 - self.tNext
+      if err > 0.5 * dt:
+        lost = int(round(err * self.fs))
+        self.gaps += 1
+        self.missing += lost
+        out.append("# %s gap: %d samples (%.2f s) missing before %.3f" % (self.name, lost, err, t0))
+        self.reset(x[0])
+      elif err < -0.5 * dt:
+        self.dups += 1
+        out.append("# %s duplicate/out of order packet at %.3f (expected %.3f), dropped"
+                   % (self.name, t0, self.tNext))
+        return out
+    self.packets += 1
+    self.tNext = t0 + n * dt
+    latency = arrival - (self.tNext - dt)
+    self.maxLatency = max(self.maxLatency, latency)
+    if latency > LATE_SECS:
+      self.late += 1
+      out.append("# %s late packet: %.3f arrived %.1f s after last sample" % (self.name, t0, latency))
+
+    times = t0 + np.arange(n) * dt
+    xf = x.astype(np.float64)
+    sq = np.empty((len(self.sos), n))
+    for i, sos in enumerate(self.sos):
+      y, self.zi[i] = sosfilt(sos, xf, zi=self.zi[i])
+      sq[i] = y * y
+
+    secs = np.floor(times).astype(np.int64)
+    cuts = np.flatnonzero(np.diff(secs)) + 1          # where a new data second starts
+    starts = np.concatenate(([0], cuts))
+    sums = np.add.reduceat(sq, starts, axis=1)
+    counts = np.diff(np.concatenate((starts, [n])))
+    for j, k in enumerate(starts):
+      if secs[k] != self.sec:                        # previous second is complete
+        out += self.report()
+        self.sec = secs[k]
+      self.acc += sums[:, j]
+      self.nacc += counts[j]
+    return out
+
+  def report(self):
+    "Close the current second: push its energies, print RMS over each band window."
+    if self.nacc == 0:
+      return []
+    for h, a in zip(self.hist, self.acc):
+      h.append((a, self.nacc))
+    rms = [np.sqrt(sum(a for a, n in h) / sum(n for a, n in h)) for h in self.hist]
+    self.acc[:] = 0
+    self.nacc = 0
+    return ["%d, %s, %.1f, %.1f, %.2f" % (self.sec, self.name, rms[0], rms[1], rms[2])]
+
+  def summary(self):
+    return ("# %s: %.0f Hz, %d packets, %d gaps (%d samples), %d duplicate, %d late, max latency %.2f s"
+            % (self.name, self.fs, self.packets, self.gaps, self.missing, self.dups,
+               self.late, self.maxLatency))
 
 # ----------------------------------------------------------------------------
 
-LPelems = 20                  # how many 1-second averages, sets lower freq limit
-LPidx = 0                     # index into circular buffer
-
-data, addr = sock.recvfrom(1024)    # wait to receive data
-AL = data.translate(None, '{}').split(",") # remove brackets, separate elemen                                                                               ts
-channel = AL[0]                  # first elem is channel, eg. 'SHZ'
-tstamp = time.strftime("%a, %d %b %Y %H:%M:%S UTC", time.gmtime(float(AL[1])) )
-print("HP50, LP2p5, LLP05")
-print("# HP50=2.5-25 Hz, LP=0.5-2.5 Hz, LLP05=0.05-0.5 Hz " + channel)
-print("# Epoch: " + AL[1] + " " + tstamp)
-tstamp2 = time.strftime("%a, %d %b %Y %H:%M:%S ", time.localtime(float(AL[1])) )
-tzone = time.tzname[time.localtime().tm_isdst]
-print("# Local: " + tstamp2 + tzone)
-A = force50(AL[2:])          # make sure we have exactly 50 data samples
-(waste,mean) =  variance(A)  # find average of 1st 50 samples
-LPbuf = [mean] * LPelems     # initialize circular buffer of averages
-
-while 1:                            # loop forever, ping-pong buffer (A, B)
-    B = get50(sock)      # get next 50 data elements (blocks until received)
-    ps(A + B)  # print sdt.dev of 2 seconds of data (previous 1 and current)
-    A = get50(sock)
-    ps(B + A)
+def main():
+  sock = s.socket(s.AF_INET, s.SOCK_DGRAM)
+  sock.setsockopt(s.SOL_SOCKET, s.SO_REUSEADDR, 1)
+  sock.bind((host, port))     # connect to this socket
+
+  channels = {}
+  first = {}                  # channel -> first packet, until its rate is known
+  print("epoch, channel, HP, LP, LLP")
+  print("# %s  port %d" % (VERSION, port))
+  print("# " + ", ".join("%s=%g-%g Hz (%d s RMS)" % b for b in BANDS))
+  try:
+    while True:
+      data, addr = sock.recvfrom(4096)    # wait to receive data from R-Shake
+      arrival = time.time()
+      try:
+        name, t0, x = parse_packet(data)
+      except (ValueError, IndexError):
+        print("# bad packet from %s: %r" % (addr[0], data[:40]))
+        continue
+      if len(x) == 0:
+        continue
+      ch = channels.get(name)
+      pending = [(t0, x)]
+      if ch is None:
+        if name in FS:
+          fs = FS[name]
+        elif name in first:
+          pending.insert(0, first.pop(name))
+          fs = guess_rate(len(pending[0][1]), t0 - pending[0][0])
+        else:
+          first[name] = (t0, x)
+          continue
+        ch = Channel(name, fs, pending[0][0], pending[0][1][0])
+        channels[name] = ch
+        tstamp = time.strftime("%a, %d %b %Y %H:%M:%S UTC", time.gmtime(pending[0][0]))
+        print("# %s %.0f Hz, Epoch: %.3f %s" % (name, fs, pending[0][0], tstamp))
+      for tp, xp in pending:
+        for line in ch.add(tp, xp, arrival):
+          print(line)
+      sys.stdout.flush()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    for ch in channels.values():
+      print(ch.summary())
+    sock.close()
+
+if __name__ == "__main__":
+  main()
 
 # ===============================================================
@@ -1,17 +1,44 @@
 #!/home/john/miniconda3/envs/obspy/bin/python
 # uses obspy environment (miniConda) to read Raspberry Shake data files
+#
+# Usage:  RShake_EventFind.py  dayfile                   (one file, as before)
+#         RShake_EventFind.py  dir | "glob" ...  [-j N] [--plot] [--index file.csv]
+#         add --stream [minutes] to read files in chunks (bounded memory)
+# Batch mode spreads the day files over a process pool. Each file still gets
+# its own <station>.<year>.<day>.csv, and all events also go into one
+# consolidated index CSV (default odir/events_index.csv), in input order.
+# Streaming mode runs the same detector chunk by chunk (StreamDetector) so
+# multi-day files or a live feed can be processed in constant memory.
+# Both modes use one causal signal chain (EnvelopeFilter: bandpass, FIR
+# Hilbert envelope, decimation) whose filter states are carried from chunk
+# to chunk, so streaming gives exactly the process_file() events, whatever
+# the chunk size.
+# Events are also added to the SQLite catalog (event_catalog.py, default
+# odir/events.sqlite, --db "" to skip).
+# --stalta [STA,LTA,ON,OFF] replaces the fixed log-envelope threshold with a
+# recursive STA/LTA trigger on the decimated envelope (StaLtaTrigger), which
+# follows the station's noise floor instead of needing a per-station vThresh.
+# Same CSV columns; Max is then the peak log STA.
 
 import sys                        # command line arguments
 import os                         # file basename
+import glob                       # batch mode file lists
+import io                         # streaming mode record blocks
+import argparse
 import datetime                   # current processing time
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import scipy.ndimage as nd
 from scipy.signal import hilbert  # for amplitude envelope
-from scipy.signal import butter, lfilter, decimate
-import matplotlib.pyplot as plt
+from scipy.signal import butter, lfilter, lfilter_zi, decimate
+from scipy.signal import iirfilter, sosfilt, sosfilt_zi
 
 from obspy import read
 import obspy.signal
+from obspy.io.mseed.util import get_record_information
+
+from event_catalog import EventCatalog
+import movavg
 
 ndir="/home/john/RShake"  # input directory
 odir="/home/john/RShake"  # output directory
@@ -25,6 +52,12 @@ plotminutes = 5*360      # minutes duration to show on plot
 vThresh = 6.45     # for RF7DC station (traffic event threshold log() operation)
 #vThresh = 6.55   # for R79D5 station
 tDurThresh = 5   # valid event must be longer than this (seconds)
+Drate = 25                   # envelope decimation ratio
+chunkminutes = 60            # streaming mode: minutes of data read at a time
+hilbertHalf = 16             # FIR Hilbert transformer has 2*hilbertHalf+1 taps
+staLta = (3.0, 120.0, 2.5, 1.5)   # STA/LTA mode: STA (s), LTA (s), trigger-on ratio, trigger-off ratio
+
+INDEX_HEADER = "station, channel, file, num, start(m), time_utc, Max, dur(s)\n"
 
 # =========================================================
 
@@ -45,132 +78,563 @@ def butter_lowpass_filter(data, cutoff, fs, order=5):
 #    return y
 
 def boxcar_filter(data, M):
-    y = nd.uniform_filter1d(data, size=M, mode='reflect')
+    # same as nd.uniform_filter1d(data, size=M, mode='reflect'); sequential sums
+    # so StreamDetector's MovingAverage gives identical values
+    y = movavg.boxcar(data, M, mode='reflect', sequential=True)
     return y
 
-# ---------------------------------------------------
-
-
-if __name__ == "__main__":
-  if (len(sys.argv) > 1):
-    fname=sys.argv[1]
-
-bname = os.path.basename(fname)  # base filename without path
-fparts = bname.split('.')  # get components of filename
-oname = odir+'/'+(fparts[1]+'.'+fparts[5]+'.'+fparts[6])+'.csv'
-
-st = read(fname)  # load example seismogram
-data = st[0].data
-npts = st[0].stats.npts
-samprate = st[0].stats.sampling_rate
-dt = st[0].stats.starttime  # date/time of initial sample
-
-print("%s" % bname,end='',flush=True)
-# -----------------------------------
-
-of = open(oname, 'w')  # open output results file
-
-# -----------------------------------
-# Filter specs
-order = 3
-BoxSize = int(samprate/cutoff)     # boxcar filter size
-Drate = 25                        # decimation ratio
-
-b, a = butter_lowpass(cutoff, samprate, order)  # generate filter coefficients
-
-st.filter('bandpass', freqmin=8, freqmax=20, corners=2, zerophase=True)
+def hilbert_fir(half=hilbertHalf):
+    """Hamming-windowed FIR Hilbert transformer, 2*half+1 taps, delay half samples."""
+    k = np.arange(-half, half + 1)
+    h = np.zeros(len(k))
+    odd = k % 2 != 0
+    h[odd] = 2 / (np.pi * k[odd])
+    return h * np.hamming(len(k))
+
+def plot_window(tWin, envfWin, label, title):
+    """Show one window of the log envelope. matplotlib is only loaded if plotting."""
+    import matplotlib.pyplot as plt
+    plt.figure(num=1, figsize=(16,4))          # display image size in inches
+    plt.plot(tWin, envfWin, 'k-', linewidth=0.5, label=label)
+    plt.title(title)
+    plt.ylabel('Data Envelope')
+    plt.xlabel('Time [m]')
+    plt.grid()
+    plt.legend()
+    plt.show()
 
-data_env = abs(obspy.signal.filter.envelope(st[0].data)) # envelope could be neg. without abs()
-#data_env = abs(hilbert(st[0].data))  # find envelope of narrowband signal
+def trigger_desc(vThresh, stalta=None):
+    """Detector settings for the CSV '# Processed at' lines."""
+    if stalta:
+        return "STA/LTA: %g/%g s on %g off %g" % tuple(stalta)
+    return "vThresh: %5.3f" % vThresh
 
-# note: decimate with n>0 interpolation may yeild negative values; bad for subsequent log()
-envD1 = (decimate(data_env, int(Drate/5), n=0))            # reduce size by 10x
-envD2 = (decimate(envD1, 5, n=0))
-nptsD = envD2.size                                  # number of points in decimated data
+# ---------------------------------------------------
 
-bcf = (boxcar_filter(envD2, int(BoxSize/Drate)))  # LP filtered version
+class StaLtaTrigger:
+  """
+  Recursive STA/LTA trigger on the decimated envelope (fsD samples/s).
+
+  process(env) takes the next block of envelope samples (any length) and
+  returns the events that closed in it as (num, peak minute, Max, dur sec)
+  tuples, like process_file(); finish() closes an event still open at the
+  end. STA and LTA are one-pole averages run with lfilter, carrying their
+  filter state between blocks, so the state is O(1) and the result does not
+  depend on how the envelope is split into blocks. An event starts when
+  STA/LTA rises above `on` and ends when it falls below `off`; Max is the
+  peak log(STA) and the time is where that peak is. Both averages start at
+  the first envelope value, so there is no LTA warm-up period. Events are
+  numbered through the whole file; those not longer than tDurThresh are
+  dropped (their numbers skipped, as in threshold mode).
+  """
+  def __init__(self, fsD, sta=staLta[0], lta=staLta[1], on=staLta[2], off=staLta[3]):
+    if not off < on:
+      raise ValueError("STA/LTA trigger-off ratio must be below trigger-on")
+    self.fsD = fsD
+    self.spm = fsD * 60                       # samples per minute
+    self.on = on
+    self.off = off
+    self.coef = []                            # (b, a) of the STA and LTA filters
+    for secs in (sta, lta):
+      c = min(1.0, 1.0 / (secs * fsD))
+      self.coef.append(([c], [1.0, c - 1.0]))
+    self.zi = None              # filter states, set from the first sample
+    self.n = 0                  # envelope samples seen
+    self.num = 0                # triggers so far
+    self.inEvent = False
+    self.evStart = 0
+    self.evMax = -np.inf
+    self.evMaxPos = 0
+
+  def process(self, env):
+    env = np.asarray(env, dtype=np.float64)
+    if len(env) == 0:
+      return []
+    if self.zi is None:
+      self.zi = [lfilter_zi(b, a) * env[0] for b, a in self.coef]
+    (sta, self.zi[0]), (lta, self.zi[1]) = [lfilter(b, a, env, zi=z)
+                                            for (b, a), z in zip(self.coef, self.zi)]
+    ratio = np.divide(sta, lta, out=np.zeros_like(sta), where=lta > 0)   # 0 in zero-filled gaps
+    onIdx = np.flatnonzero(ratio > self.on)
+    offIdx = np.flatnonzero(ratio < self.off)
+    events = []
+    i = 0
+    while True:
+      if not self.inEvent:
+        p = np.searchsorted(onIdx, i)
+        if p == len(onIdx):
+          break
+        i = onIdx[p]
+        self.inEvent = True
+        self.evStart = self.n + i
+        self.evMax = -np.inf
+      p = np.searchsorted(offIdx, i)
+      e = offIdx[p] if p < len(offIdx) else len(env)
+      if e > i:
+        j = i + int(np.argmax(sta[i:e]))
+        if sta[j] > self.evMax:
+          self.evMax, self.evMaxPos = sta[j], self.n + j
+      if e == len(env):
+        break
+      events += self._close(self.n + e)
+      i = e
+    self.n += len(env)
+    return events
+
+  def finish(self):
+    return self._close(self.n) if self.inEvent else []
+
+  def _close(self, stop):
+    self.inEvent = False
+    self.num += 1
+    tDur = (stop - self.evStart) / self.fsD
+    if tDur > tDurThresh:
+      return [(self.num, self.evMaxPos / self.spm, np.log(self.evMax), tDur)]
+    return []
 
-envf = np.log(bcf)
-fsD = samprate / Drate   # sample rate of final decimated data vector
+# ---------------------------------------------------
 
-sublen = npts   # number of points in sub-segment to view
+class EnvelopeFilter:
+  """
+  Bandpassed, decimated amplitude envelope of a sample stream.
+
+  process(samples) takes the next block of raw samples (any length) and
+  returns the decimated envelope values completed by it; flush() returns
+  the rest at the end of the data. All state is carried between blocks, so
+  the concatenated output is the same, bit for bit, however the samples
+  are split:
+   - bandpass 8-20 Hz, Butterworth corners=2 run twice forward (sosfilt,
+     zi carried), the magnitude response of the old zerophase filter,
+     starting from the steady state for the first sample; its phase delay
+     (about 70 ms at 14 Hz) is left in
+   - envelope sqrt(x^2 + H(x)^2), H an FIR Hilbert transformer centred on
+     the sample, evaluated only at the decimated samples, tap by tap in a
+     fixed order; the last 2*hilbertHalf bandpassed samples are carried to
+     the next block (zeros before the start and after the end)
+   - decimation keeps raw samples 0, Drate, 2*Drate ... (global index), with
+     the gain of the old two-stage decimate(n=0), so there are
+     ceil(npts/Drate) outputs in all
+  """
+  def __init__(self, samprate, half=hilbertHalf):
+    nyq = 0.5 * samprate
+    sos = iirfilter(2, [8 / nyq, 20 / nyq], btype='band', ftype='butter', output='sos')
+    self.sos = np.vstack((sos, sos))
+    self.h = hilbert_fir(half)
+    self.half = half
+    ones = np.ones(Drate * 4)
+    self.gain = decimate(decimate(ones, int(Drate/5), n=0), 5, n=0)[0]   # n=0 decimate = gain * x[::Drate]
+    self.zs = None              # bandpass state, set from the first sample
+    self.tail = np.zeros(2 * half)   # last 2*half bandpassed samples
+    self.n = 0                  # bandpassed samples so far (global index of the next one)
+
+  def process(self, samples):
+    x = np.asarray(samples, dtype=np.float64)
+    if len(x) == 0:
+      return np.empty(0)
+    if self.zs is None:
+      self.zs = sosfilt_zi(self.sos) * x[0]
+    y, self.zs = sosfilt(self.sos, x, zi=self.zs)
+    return self._envelope(y)
+
+  def flush(self):
+    """End of data: run the last `half` samples through the Hilbert FIR."""
+    if self.zs is None:
+      return np.empty(0)
+    return self._envelope(np.zeros(self.half))
+
+  def _envelope(self, y):
+    buf = np.concatenate((self.tail, y))      # buf[0] is global sample n - 2*half
+    g0 = self.n - 2 * self.half
+    self.n += len(y)
+    self.tail = buf[len(buf) - 2 * self.half:]
+    # decimated samples whose Hilbert window now ends in this block
+    lo = max(0, self.n - len(y) - self.half)
+    r = np.arange(-(-lo // Drate) * Drate, self.n - self.half, Drate)
+    b = r - g0
+    hx = np.zeros(len(r))
+    for i, hk in enumerate(self.h):
+      if hk:
+        hx += hk * buf[b + self.half - i]
+    return np.sqrt(buf[b]**2 + hx**2) * self.gain
+
+def decimated_envelope(data, samprate):
+  """EnvelopeFilter over a whole array at once."""
+  ef = EnvelopeFilter(samprate)
+  return np.concatenate((ef.process(data), ef.flush()))
 
-sph = fsD*60*60  # samples per hour, from samples per second
-spm = fsD*60     # samples per minute, from samples per second
+# ---------------------------------------------------
 
-StartPlt = int(0)
-plotSpan = int(plotminutes * spm)
-t = np.arange(0, (sublen-0.5)/spm, 1/spm)
+def process_file(fname, odir=odir, vThresh=vThresh, plot=False, verbose=True, stalta=None):
+  """Find events in one day file, write its per-file CSV.
+  stalta: (STA s, LTA s, on, off) to use StaLtaTrigger instead of vThresh.
+  Returns (info, events): info is a dict describing the file, events a list
+  of (num, start minute, peak log envelope, duration sec) tuples."""
+  bname = os.path.basename(fname)  # base filename without path
+  fparts = bname.split('.')  # get components of filename
+  oname = os.path.join(odir, fparts[1]+'.'+fparts[5]+'.'+fparts[6]+'.csv')
+
+  st = read(fname)  # load example seismogram
+  npts = st[0].stats.npts
+  samprate = st[0].stats.sampling_rate
+  starttime = st[0].stats.starttime  # date/time of initial sample
+
+  if verbose:
+    print("%s" % bname,end='',flush=True)
+
+  # -----------------------------------
+  # Filter specs
+  BoxSize = int(samprate/cutoff)     # boxcar filter size
+
+  # bandpass, envelope and decimate, causal so StreamDetector can match it exactly
+  envD2 = decimated_envelope(st[0].data, samprate)
+  nptsD = envD2.size                                  # number of points in decimated data
+
+  if not stalta:   # STA/LTA works on envD2 directly, no boxcar or log needed
+    bcf = (boxcar_filter(envD2, int(BoxSize/Drate)))  # LP filtered version
+    envf = np.log(bcf)
+  fsD = samprate / Drate   # sample rate of final decimated data vector
+
+  sublen = npts   # number of points in sub-segment to view
+  spm = fsD*60     # samples per minute, from samples per second
+
+  StartPlt = int(0)
+  plotSpan = int(plotminutes * spm)
+  t = np.arange(0, (sublen-0.5)/spm, 1/spm)
+
+  events = []
+
+  of = open(oname, 'w')  # open output results file
+  of.write("num,  start(m),  Max,  dur(s)\n")
+  of.write("# %s %s\n" %  (bname, starttime))
+  of.write("# Processed at %s %s\n" %
+     (datetime.datetime.now().astimezone().isoformat(), trigger_desc(vThresh, stalta)) )
+
+  if stalta:
+    trig = StaLtaTrigger(fsD, *stalta)
+    events = trig.process(envD2) + trig.finish()
+    for e in events:
+      of.write("%03d, %5.2f,  %2.1f, %4.1f\n" % e)
+
+  while (not stalta) and (StartPlt <= (nptsD-1)):   # threshold mode, one plot window at a time
+    EndPlt = StartPlt + plotSpan     # min * samples/min = samples
+    if (EndPlt >= nptsD):
+      EndPlt = nptsD
+
+    envfWin = envf[StartPlt:EndPlt]            # current window region into full dataset
+    tWin = t[StartPlt:EndPlt]
+
+    mask = envfWin > vThresh                   # binary mask of above-threshold areas
+    label_im, nb_labels = nd.label(mask)       # find and label connected regions
+    poslist = nd.find_objects(label_im)        # find positions of labelled objects
+    max_vals = nd.maximum(envfWin, label_im, range(1, nb_labels + 1))
+    max_pos = nd.maximum_position(envfWin, label_im, range(1, nb_labels + 1))
+    idx = [i[0] for i in max_pos]   # index of peak values
+    pktimes = [tWin[x] for x in idx] # actual time of given index
+
+    for i in range(nb_labels):  # each detected traffic event (eg. car passing by)
+       s = poslist[i][0] # [n][0]  to get first element of tuple which is slize (2nd member is null)
+       tStart = t[s.start]   # units of time (m)
+       tEnd = t[s.stop]
+       tDur = 60*(tEnd-tStart)  # units of seconds
+       if (tDur > tDurThresh):
+         events.append((i+1, pktimes[i], max_vals[i], tDur))
+         of.write("%03d, %5.2f,  %2.1f, %4.1f\n" % (i+1, pktimes[i], max_vals[i], tDur)) # for this event
 
-eventTotal = 0
-durList= np.empty(5000)         # allocate array of event durations
-durCount = int(0)
+    if plot:  # display graph of processed data
+      plot_window(tWin, envfWin, bname, starttime)
 
-of.write("num,  start(m),  Max,  dur(s)\n")
-of.write("# %s %s\n" %  (bname, st[0].stats.starttime))
-of.write("# Processed at %s vThresh: %5.3f\n" % 
-   (datetime.datetime.now().astimezone().isoformat(), vThresh) )
+    StartPlt += plotSpan  # move on to next section of data
 
-while (StartPlt <= (nptsD-1)):
-  EndPlt = StartPlt + plotSpan     # min * samples/min = samples
-  if (EndPlt >= nptsD):
-    EndPlt = nptsD
-  # print("Start:%d  End:%d  Total: %d" % (StartPlt, EndPlt, nptsD))
+  # === end of file, finish up & close
 
-  # t = np.arange(0, ((EndPlt - StartPlt)-0.5)/spm, 1/spm)
-  plt.figure(num=1, figsize=(16,4))          # display image size in inches
-  envfWin = envf[StartPlt:EndPlt]            # current window region into full dataset
-  tWin = t[StartPlt:EndPlt]
+  durList = np.array([e[3] for e in events])
+  durCount = len(events)
+  durMean = np.mean(durList) if durCount else float('nan')
+  durStd = np.std(durList) if durCount else float('nan')
 
-  mask = envfWin > vThresh                   # binary mask of above-threshold areas
-  label_im, nb_labels = nd.label(mask)       # find and label connected regions
-  poslist = nd.find_objects(label_im)        # find positions of labelled objects
-  sizes = nd.sum(mask, label_im, range(1, nb_labels + 1))  # size of each region
-  max_vals = nd.maximum(envfWin, label_im, range(1, nb_labels + 1))
-  max_pos = nd.maximum_position(envfWin, label_im, range(1, nb_labels + 1))
-  np.set_printoptions(precision=1)  # let's not get excessive on the decimals
-  idx = [i[0] for i in max_pos]   # index of peak values
-  pktimes = [tWin[x] for x in idx] # actual time of given index
-  np.set_printoptions(precision=2)  # let's not get excessive on the decimals
+  of.write("# %s %s \n" %  (bname, starttime) )
+  of.write("# Events: %d avg:%5.3f std:%5.3f\n" %
+     (durCount, durMean, durStd)) # how many vehicle events detected
+  of.close()
+  if verbose:
+    print(" %s Events: %d avg:%5.3f std:%5.3f" %
+       (starttime, durCount, durMean, durStd)) # how many vehicle events detected
 
-  eventTotal += nb_labels
+  info = {"file": bname, "station": fparts[1], "channel": fparts[3],
+          "starttime": starttime.timestamp, "csv": oname,
+          "events": durCount, "durMean": durMean, "durStd": durStd}
+  return info, events
 
-#  if False :
-  if (nb_labels > 0):  # we have detected a traffic event (eg. car passing by)
-    # print("New: %4d  Total Events: %5d" % (nb_labels, eventTotal)) # how many vehicle events detected
-    for i in range(nb_labels):
-       s = poslist[i][0] # [n][0]  to get first element of tuple which is slize (2nd member is null)
-       #print("%d : %d" % (s.start, s.stop)) # debug: list of slices?
-       tStart = t[s.start]   # units of time (m)
-       tEnd = t[s.stop]
-       tDur = 60*(tEnd-tStart)  # units of seconds
-       if (tDur > tDurThresh):
-         durList[durCount] = tDur
-         durCount += 1
-         #print("%03d, %5.2f,  %2.1f, %4.1f" % (i+1, pktimes[i], max_vals[i], tDur))
-         of.write("%03d, %5.2f,  %2.1f, %4.1f\n" % (i+1, pktimes[i], max_vals[i], tDur)) # for this event
+# ---------------------------------------------------
 
-  if False :  # display graph of processed data
-#  if True :  # display graph of processed data
-    plt.plot(tWin, envfWin, 'k-', linewidth=0.5, label=filename)
-    plt.title(st[0].stats.starttime)
-    plt.ylabel('Data Envelope')
-    plt.xlabel('Time [m]')
-    plt.grid()
-    plt.legend()
-    plt.show()
+class StreamDetector:
+  """
+  The process_file() detector, run on consecutive chunks of raw samples.
+
+  feed(samples) takes the next block of samples (any length) and returns the
+  events that closed in it, as (num, start minute, Max, dur sec) tuples
+  numbered like process_file(); finish() flushes the end of the data.
+  The events are exactly those of process_file(), for any chunk sizes.
+  Memory stays bounded by the chunk size:
+   - bandpass, envelope and decimation are an EnvelopeFilter, the same
+     one process_file() runs over the whole array
+   - the boxcar is a movavg.MovingAverage, which carries its last
+     BoxSize/Drate points between blocks, pads the stream start and end
+     like boxcar_filter() and sums in the same order
+   - an above-threshold region stays open across blocks until it closes;
+     regions are still split (and numbered) in plotminutes windows
+   - with stalta set, the decimated envelope goes to a StaLtaTrigger
+     instead of the boxcar + threshold
+  """
+  def __init__(self, samprate, vThresh=vThresh, stalta=None):
+    self.fs = samprate
+    self.vThresh = vThresh
+    self.trig = StaLtaTrigger(samprate / Drate, *stalta) if stalta else None
+    self.env = EnvelopeFilter(samprate)
+    self.box = movavg.MovingAverage(int(int(samprate/cutoff) / Drate), mode='reflect', sequential=True)
+    self.spm = samprate / Drate * 60          # decimated samples per minute
+    self.tstep = 1 / self.spm                 # minutes per decimated sample
+    self.plotSpan = int(plotminutes * self.spm)
+
+    self.nOut = 0               # next boxcar output (decimated index)
+
+    self.inEvent = False        # region state
+    self.evStart = 0            # decimated index where the open region began
+    self.evMax = -np.inf
+    self.evMaxPos = 0
+    self.label = 0              # regions so far in this plotminutes window
+
+  def feed(self, samples):
+    env = self.env.process(samples)
+    if self.trig:
+      return self.trig.process(env)
+    return self._boxcar(env)
+
+  def finish(self):
+    """End of data: flush the envelope, pad the boxcar, close any open region."""
+    env = self.env.flush()
+    if self.trig:
+      return self.trig.process(env) + self.trig.finish()
+    events = self._boxcar(env, final=True)
+    if self.inEvent:
+      events += self._close(self.nOut)
+    return events
+
+  def _boxcar(self, new, final=False):
+    """Running boxcar of the decimated envelope, then threshold regions."""
+    bcf = self.box.process(new)
+    if final:
+      bcf = np.concatenate((bcf, self.box.flush()))
+    if len(bcf) == 0:
+      return []
+    events = self._regions(np.log(bcf), self.nOut)
+    self.nOut += len(bcf)
+    return events
+
+  def _close(self, stop):
+    self.inEvent = False
+    self.label += 1
+    ws = self.evStart - self.evStart % self.plotSpan   # window start, as in process_file()
+    tDur = 60*((stop - ws) * self.tstep - (self.evStart - ws) * self.tstep)
+    if tDur > tDurThresh:
+      return [(self.label, self.evMaxPos * self.tstep, self.evMax, tDur)]
+    return []
+
+  def _regions(self, envf, k0):
+    """Connected above-threshold regions of envf (first index k0), like nd.label."""
+    events = []
+    k = k0
+    end = k0 + len(envf)
+    while k < end:
+      if k % self.plotSpan == 0:              # batch plot window boundary
+        if self.inEvent:
+          events += self._close(k)
+        self.label = 0
+      wEnd = min(end, (k // self.plotSpan + 1) * self.plotSpan)
+      v = envf[k-k0 : wEnd-k0]
+      mask = v > self.vThresh
+      edges = np.flatnonzero(np.diff(mask.astype(np.int8), prepend=np.int8(self.inEvent)))
+      pos = 0
+      for e in list(edges) + [len(v)]:
+        if self.inEvent and e > pos:          # run of above-threshold values [pos, e)
+          i = pos + int(np.argmax(v[pos:e]))
+          if v[i] > self.evMax:
+            self.evMax, self.evMaxPos = v[i], k + i
+        if e == len(v):
+          break
+        if self.inEvent:
+          events += self._close(k + e)
+        else:
+          self.inEvent = True
+          self.evStart = k + e
+          self.evMax = -np.inf
+        pos = e
+      k = wEnd
+    return events
+
+
+def read_chunks(fname, chunkmin=chunkminutes):
+  """Yield (stats, samples) for consecutive chunks of the first trace in fname.
+  The file is read once, front to back, a block of whole MiniSEED records
+  (about chunkmin minutes of samples) at a time."""
+  rec = get_record_information(fname)
+  reclen = rec["record_length"]
+  nslc = "%s.%s.%s.%s" % (rec["network"], rec["station"], rec["location"], rec["channel"])
+  n = chunkmin * 60 * rec["samp_rate"]          # samples per chunk
+  per = max(1, int(np.ceil(n / max(1, rec["npts"]))))   # records per block, from the first one
+  with open(fname, 'rb') as f:
+    while True:
+      block = f.read(per * reclen)
+      if not block:
+        break
+      st = read(io.BytesIO(block), format="MSEED").select(id=nslc)
+      if len(st) == 0:
+        continue
+      st.merge(fill_value=0)
+      yield st[0].stats, st[0].data
+
+def process_stream(fname, odir=odir, vThresh=vThresh, chunkmin=chunkminutes, verbose=True, stalta=None):
+  """process_file() using StreamDetector on chunks of fname: same CSV format
+  and return value and the same events, memory independent of the file
+  length."""
+  bname = os.path.basename(fname)
+  fparts = bname.split('.')
+  oname = os.path.join(odir, fparts[1]+'.'+fparts[5]+'.'+fparts[6]+'.csv')
+  if verbose:
+    print("%s" % bname,end='',flush=True)
+
+  of = None
+  det = None
+  events = []
+
+  def emit(evs):
+    for e in evs:
+      events.append(e)
+      of.write("%03d, %5.2f,  %2.1f, %4.1f\n" % e)
+
+  for stats, data in read_chunks(fname, chunkmin):
+    if det is None:
+      starttime = stats.starttime
+      det = StreamDetector(stats.sampling_rate, vThresh, stalta=stalta)
+      of = open(oname, 'w')
+      of.write("num,  start(m),  Max,  dur(s)\n")
+      of.write("# %s %s\n" %  (bname, starttime))
+      of.write("# Processed at %s %s\n" %
+         (datetime.datetime.now().astimezone().isoformat(), trigger_desc(vThresh, stalta)) )
+    emit(det.feed(data))
+    of.flush()
+  if det is None:
+    raise ValueError("no data in %s" % fname)
+  emit(det.finish())
+
+  durList = np.array([e[3] for e in events])
+  durCount = len(events)
+  durMean = np.mean(durList) if durCount else float('nan')
+  durStd = np.std(durList) if durCount else float('nan')
+  of.write("# %s %s \n" %  (bname, starttime) )
+  of.write("# Events: %d avg:%5.3f std:%5.3f\n" % (durCount, durMean, durStd))
+  of.close()
+  if verbose:
+    print(" %s Events: %d avg:%5.3f std:%5.3f" % (starttime, durCount, durMean, durStd))
+
+  info = {"file": bname, "station": fparts[1], "channel": fparts[3],
+          "starttime": starttime.timestamp, "csv": oname,
+          "events": durCount, "durMean": durMean, "durStd": durStd}
+  return info, events
 
-  StartPlt += plotSpan  # move on to next section of data
+# ---------------------------------------------------
 
-# === end of file, finish up & close
+def expand_inputs(specs):
+  """Directories, glob patterns and plain file names -> sorted list of files."""
+  files = []
+  for spec in specs:
+    if os.path.isdir(spec):
+      found = [f for f in glob.glob(os.path.join(spec, '*')) if os.path.isfile(f)]
+    else:
+      found = glob.glob(spec) or [spec]
+    files.extend(sorted(found))
+  return files
+
+def _batch_job(args):
+  fname, odir, vThresh, chunkmin, stalta = args
+  try:
+    if chunkmin:
+      return fname, process_stream(fname, odir, vThresh, chunkmin, verbose=False, stalta=stalta), None
+    return fname, process_file(fname, odir, vThresh, plot=False, verbose=False, stalta=stalta), None
+  except Exception as e:          # bad or empty file: report it, keep going
+    return fname, None, "%s: %s" % (type(e).__name__, e)
+
+def write_index(ipath, results, vThresh=vThresh, stalta=None):
+  """One consolidated CSV of every event found in a batch run."""
+  with open(ipath, 'w') as f:
+    f.write(INDEX_HEADER)
+    f.write("# Processed at %s %s files: %d\n" %
+       (datetime.datetime.now().astimezone().isoformat(), trigger_desc(vThresh, stalta), len(results)))
+    for info, events in results:
+      for num, tmin, vmax, tDur in events:
+        tUTC = datetime.datetime.fromtimestamp(info["starttime"] + 60*tmin, datetime.timezone.utc)
+        f.write("%s, %s, %s, %03d, %5.2f, %s, %2.1f, %4.1f\n" %
+           (info["station"], info["channel"], info["file"], num, tmin,
+            tUTC.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-4], vmax, tDur))
+
+def run_batch(files, odir, vThresh, jobs=None, index=None, chunkmin=None, catalog=None, stalta=None):
+  """Process many day files in parallel, then write the index CSV.
+  chunkmin: use process_stream() with chunks of this many minutes.
+  stalta: (STA s, LTA s, on, off) for STA/LTA triggering instead of vThresh.
+  catalog: EventCatalog to add each file's events to (written from this process only)."""
+  results = []
+  failed = 0
+  with ProcessPoolExecutor(max_workers=jobs) as pool:
+    for fname, res, err in pool.map(_batch_job, [(f, odir, vThresh, chunkmin, stalta) for f in files]):
+      if err is not None:
+        failed += 1
+        print("%s  FAILED %s" % (os.path.basename(fname), err))
+        continue
+      info, events = res
+      results.append(res)
+      if catalog is not None:
+        catalog.add_file(info, events, None if stalta else vThresh)
+      print("%s %s Events: %d avg:%5.3f std:%5.3f" % (info["file"],
+         datetime.datetime.fromtimestamp(info["starttime"], datetime.timezone.utc).isoformat(),
+         info["events"], info["durMean"], info["durStd"]), flush=True)
+  ipath = index or os.path.join(odir, "events_index.csv")
+  write_index(ipath, results, vThresh, stalta)
+  print("%d files, %d failed, %d events -> %s" %
+     (len(results), failed, sum(len(e) for _, e in results), ipath))
+  return results
 
-durMean = np.mean(durList[0:durCount])
-durStd = np.std(durList[0:durCount])
+# ---------------------------------------------------
 
-of.write("# %s %s \n" %  (bname, st[0].stats.starttime) )
-of.write("# Events: %d avg:%5.3f std:%5.3f\n" % 
-   (durCount, durMean, durStd)) # how many vehicle events detected
-print(" %s Events: %d avg:%5.3f std:%5.3f" %  
-     (st[0].stats.starttime, durCount, durMean, durStd)) # how many vehicle events detected
-#print(" complete %s" % datetime.datetime.now() )
-of.close()
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Find traffic events in Raspberry Shake day files")
+  parser.add_argument("inputs", nargs="*", default=[os.path.join(ndir, filename)],
+                      help="day file(s), directories or quoted glob patterns")
+  parser.add_argument("-o", "--odir", default=odir, help="output directory")
+  parser.add_argument("-t", "--thresh", type=float, default=vThresh, help="log envelope threshold")
+  parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: all cores)")
+  parser.add_argument("--index", default=None, help="consolidated event CSV (default: odir/events_index.csv)")
+  parser.add_argument("--db", default=None, help="event catalog (default: odir/events.sqlite, \"\" = none)")
+  parser.add_argument("--plot", action="store_true", help="plot each window (single file only)")
+  parser.add_argument("--stalta", type=lambda v: tuple(float(x) for x in v.split(',')),
+                      nargs="?", const=staLta, default=None, metavar="STA,LTA,ON,OFF",
+                      help="STA/LTA trigger instead of --thresh (default %s)" % ",".join("%g" % v for v in staLta))
+  parser.add_argument("--stream", type=float, nargs="?", const=chunkminutes, default=None,
+                      metavar="MIN", help="read in chunks of MIN minutes (default %d)" % chunkminutes)
+  args = parser.parse_args()
+
+  vThresh = args.thresh
+  files = expand_inputs(args.inputs)
+  dbPath = os.path.join(args.odir, "events.sqlite") if args.db is None else args.db
+  catalog = EventCatalog(dbPath) if dbPath else None
+  if len(files) == 1 and not os.path.isdir(args.inputs[0]) and args.index is None:
+    if args.stream:
+      info, events = process_stream(files[0], args.odir, vThresh, args.stream, stalta=args.stalta)
+    else:
+      info, events = process_file(files[0], args.odir, vThresh, plot=args.plot, stalta=args.stalta)
+    if catalog is not None:
+      catalog.add_file(info, events, None if args.stalta else vThresh)
+  else:
+    run_batch(files, args.odir, vThresh, jobs=args.jobs, index=args.index, chunkmin=args.stream,
+              catalog=catalog, stalta=args.stalta)
+  if catalog is not None:
+    catalog.close()
@@ -5,6 +5,7 @@
 
 from serial import *
 import time, datetime
+from logwriter import LogWriter
 
 LOGFILE = "TempHum-log.csv"
 PORT = "/dev/ttyUSB0"
@@ -13,7 +14,7 @@ CSV_HEADER = "date_time, epoch, degC, RH, CRC16"
 eol_str = "\n"  # end of line string in file output
 
 ser=Serial(PORT,9600,8,'N',1,timeout=2)  # serial input
-f = open(LOGFILE, 'w')  # open log file
+f = LogWriter(LOGFILE, 'w', flush_lines=10, max_latency=120)  # open log file
 print("%s" % VERSION)
 print("%s" % CSV_HEADER)
 f.write ("%s\n" % CSV_HEADER)
@@ -41,8 +42,6 @@ while True:
       f.write (outbuf)
       f.write (eol_str)
       lines += 1
-      if (lines % 10 == 0):  # save it out to actual file, every so often
-          f.flush()
 
-f.close                  # close log file
+f.close()                # close log file
 ser.close()            # close serial port when done. If we ever are...
@@ -9,9 +9,11 @@
 import serial, datetime
 from urllib.request import urlopen
 from urllib.error import HTTPError
+from logwriter import LogWriter
 
 logfile='/home/myshake/serlog/temp-log.csv'
 FLIM = 10  # flush buffer after this many lines
+FSEC = 600 # ... or when the oldest unwritten line is this many seconds old
 APIKEY='TestingBadKey'
 TURL='https://api.thingspeak.com/update?api_key='
 F1='&field1='
@@ -20,9 +22,8 @@ F3='&field3='
 F4='&field4='
 DRATIO = 24 # decimation ratio, how many lines input per line output
 
-f = open(logfile, 'w')
+f = LogWriter(logfile, 'w', flush_lines=FLIM, max_latency=FSEC)
 
-fctr = 8  # saved-line counter (flush buffer after FLIM lines)
 pctr = DRATIO-2  # sample decimation counter 
 firstline = 1  # have not yet finished the first line
 
@@ -62,9 +63,5 @@ with serial.Serial('/dev/ttyUSB0', 9600, timeout=10) as ser:
             print("HTTP Error , " + oline)
 
           f.write(oline)
-          fctr += 1
-          if (fctr > FLIM):
-            f.flush()
-            fctr = 0
 
           # print(s,end='')
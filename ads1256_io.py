@@ -0,0 +1,445 @@
+#!/usr/bin/python3
+
+# Shared storage helpers for the ADS1256 binary-packet loggers
+# (ADS1256-log.py, ADC1256-log2a.py)
+#
+# Binary mode writes each log chunk as two .npy files:
+#   <stem>_counts.npy   big-endian int32, shape (packets, words) - raw J-packet words
+#   <stem>_epoch.npy    float64, shape (packets,)                - host time.time() per packet
+# Both load with np.load(fname, mmap_mode='r') even while still being written.
+#
+# Packet framing: firmware command "K15" (ADS1256_Example.ino) sends the same
+# 15 words as "J15", wrapped as  A5 5A | seq16 | 60 data bytes | crc16
+# (66 bytes, big-endian, CRC-16/XMODEM over seq + data). FrameParser finds
+# packet boundaries in arbitrary-sized reads, resyncs after lost bytes and
+# counts sequence gaps. Older firmware without "K" falls back to plain "J".
+#
+# Stats mode (StatsLog) converts packets to volts and writes one
+# "epoch_time, Vavg, uVstd, vMin, vMax" row per packet, second, minute...
+#
+# Convert binary chunks back to the CSV layout:
+#   python3 ads1256_io.py 20250524-1200_adc1256-log2_counts.npy [...]
+
+import os
+import sys
+import time
+import struct
+import binascii
+import threading
+import numpy as np
+from logwriter import LogWriter
+
+CSV_HEADER = "epoch_time, Vavg, uVstd, vMin, vMax"
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+SYNC = b"\xa5\x5a"        # start of a framed "K" packet
+NPY_HEADER_LEN = 128     # fixed .npy header size, leaves room to patch the row count
+FLUSH_ROWS = 250         # binary log: update headers + flush after this many packets
+CSV_LATENCY = 10         # text logs: flush after 64 kB or when data is this many sec old
+
+
+class NpyAppender:
+    """
+    Append fixed-size rows to a .npy file.
+
+    The header is written with a fixed length, so the row count can be
+    rewritten in place on each flush without moving the data.
+    """
+    def __init__(self, path, dtype, rowshape=()):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rowshape = tuple(rowshape)
+        self.rowbytes = self.dtype.itemsize * int(np.prod(self.rowshape, dtype=np.int64))
+        self.rows = 0
+        self.f = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        hdr = {'descr': np.lib.format.dtype_to_descr(self.dtype),
+               'fortran_order': False,
+               'shape': (self.rows,) + self.rowshape}
+        hlen = NPY_HEADER_LEN - len(NPY_MAGIC) - 2
+        body = repr(hdr).encode('latin1').ljust(hlen - 1) + b"\n"
+        self.f.seek(0)
+        self.f.write(NPY_MAGIC + struct.pack('<H', hlen) + body)
+        self.f.seek(0, os.SEEK_END)
+
+    def append(self, buf):
+        """Append raw bytes (or an array) holding a whole number of rows."""
+        mv = memoryview(buf).cast('B')
+        if len(mv) % self.rowbytes:
+            raise ValueError("%d bytes is not a whole number of %d-byte rows"
+                             % (len(mv), self.rowbytes))
+        self.f.write(mv)
+        self.rows += len(mv) // self.rowbytes
+
+    def flush(self):
+        self._write_header()
+        self.f.flush()
+
+    def close(self):
+        if not self.f.closed:
+            self.flush()
+            self.f.close()
+
+
+class CsvLog:
+    """Text log: one line per packet, epoch then the packet words."""
+    def __init__(self, path, version, notes=()):
+        self.path = path
+        self.f = LogWriter(path, 'a', flush_lines=None, max_latency=CSV_LATENCY)
+        self.f.write("%s\n" % CSV_HEADER)
+        self.f.write("# %s\n" % version)
+        for note in notes:
+            self.f.write("# %s\n" % note)
+
+    def write(self, epoch, pkt):
+        """Write one packet, return the line that was written."""
+        wordBuf = np.frombuffer(pkt, dtype='>i4')        # big-endian 32-bit words
+        wordString = ",".join(map(str, wordBuf))
+        outbuf = ("%.2f" % epoch) + ', ' + wordString
+        self.f.write(outbuf)
+        self.f.write("\n")
+        return outbuf
+
+    def write_block(self, epochs, pkts):
+        """Write a block of packets, return the list of lines written."""
+        return [self.write(e, p) for e, p in zip(epochs, pkts)]
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+
+
+class BinaryLog:
+    """Binary log: raw packet words + epoch times appended to .npy files."""
+    def __init__(self, stem, version, words, notes=()):
+        self.path = stem + "_counts.npy"
+        self.counts = NpyAppender(self.path, '>i4', (words,))
+        self.epochs = NpyAppender(stem + "_epoch.npy", '<f8')
+        with open(stem + "_info.txt", 'w') as f:
+            f.write("# %s\n" % version)
+            for note in notes:
+                f.write("# %s\n" % note)
+        self.unflushed = 0
+
+    def write(self, epoch, pkt):
+        self.counts.append(pkt)
+        self.epochs.append(struct.pack('<d', epoch))
+        self.unflushed += 1
+        if self.unflushed >= FLUSH_ROWS:
+            self.flush()
+        return None
+
+    def write_block(self, epochs, pkts):
+        """Write a block of packets: pkts is a (n, pktlen) uint8 array."""
+        self.counts.append(np.ascontiguousarray(pkts))
+        self.epochs.append(np.ascontiguousarray(epochs, dtype='<f8'))
+        self.unflushed += len(epochs)
+        if self.unflushed >= FLUSH_ROWS:
+            self.flush()
+        return []
+
+    def flush(self):
+        self.counts.flush()
+        self.epochs.flush()
+        self.unflushed = 0
+
+    def close(self):
+        self.counts.close()
+        self.epochs.close()
+
+    @property
+    def rows(self):
+        return self.counts.rows
+
+
+def volts_per_count(vref, pga):
+    """ADS1256 volts per count; pga is the PGA code ("P6" -> 6, gain 64)."""
+    # voltage = ((2 * VREF) / 8388608) * raw_counts / (pow(2, PGA))
+    return (2.0 * vref / 8388608) / (2 ** pga)
+
+
+def packet_volts(pkts, scale):
+    """
+    Convert a (n, pktlen) uint8 array of J/K packet payloads to (n, words)
+    volts. The first word in each packet is the raw reading, the rest are
+    differences from the previous reading (see case 'J' in the firmware).
+    """
+    words = np.ascontiguousarray(pkts).view('>i4').reshape(len(pkts), -1)
+    counts = np.cumsum(words, axis=1, dtype=np.int64)
+    return counts * scale
+
+
+class StatsReducer:
+    """
+    Mean, std, min, max of the samples in each time window.
+
+    window is in seconds (aligned to multiples of window in epoch time),
+    or 0 for one result per packet. add() returns rows for the windows
+    that are complete; a window stays open until a later packet arrives.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.key = None        # open window: floor(epoch / window)
+        self.parts = []        # open window: arrays of volts so far
+
+    def add(self, epochs, volts):
+        """Add a block of packets, return list of (epoch, mean, std, min, max)."""
+        if self.window <= 0:
+            return list(zip(epochs, volts.mean(axis=1), volts.std(axis=1),
+                            volts.min(axis=1), volts.max(axis=1)))
+        rows = []
+        keys = np.floor(np.asarray(epochs) / self.window)
+        cuts = np.flatnonzero(np.diff(keys)) + 1   # where a new window starts
+        for s, e in zip(np.r_[0, cuts], np.r_[cuts, len(keys)]):
+            if self.key is not None and keys[s] != self.key:
+                rows.append(self._close())
+            self.key = keys[s]
+            self.parts.append(volts[s:e])
+        return rows
+
+    def _close(self):
+        v = np.concatenate(self.parts).ravel()
+        row = (self.key * self.window, v.mean(), v.std(), v.min(), v.max())
+        self.key = None
+        self.parts = []
+        return row
+
+    def flush(self):
+        """Close the open window early, eg. at log rotation."""
+        return [self._close()] if self.parts else []
+
+
+class StatsLog:
+    """Text log of per-window statistics, in the CSV_HEADER column layout."""
+    def __init__(self, path, version, notes, window, scale):
+        self.path = path
+        self.scale = scale
+        self.reducer = StatsReducer(window)
+        self.f = LogWriter(path, 'a', flush_lines=None, max_latency=CSV_LATENCY)
+        self.f.write("%s\n" % CSV_HEADER)
+        self.f.write("# %s\n" % version)
+        self.f.write("# window: %s sec  volts/count: %.6g\n"
+                     % (window if window > 0 else "1 packet", scale))
+        for note in notes:
+            self.f.write("# %s\n" % note)
+
+    def _write_rows(self, rows):
+        lines = ["%.2f, %.9f, %.4f, %.9f, %.9f" % (t, avg, std * 1E6, vmin, vmax)
+                 for (t, avg, std, vmin, vmax) in rows]
+        for outbuf in lines:
+            self.f.write(outbuf)
+            self.f.write("\n")
+        return lines
+
+    def write_block(self, epochs, pkts):
+        """Add a block of packets, return the lines of any windows completed."""
+        return self._write_rows(self.reducer.add(epochs, packet_volts(pkts, self.scale)))
+
+    def close(self):
+        if not self.f.closed:
+            self._write_rows(self.reducer.flush())
+            self.f.close()
+
+
+def open_log(mode, stem, version, words, notes=()):
+    """
+    Open a log chunk; mode is "csv" or "npy". Returns (log, path).
+    Each string in notes is added to the header as a "# " comment line.
+    """
+    if mode == "npy":
+        log = BinaryLog(stem, version, words, notes)
+    elif mode == "csv":
+        log = CsvLog(stem + ".csv", version, notes)
+    else:
+        raise ValueError("Invalid storage mode %r. Choose 'csv' or 'npy'." % mode)
+    return log, log.path
+
+
+class PacketRing:
+    """
+    Preallocated ring of binary packets and their arrival times.
+
+    One reader thread put()s packets from the serial port, one writer
+    thread get()s them in blocks. When the ring is full new packets are
+    dropped and counted, so the reader never waits on the writer.
+    """
+    def __init__(self, slots, pktlen):
+        self.slots = slots
+        self.buf = np.zeros((slots, pktlen), dtype=np.uint8)
+        self.epoch = np.zeros(slots, dtype=np.float64)
+        self.head = 0          # total packets put
+        self.tail = 0          # total packets taken
+        self.dropped = 0       # packets lost because the ring was full
+        self.highWater = 0     # most packets ever waiting in the ring
+        self.cond = threading.Condition()
+
+    def put(self, pkt, epoch):
+        with self.cond:
+            fill = self.head - self.tail
+            if fill >= self.slots:
+                self.dropped += 1
+                return False
+        i = self.head % self.slots   # free slot, only the reader touches it
+        self.buf[i] = np.frombuffer(pkt, dtype=np.uint8)
+        self.epoch[i] = epoch
+        with self.cond:
+            self.head += 1
+            self.highWater = max(self.highWater, fill + 1)
+            self.cond.notify()
+        return True
+
+    def get(self, maxCount, timeout=None):
+        """Wait up to timeout sec for packets, return copies (epochs, pkts) of up to maxCount."""
+        with self.cond:
+            if self.head == self.tail:
+                self.cond.wait(timeout)
+            n = min(self.head - self.tail, maxCount)
+        idx = (self.tail + np.arange(n)) % self.slots
+        epochs = self.epoch[idx]     # fancy indexing makes copies
+        pkts = self.buf[idx]
+        with self.cond:
+            self.tail += n
+        return epochs, pkts
+
+
+class FrameParser:
+    """
+    Split a byte stream into packet payloads.
+
+    framed=True: "K" packets, validated by sync word and CRC. After a bad
+    or missing byte, scans forward to the next valid frame. framed=False:
+    plain "J" packets, cut every 4*words bytes with no check possible.
+    """
+    def __init__(self, words, framed=True):
+        self.framed = framed
+        self.paylen = 4 * words
+        self.frameLen = self.paylen + 6 if framed else self.paylen
+        self.buf = bytearray()
+        self.inSync = False
+        self.reset_counts()
+
+    def reset_counts(self):
+        self.packets = 0        # valid packets returned
+        self.resyncs = 0        # times the stream went out of sync
+        self.skipped = 0        # bytes discarded while searching for sync
+        self.crcErrors = 0      # frames with good sync but bad CRC
+        self.seqGaps = 0        # breaks in the sequence numbers
+        self.lost = 0           # packets missing according to sequence numbers
+        self.lastSeq = None
+
+    def _skip(self, n):
+        if n > 0:
+            self.skipped += n
+            if self.inSync:
+                self.resyncs += 1
+                self.inSync = False
+
+    def feed(self, data):
+        """Add received bytes, return list of complete packet payloads."""
+        buf = self.buf
+        buf += data
+        out = []
+        pos = 0
+        if not self.framed:
+            while len(buf) - pos >= self.frameLen:
+                out.append(bytes(buf[pos:pos+self.frameLen]))
+                pos += self.frameLen
+            del buf[:pos]
+            self.packets += len(out)
+            return out
+
+        while True:
+            i = buf.find(SYNC, pos)
+            if i < 0:   # no sync yet; keep a trailing A5, it may be half a sync word
+                keep = len(buf) - 1 if buf.endswith(SYNC[:1]) else len(buf)
+                self._skip(keep - pos)
+                pos = keep
+                break
+            self._skip(i - pos)
+            pos = i
+            if len(buf) - i < self.frameLen:   # frame not complete yet
+                break
+            end = i + self.frameLen
+            crc = (buf[end-2] << 8) | buf[end-1]
+            if binascii.crc_hqx(buf[i+2:end-2], 0) != crc:
+                self.crcErrors += 1
+                self._skip(1)                  # sync word was probably data, look again
+                pos = i + 1
+                continue
+            seq = (buf[i+2] << 8) | buf[i+3]
+            if self.lastSeq is not None and seq != ((self.lastSeq + 1) & 0xFFFF):
+                self.seqGaps += 1
+                self.lost += (seq - self.lastSeq - 1) & 0xFFFF
+            self.lastSeq = seq
+            self.inSync = True
+            out.append(bytes(buf[i+4:end-2]))
+            pos = end
+        del buf[:pos]
+        self.packets += len(out)
+        return out
+
+    def note(self):
+        """Counters as a one-line summary, for log headers and status lines."""
+        if not self.framed:
+            return "unframed J packets: %d (no resync or gap check)" % self.packets
+        return ("packets: %d lost: %d in %d gaps  resyncs: %d skipped bytes: %d crc errors: %d"
+                % (self.packets, self.lost, self.seqGaps, self.resyncs,
+                   self.skipped, self.crcErrors))
+
+
+def start_stream(ser, words, framed=True, wait=2.0):
+    """
+    Start the binary packet stream, return a FrameParser for it.
+    Asks for framed "K" packets first; if none arrive within wait seconds
+    (firmware without "K"), stops and asks for plain "J" packets instead.
+    """
+    if framed:
+        cmd = "K%d" % words
+        ser.write(cmd.encode())
+        print("Sent: %s" % cmd)
+        parser = FrameParser(words, framed=True)
+        tStop = time.time() + wait
+        while time.time() < tStop:
+            if parser.feed(ser.read(max(1, ser.in_waiting))):
+                parser.reset_counts()          # startup packets are not logged
+                return parser
+        print("No framed packets received, falling back to J%d (no resync possible)" % words)
+        ser.write(b"s")
+        time.sleep(0.5)
+        ser.reset_input_buffer()
+    cmd = "J%d" % words
+    ser.write(cmd.encode())
+    print("Sent: %s" % cmd)
+    return FrameParser(words, framed=False)
+
+
+def npy_to_csv(counts_path, csv_path=None, block=100000):
+    """Convert a <stem>_counts.npy / <stem>_epoch.npy pair back to CSV text."""
+    stem = counts_path[:-len("_counts.npy")]
+    if csv_path is None:
+        csv_path = stem + ".csv"
+    counts = np.load(counts_path, mmap_mode='r')
+    epochs = np.load(stem + "_epoch.npy", mmap_mode='r')
+    n = min(len(counts), len(epochs))    # a crashed logger may leave one file a row ahead
+    fmt = "%.2f, " + ",".join(["%d"] * counts.shape[1])
+    with open(csv_path, 'w') as f:
+        f.write("%s\n" % CSV_HEADER)
+        info = stem + "_info.txt"
+        if os.path.exists(info):
+            with open(info) as fi:
+                f.write(fi.read())
+        for i in range(0, n, block):
+            j = min(n, i + block)
+            rows = np.column_stack((epochs[i:j], counts[i:j].astype(np.float64)))
+            np.savetxt(f, rows, fmt=fmt)
+    return csv_path, n
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: %s <stem>_counts.npy [...]" % sys.argv[0])
+        sys.exit(1)
+    for fname in sys.argv[1:]:
+        csv_path, n = npy_to_csv(fname)
+        print("%s: %d packets -> %s" % (fname, n, csv_path))
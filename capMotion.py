@@ -12,14 +12,61 @@ Excludes illumination-change frames (clouds) from noise floor measurement.
   Diagnostic printout of changed pixels and noise floor for tuning.  
   Added brightness-jump detection to exclude clouds from noise floor.  
   Tuned parameters for good sensitivity with low false triggers.  
+
+2026-10-18  v1.1
+  Threaded pipeline: capture thread -> bounded frame queue -> analysis
+  thread (resize/gray/blur, diff, background update) -> main loop (noise
+  floor, trigger, event window) -> writer pool (JPEG encode + save).
+  When analysis falls behind, the oldest queued frame is dropped and
+  counted rather than stalling the camera; the main loop never waits on disk.
+  DIAGNOSTIC also prints per-stage timing and drop counters.
+
+2026-10-18  v1.2
+  Analyse the Y plane of the camera's low-res YUV420 stream (lores, AW x AH)
+  in place, instead of resizing + converting every full BGR frame. Each
+  capture_request() travels down the pipeline and is released after the
+  trigger decision; the full-resolution main frame is copied out only for
+  triggered frames, the ones save_best() may write.
+
+2026-10-18  v1.3
+  Noise floor from a sliding histogram of changed-pixel counts (NoiseFloor),
+  O(1) per frame instead of np.percentile over the whole history, so the
+  history can be long (NOISE_SAMPLES) while arming still happens after
+  NOISE_WARMUP frames. Initial background is a running per-pixel median
+  estimate updated frame by frame, instead of np.median over a frame stack.
+
+2026-10-18  v1.4
+  Event clips: the hardware encoder (H.264 or MJPEG) runs on the main
+  stream continuously into ClipRing, which keeps the last
+  CLIP_BUFFER_BYTES of compressed frames, always starting at a keyframe.
+  A trigger writes the frames from CLIP_PRE_SEC before it until
+  CLIP_POST_SEC after the event ends, to clip_<time>.h264 (or .mjpeg) plus
+  an mkvmerge timecode file, from a background writer thread.
+
+2026-10-18  v1.5
+  Regions of interest: ROIS polygons are drawn once into a label image at
+  analysis resolution. Only their bounding box is blurred, diffed and kept
+  as background, and only pixels inside a region are counted. Each region
+  has its own noise floor and MIN_PIXELS; any region over its threshold
+  triggers. Counts come from one bincount per frame over (tile, region)
+  cells, so per-tile counts are free and a region only counts tiles with
+  at least TILE_MIN_PX changed pixels (scattered noise is ignored). With no
+  ROIS the whole frame is counted pixel by pixel, as before.
 """
 
 import cv2
 import numpy as np
-from picamera2 import Picamera2
+from picamera2 import Picamera2, MappedArray
+from picamera2.encoders import H264Encoder, MJPEGEncoder
+from picamera2.outputs import Output
 from datetime import datetime
 import time
 import os
+import bisect
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # ── tunables ──────────────────────────────────────────────────────────────────
 RESOLUTION       = (1280, 720)
@@ -31,50 +78,425 @@ BLUR_KSIZE       = 5         # Gaussian blur kernel for noise reduction
 SCALE            = 0.5       # analyse at half resolution
 WINDOW_FRAMES    = 8         # max frames to buffer before forcing a save
 BACKGROUND_ALPHA = 0.05      # background adaptation rate (~12 sec time constant @ 8fps)
-NOISE_SAMPLES    = 64        # quiet frames used to measure noise floor
+NOISE_SAMPLES    = 2048      # quiet frames used to measure noise floor (~6 min @ 6fps)
+NOISE_WARMUP     = 64        # quiet frames needed before arming
+NOISE_QUANTILE   = 0.95      # noise floor = this quantile of changed_px on quiet frames
+BG_FRAMES        = 16        # frames used to build the initial background
 NOISE_MULTIPLIER = 10        # MIN_PIXELS = this * 95th-percentile of noise floor
 MAX_MIN_PIXELS   = 5000      # hard ceiling on MIN_PIXELS — vehicles always exceed this
 BRIGHTNESS_JUMP  = 0.05      # fraction change in mean brightness that flags illumination event
+MIN_MIN_PIXELS   = 200       # floor on the automatic MIN_PIXELS
 DIAGNOSTIC       = True      # print changed_px every frame — set False once tuned
+# Regions of interest: polygons in full-resolution pixel coordinates (as in the
+# saved JPEGs). Optional per-region "multiplier", "floor", "ceiling" replace
+# NOISE_MULTIPLIER, MIN_MIN_PIXELS, MAX_MIN_PIXELS; "min_pixels" fixes the
+# threshold instead. No regions: the whole frame is one region.
+ROIS             = [
+    # {"name": "road",  "polygon": [(0, 420), (1280, 380), (1280, 560), (0, 640)]},
+    # {"name": "drive", "polygon": [(700, 500), (900, 500), (1000, 720), (600, 720)], "min_pixels": 300},
+]
+TILE_SIZE        = 16        # tile edge (analysis pixels) for per-tile counts
+TILE_MIN_PX      = 4         # with ROIS: a tile's changed pixels only count if it has at least this many
+QUEUE_FRAMES     = 4         # captured frames waiting for analysis (oldest dropped when full)
+BUFFER_COUNT     = QUEUE_FRAMES + 5   # camera buffers: queues + frames being analysed/decided + capture
+WRITER_THREADS   = 2         # JPEG encode/save threads
+MAX_PENDING_SAVES = 8        # further saves are skipped (and counted) while this many are queued
+STATS_EVERY      = 60        # DIAGNOSTIC: print stage timing every N frames
+CLIP_CODEC       = "h264"    # event clips: "h264", "mjpeg", or None for stills only
+CLIP_BITRATE     = 4000000   # H.264 bits/s
+CLIP_BUFFER_BYTES = 16 << 20 # compressed pre-trigger ring size (bytes)
+CLIP_PRE_SEC     = 3.0       # seconds kept before the trigger (rounded back to a keyframe)
+CLIP_POST_SEC    = 2.0       # seconds kept after the event ends
+CLIP_MAX_SEC     = 60.0      # longest clip; a longer event continues in a new clip
+CLIP_QUEUE       = 500       # encoded frames waiting for the clip writer
 # ─────────────────────────────────────────────────────────────────────────────
 
 AW = int(RESOLUTION[0] * SCALE)
 AH = int(RESOLUTION[1] * SCALE)
 
 
+def build_rois(rois):
+    """
+    Precompute the region masks at analysis resolution.
+
+    Returns (crop, pixels, cell, tiles_shape): crop = (y0, y1, x0, x1), the
+    union bounding box of the regions plus the blur margin, which is all
+    that gets analysed; pixels = flat indices of the region pixels in the
+    crop (a slice if that is every pixel); cell = tile * len(regions) +
+    region for each of those pixels; tiles_shape = (rows, cols) of tiles.
+    """
+    labels = np.zeros((AH, AW), np.uint8)
+    if not rois:
+        labels[:] = 1
+    for i, roi in enumerate(rois):
+        pts = np.round(np.asarray(roi["polygon"], np.float64) * SCALE).astype(np.int32)
+        cv2.fillPoly(labels, [pts], i + 1)          # later regions win where they overlap
+    ys, xs = np.nonzero(labels)
+    if len(ys) == 0:
+        raise ValueError("ROIS: the polygons do not cover any pixel of the frame")
+    m  = BLUR_KSIZE // 2
+    y0, y1 = max(0, ys.min() - m), min(AH, ys.max() + 1 + m)
+    x0, x1 = max(0, xs.min() - m), min(AW, xs.max() + 1 + m)
+    labels = labels[y0:y1, x0:x1]
+    h, w   = labels.shape
+    tiles_shape = (-(-h // TILE_SIZE), -(-w // TILE_SIZE))
+    pixels = np.flatnonzero(labels)
+    row, col = np.divmod(pixels, w)
+    tile   = (row // TILE_SIZE) * tiles_shape[1] + col // TILE_SIZE
+    cell   = tile * max(1, len(rois)) + labels.ravel()[pixels].astype(np.intp) - 1
+    if len(pixels) == h * w:
+        pixels = slice(None)                        # whole crop: no gather needed
+    return (y0, y1, x0, x1), pixels, cell, tiles_shape
+
+ROI_NAMES = [roi.get("name", f"roi{i}") for i, roi in enumerate(ROIS)] or ["frame"]
+N_ROI     = len(ROI_NAMES)
+(Y0, Y1, X0, X1), ROI_PIXELS, ROI_CELL, TILES = build_rois(ROIS)
+TILE_FLOOR = TILE_MIN_PX if ROIS else 0     # whole frame: every changed pixel counts
+
+
 def normalize_brightness(gray):
     mean = np.mean(gray)
     if mean < 1:
         return gray
     return np.clip(gray * (128.0 / mean), 0, 255).astype(np.uint8)
 
-def to_gray_blurred(frame_bgr):
-    small = cv2.resize(frame_bgr, (AW, AH))
-    gray  = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
-    gray  = normalize_brightness(gray)
+def to_gray_blurred(luma):
+    gray  = normalize_brightness(luma)
     return cv2.GaussianBlur(gray, (BLUR_KSIZE, BLUR_KSIZE), 0)
 
-def count_motion_pixels(background, gray):
-    diff = cv2.absdiff(background, gray)
-    return int(np.count_nonzero(diff > DIFF_THRESHOLD))
+def lores_gray(request):
+    """Blurred gray image from the Y plane of the request's lores stream, read in place."""
+    with MappedArray(request, "lores") as m:
+        return to_gray_blurred(m.array[Y0:Y1, X0:X1])   # YUV420: first AH rows are Y; ROI box only
 
-def capture_bgr():
-    """Capture a frame and return it as a proper BGR array."""
-    raw = picam2.capture_array()   # XRGB8888: 4 channels, order is B,G,R,X
-    return raw[:, :, :3]           # drop the X channel — remaining is BGR
+def count_motion_pixels(background, gray):
+    """
+    Changed pixels per region, and per tile, in one bincount over the
+    region pixels. With ROIS, a tile with fewer than TILE_MIN_PX changes
+    adds nothing to the region counts; without, the count is every changed
+    pixel of the frame. Returns (counts[N_ROI], tiles[rows, cols]).
+    """
+    diff    = cv2.absdiff(background, gray)
+    changed = diff.ravel()[ROI_PIXELS] > DIFF_THRESHOLD
+    per     = np.bincount(ROI_CELL[changed], minlength=TILES[0] * TILES[1] * N_ROI)
+    per     = per.reshape(-1, N_ROI)                # tile x region
+    tiles   = per.sum(axis=1)
+    return per[tiles >= TILE_FLOOR].sum(axis=0), tiles.reshape(TILES)
+
+class NoiseFloor:
+    """
+    Sliding quantile of the changed_px counts of the last `size` quiet frames,
+    same value as np.percentile(history, 100*q). Counts go in a histogram of
+    one bin per pixel count below `top`; larger counts share the top bin and
+    are also kept in a sorted list, so order statistics that fall there are
+    still exact. The quantile bin is tracked by a pointer that moves a few
+    bins per update, so add() and value() cost O(1) in the history length
+    (plus a bisect into the list of large counts, which are rare).
+    """
+
+    def __init__(self, size, q, top):
+        self.size   = size
+        self.q      = q
+        self.top    = top
+        self.hist   = [0] * (top + 1)
+        self.values = deque()
+        self.over   = []        # sorted counts >= top
+        self.k      = 0         # bin of the lower order statistic
+        self.below  = 0         # values in bins < k
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, px):
+        px = int(px)
+        b  = min(px, self.top)
+        self.values.append(px)
+        self.hist[b] += 1
+        if b == self.top:
+            bisect.insort(self.over, px)
+        if b < self.k:
+            self.below += 1
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            b   = min(old, self.top)
+            self.hist[b] -= 1
+            if b == self.top:
+                del self.over[bisect.bisect_left(self.over, old)]
+            if b < self.k:
+                self.below -= 1
+
+    def _value(self, rank, b):
+        """Value of the order statistic `rank`, which is in bin b."""
+        if b < self.top:
+            return b
+        return self.over[rank - (len(self.values) - len(self.over))]
+
+    def value(self):
+        pos   = self.q * (len(self.values) - 1)
+        lo    = int(pos)
+        hist  = self.hist
+        while self.below > lo:                          # move k to the bin holding rank lo
+            self.k -= 1
+            self.below -= hist[self.k]
+        while self.below + hist[self.k] <= lo:
+            self.below += hist[self.k]
+            self.k += 1
+        v_lo = v_hi = self._value(lo, self.k)
+        if lo + 1 < len(self.values):
+            b = self.k
+            if lo + 1 >= self.below + hist[b]:
+                b += 1
+                while hist[b] == 0:                     # next occupied bin
+                    b += 1
+            v_hi = self._value(lo + 1, b)
+        t = pos - lo                                    # interpolate as np.percentile does
+        return v_hi - (v_hi - v_lo) * (1 - t) if t >= 0.5 else v_lo + (v_hi - v_lo) * t
+
+class ClipRing(Output):
+    """
+    Picamera2 encoder output holding the last `budget` bytes of encoded
+    frames. outputframe() runs on the encoder thread and never touches the
+    disk: frames of an open clip are passed to the clip writer's queue.
+    The ring is trimmed from the front a whole GOP at a time, so it always
+    begins with a keyframe (H.264 needs repeat=True so each keyframe
+    carries SPS/PPS and a clip can start there).
+    """
+
+    def __init__(self, budget, pre, post, longest, jobs, ext):
+        super().__init__()
+        self.budget  = budget
+        self.pre     = pre
+        self.post    = post
+        self.longest = longest
+        self.jobs    = jobs         # clip writer queue
+        self.ext     = ext
+        self.lock    = threading.Lock()
+        self.ring    = deque()      # (arrival time, timestamp us, keyframe, bytes)
+        self.size    = 0
+        self.open    = False        # a clip is being written
+        self.start   = 0.0          # its first frame's arrival time
+        self.until   = None         # end of the post-trigger tail, None while the event lasts
+        self.closing = False        # end-of-clip marker still to be queued
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, packet=None, audio=False):
+        if audio:
+            return
+        item = (time.monotonic(), timestamp, keyframe, bytes(frame))   # encoder reuses its buffer
+        with self.lock:
+            self.ring.append(item)
+            self.size += len(item[3])
+            while self.size > self.budget and len(self.ring) > 1:
+                self.size -= len(self.ring.popleft()[3])
+                while self.ring and not self.ring[0][2]:               # drop up to the next keyframe
+                    self.size -= len(self.ring.popleft()[3])
+            if self.closing:
+                self._close()
+            elif self.open:
+                self._send(item)
+                now = item[0]
+                if (self.until is not None and now >= self.until) or now - self.start >= self.longest:
+                    self._close()
+
+    def _send(self, item):
+        """Queue an item for the writer without blocking; on overrun end the clip early."""
+        try:
+            self.jobs.put_nowait(item)
+            return True
+        except queue.Full:
+            stats.bump("clip_overrun")
+            self._close()
+            return False
+
+    def _close(self):
+        self.open = False
+        try:
+            self.jobs.put_nowait(None)
+            self.closing = False
+        except queue.Full:
+            self.closing = True     # try again with the next frame
+
+    def trigger(self, t):
+        """Motion at time t: start a clip with the pre-trigger frames, or extend the open one."""
+        with self.lock:
+            self.until = None
+            if self.open or self.closing:
+                return
+            items = list(self.ring)
+            keys  = [i for i, item in enumerate(items) if item[2]]
+            if not keys:
+                return              # encoder not started yet
+            # last keyframe at least `pre` seconds back, or the oldest one if the ring is shorter
+            before = [i for i in keys if items[i][0] <= t - self.pre]
+            items  = items[before[-1] if before else keys[0]:]
+            ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+            self.open  = True
+            self.start = items[0][0]
+            if self._send(os.path.join(OUTPUT_DIR, f"clip_{ts}.{self.ext}")):
+                for item in items:
+                    if not self._send(item):
+                        break
+
+    def event_end(self, t):
+        """Event over at time t: keep writing for `post` more seconds."""
+        with self.lock:
+            if self.open and self.until is None:
+                self.until = t + self.post
+
+    def stop(self):
+        with self.lock:
+            if self.open:
+                self._close()
+        super().stop()
+
+def clip_writer(jobs):
+    """Clip writer thread: a file name opens a clip, frames are appended, None closes it."""
+    f = pts = None
+    while True:
+        job = jobs.get()
+        if isinstance(job, str):
+            fname  = job
+            f      = open(fname, "wb")
+            pts    = open(os.path.splitext(fname)[0] + "_pts.txt", "w")
+            pts.write("# timecode format v2\n")
+            t_first, n, nbytes = None, 0, 0
+        elif job is None:
+            if f is not None:
+                f.close()
+                pts.close()
+                f = None
+                stats.bump("clips")
+                print(f"  saved {fname}  ({n} frames, {nbytes / 1e6:.1f} MB)")
+        elif f is not None:
+            t0 = time.monotonic()
+            arrival, timestamp, key, data = job
+            f.write(data)
+            timestamp = timestamp if timestamp is not None else arrival * 1e6
+            t_first   = timestamp if t_first is None else t_first
+            pts.write(f"{(timestamp - t_first) / 1000:.3f}\n")
+            n, nbytes = n + 1, nbytes + len(data)
+            stats.timed("clip_write", time.monotonic() - t0)
+        jobs.task_done()
+
+def update_median(median, gray, step):
+    """Move a per-pixel running median estimate towards gray by at most step levels."""
+    diff = cv2.subtract(gray, median)                   # saturating uint8: gray above median
+    diff = cv2.min(diff, step)
+    median = cv2.add(median, diff)
+    diff = cv2.subtract(median, gray)                   # median above gray
+    return cv2.subtract(median, cv2.min(diff, step))
+
+def main_bgr(request):
+    """Copy the request's full-resolution frame out as a proper BGR array."""
+    raw = request.make_array("main")   # XRGB8888: 4 channels, order is B,G,R,X
+    return raw[:, :, :3]               # drop the X channel — remaining is BGR
+
+class StageStats:
+    """Per-stage time and event counters, shared by the pipeline threads."""
+
+    def __init__(self):
+        self.lock  = threading.Lock()
+        self.t0    = time.monotonic()
+        self.time  = {}     # stage -> (total seconds, calls)
+        self.count = {}     # counter -> n
+
+    def timed(self, stage, dt):
+        with self.lock:
+            total, n = self.time.get(stage, (0.0, 0))
+            self.time[stage] = (total + dt, n + 1)
+
+    def bump(self, counter):
+        with self.lock:
+            self.count[counter] = self.count.get(counter, 0) + 1
+
+    def report(self):
+        """One line of mean ms per stage and the counters, then start a new interval."""
+        with self.lock:
+            elapsed = time.monotonic() - self.t0
+            frames  = self.time.get("analyse", (0.0, 0))[1]
+            parts   = [f"{frames / elapsed:4.1f} fps"]
+            parts  += [f"{s} {1000 * total / n:5.1f}ms" for s, (total, n) in self.time.items() if n]
+            parts  += [f"{c} {n}" for c, n in self.count.items()]
+            self.t0, self.time, self.count = time.monotonic(), {}, {}
+        return "  ".join(parts)
+
+stats = StageStats()
 
 def save_best(window, label):
+    t0 = time.monotonic()
     best_px, best_frame = max(window, key=lambda x: x[0])
     ts    = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
     fname = os.path.join(OUTPUT_DIR, f"motion_{ts}.jpg")
     cv2.imwrite(fname, best_frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    stats.timed("write", time.monotonic() - t0)
     print(f"  saved {fname}  ({label}, peak {best_px} px, {len(window)} frames)")
 
+def submit_save(window, label):
+    """Queue save_best() on the writer pool; skip it if the disk is that far behind."""
+    pending[:] = [f for f in pending if not f.done()]
+    if len(pending) >= MAX_PENDING_SAVES:
+        stats.bump("skipped_saves")
+        return
+    pending.append(writer.submit(save_best, window, label))
+
+def capture_loop():
+    """Capture thread: keep the camera going, dropping the oldest frame if analysis lags."""
+    while not stop.is_set():
+        t0      = time.monotonic()
+        request = picam2.capture_request()
+        stats.timed("capture", time.monotonic() - t0)
+        try:
+            frames.put_nowait(request)
+        except queue.Full:
+            try:
+                frames.get_nowait().release()
+                stats.bump("dropped")
+            except queue.Empty:
+                pass
+            frames.put_nowait(request)  # only this thread puts, so there is room now
+
+def release_queued(q):
+    """Give the camera back the buffers of requests still in a queue."""
+    while True:
+        try:
+            item = q.get_nowait()
+        except queue.Empty:
+            return
+        (item[0] if isinstance(item, tuple) else item).release()
+
+def analysis_loop():
+    """Analysis thread: blur, diff and background adaptation, one frame at a time."""
+    global background
+    prev_mean = None    # for brightness-jump detection
+    while not stop.is_set():
+        try:
+            request = frames.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        t0   = time.monotonic()
+        gray = lores_gray(request)
+
+        counts, tiles = count_motion_pixels(background, gray)
+
+        # Detect illumination jumps (clouds) by monitoring mean brightness
+        curr_mean          = float(np.mean(gray))
+        brightness_stable  = (prev_mean is None or
+                               abs(curr_mean - prev_mean) / max(prev_mean, 1.0) < BRIGHTNESS_JUMP)
+        prev_mean          = curr_mean
+
+        # Always adapt background on brightness-stable frames, regardless of trigger state
+        if brightness_stable:
+            background = cv2.addWeighted(background, 1.0 - BACKGROUND_ALPHA,
+                                         gray, BACKGROUND_ALPHA, 0)
+        stats.timed("analyse", time.monotonic() - t0)
+        results.put((request, counts, tiles, brightness_stable))
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 picam2 = Picamera2()
 config = picam2.create_video_configuration(
     main={"size": RESOLUTION, "format": "XRGB8888"},
+    lores={"size": (AW, AH), "format": "YUV420"},
+    buffer_count=BUFFER_COUNT,
     controls={"FrameRate": FRAMERATE}
 )
 picam2.configure(config)
@@ -95,80 +517,125 @@ time.sleep(0.5)
 
 # Build background reference
 print("Building background reference...")
-bg_frames  = [to_gray_blurred(capture_bgr()) for _ in range(16)]
-background = np.median(np.stack(bg_frames), axis=0).astype(np.uint8)
+background = None
+for i in range(BG_FRAMES):
+    request = picam2.capture_request()
+    gray    = lores_gray(request)
+    request.release()
+    # big steps first, then smaller: one odd frame (a car) can only pull it a little
+    background = gray if background is None else update_median(background, gray, max(1, 128 // i))
 print("  Background reference built.")
 
+clip_jobs = queue.Queue(maxsize=CLIP_QUEUE)
+clips     = None
+if CLIP_CODEC:
+    if CLIP_CODEC == "h264":
+        encoder = H264Encoder(bitrate=CLIP_BITRATE, repeat=True, iperiod=FRAMERATE)  # keyframe every second
+    else:
+        encoder = MJPEGEncoder()
+    clips = ClipRing(CLIP_BUFFER_BYTES, CLIP_PRE_SEC, CLIP_POST_SEC, CLIP_MAX_SEC, clip_jobs,
+                     "h264" if CLIP_CODEC == "h264" else "mjpeg")
+    threading.Thread(target=clip_writer, args=(clip_jobs,), name="clips", daemon=True).start()
+    picam2.start_encoder(encoder, clips)
+
 last_saved    = 0.0
 window        = []      # list of (changed_px, frame_bgr)
 in_event      = False
-noise_history = []
-MIN_PIXELS    = 9999    # will be set automatically after warmup
-prev_mean     = None    # for brightness-jump detection
+regions       = ROIS or [{}]
+multiplier    = [roi.get("multiplier", NOISE_MULTIPLIER) for roi in regions]
+floor_px      = [roi.get("floor", MIN_MIN_PIXELS) for roi in regions]
+ceiling_px    = [roi.get("ceiling", MAX_MIN_PIXELS) for roi in regions]
+noise_floors  = [NoiseFloor(NOISE_SAMPLES, NOISE_QUANTILE, int(c // k) + 1)
+                 for c, k in zip(ceiling_px, multiplier)]
+MIN_PIXELS    = [roi.get("min_pixels", 9999) for roi in regions]   # automatic ones set after warmup
+n_frames      = 0
+
+frames  = queue.Queue(maxsize=QUEUE_FRAMES)     # capture -> analysis
+results = queue.Queue(maxsize=2)                # analysis -> main loop
+stop    = threading.Event()
+writer  = ThreadPoolExecutor(max_workers=WRITER_THREADS)
+pending = []            # save futures not yet finished
+threads = [threading.Thread(target=capture_loop, name="capture", daemon=True),
+           threading.Thread(target=analysis_loop, name="analysis", daemon=True)]
+for t in threads:
+    t.start()
 
 print(f"Motion detector running  →  saving to {OUTPUT_DIR}")
-print(f"  Measuring noise floor for {NOISE_SAMPLES} quiet frames before arming...")
+print(f"  Measuring noise floor for {NOISE_WARMUP} quiet frames before arming...")
 
 try:
     while True:
-        frame = capture_bgr()
-        gray  = to_gray_blurred(frame)
-
-        changed_px = count_motion_pixels(background, gray)
-
-        # Detect illumination jumps (clouds) by monitoring mean brightness
-        curr_mean          = float(np.mean(gray))
-        brightness_stable  = (prev_mean is None or
-                               abs(curr_mean - prev_mean) / max(prev_mean, 1.0) < BRIGHTNESS_JUMP)
-        prev_mean          = curr_mean
+        request, counts, tiles, brightness_stable = results.get()
+        t0 = time.monotonic()
 
         # Only update noise history during quiet, brightness-stable frames
         if not in_event and brightness_stable:
-            noise_history.append(changed_px)
-            if len(noise_history) > NOISE_SAMPLES:
-                noise_history.pop(0)
-            if len(noise_history) >= NOISE_SAMPLES:
-                noise_95   = np.percentile(noise_history, 95)
-                MIN_PIXELS = min(MAX_MIN_PIXELS,
-                                 max(200, int(noise_95 * NOISE_MULTIPLIER)))
+            for i, nf in enumerate(noise_floors):
+                nf.add(counts[i])
+                if len(nf) >= NOISE_WARMUP and "min_pixels" not in regions[i]:
+                    noise_95      = nf.value()
+                    MIN_PIXELS[i] = min(ceiling_px[i],
+                                        max(floor_px[i], int(noise_95 * multiplier[i])))
 
-        triggered = (len(noise_history) >= NOISE_SAMPLES) and (changed_px >= MIN_PIXELS)
+        armed      = len(noise_floors[0]) >= NOISE_WARMUP
+        triggered  = armed and any(c >= m for c, m in zip(counts, MIN_PIXELS))
+        changed_px = int(counts.sum())
 
         if DIAGNOSTIC:
-            armed  = len(noise_history) >= NOISE_SAMPLES
             stable = '' if brightness_stable else ' ILLUM'
-            print(f"  px={changed_px:6d}  min={MIN_PIXELS:6d}  "
+            r, c   = np.unravel_index(np.argmax(tiles), tiles.shape)     # busiest tile
+            rois   = "  ".join(f"{name} {n:5d}/{m:5d}" for name, n, m in zip(ROI_NAMES, counts, MIN_PIXELS))
+            print(f"  {rois}  tile {r:2d},{c:2d} {tiles[r, c]:4d}  "
                   f"{'ARMED' if armed else 'warming up':10s}{stable}"
                   f"  {'TRIGGERED' if triggered else ''}")
 
+        if triggered:
+            frame = main_bgr(request)   # full-resolution copy only when it may be saved
+        request.release()               # buffer back to the camera
+
         now = time.monotonic()
 
+        if clips is not None:
+            if triggered:
+                clips.trigger(now)
+            elif in_event:
+                clips.event_end(now)
+
         if triggered:
             in_event = True
-            window.append((changed_px, frame.copy()))
+            window.append((changed_px, frame))
 
         elif in_event:
             # Event just ended — save peak frame
             if window and (now - last_saved) >= COOLDOWN_SEC:
-                save_best(window, "event end")
+                submit_save(window, "event end")
                 last_saved = now
-            window.clear()
+            window = []         # the writer may still hold the old list
             in_event = False
 
-        # Always adapt background on brightness-stable frames, regardless of trigger state
-        if brightness_stable:
-            background = cv2.addWeighted(background, 1.0 - BACKGROUND_ALPHA,
-                                         gray, BACKGROUND_ALPHA, 0)
-
-
         # Safety valve: flush window if event runs too long
         if in_event and len(window) >= WINDOW_FRAMES:
             if (now - last_saved) >= COOLDOWN_SEC:
-                save_best(window, "window flush")
+                submit_save(window, "window flush")
                 last_saved = now
-            window.clear()
+            window = []
+
+        stats.timed("detect", time.monotonic() - t0)
+        n_frames += 1
+        if DIAGNOSTIC and n_frames % STATS_EVERY == 0:
+            print(f"  [{stats.report()}  queue {frames.qsize()}/{QUEUE_FRAMES}  "
+                  f"saves pending {sum(not f.done() for f in pending)}]")
 
 except KeyboardInterrupt:
     print("Stopped.")
 finally:
+    stop.set()
+    for t in threads:
+        t.join(timeout=2.0)
+    release_queued(frames)
+    release_queued(results)
+    writer.shutdown(wait=True)      # finish saves already queued
+    if clips is not None:
+        picam2.stop_encoder()       # closes an open clip
+        clip_jobs.join()            # and wait until it is on disk
     picam2.stop()
@@ -0,0 +1,247 @@
+#!/usr/bin/python3
+"""
+event_catalog.py  -  SQLite catalog of RShake_EventFind.py events
+
+One table of events keyed by station and absolute time (UTC epoch seconds,
+time of the envelope peak), indexed on time and magnitude (the log envelope
+'Max'), so time-window / magnitude / duration selections and per-hour or
+per-day traffic counts are queries instead of rereading every day CSV.
+RShake_EventFind.py adds each file's events as it processes it; re-processing
+a file replaces its old events.
+
+  import event_catalog
+  cat = event_catalog.EventCatalog("/home/john/RShake/events.sqlite")
+  rows = cat.query(t0, t1, stations=["R79D5"], mag_min=7.0)
+  for t, station, n, mag, dur in cat.counts("hour", t0, t1): ...
+
+Command line:
+  event_catalog.py import <csv files or dirs ...>     old per-day CSVs
+  event_catalog.py query  [--from 2020-04-19] [--to ...] [-s R79D5] [--min-mag 7] ...
+  event_catalog.py counts [--per hour|day] [same filters]
+  (--db path, default events.sqlite in the current directory)
+"""
+
+import argparse
+import datetime
+import glob
+import os
+import sqlite3
+import sys
+import warnings
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file      TEXT PRIMARY KEY,      -- day file name, eg. AM.R79D5.00.EHZ.D.2020.110
+    station   TEXT,
+    channel   TEXT,
+    starttime REAL,                  -- epoch of first sample
+    processed TEXT,                  -- when the events were found
+    vthresh   REAL,
+    events    INTEGER
+);
+CREATE TABLE IF NOT EXISTS events (
+    station   TEXT NOT NULL,
+    channel   TEXT,
+    time      REAL NOT NULL,         -- epoch (UTC) of envelope peak
+    mag       REAL,                  -- peak log envelope ('Max')
+    dur       REAL,                  -- seconds above threshold
+    num       INTEGER,               -- event number within the file
+    file      TEXT
+);
+CREATE INDEX IF NOT EXISTS events_station_time ON events (station, time);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+CREATE INDEX IF NOT EXISTS events_mag ON events (mag);
+CREATE INDEX IF NOT EXISTS events_file ON events (file);
+"""
+
+BINS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+def read_event_csv(fname):
+    """
+    Read one RShake_EventFind.py day CSV. Returns (info, events) in the form
+    process_file() returns: events are (num, start minute, Max, dur) tuples.
+    """
+    with open(fname, "r") as f:
+        f.readline()                         # column header
+        tag = f.readline().split()           # "# <file> <starttime>"
+        line = f.readline()                  # "# Processed at <iso> vThresh: x"
+    t0 = datetime.datetime.fromisoformat(tag[2].replace("Z", "+00:00"))
+    if t0.tzinfo is None:
+        t0 = t0.replace(tzinfo=datetime.timezone.utc)
+    processed, vthresh = None, None
+    if line.startswith("# Processed at"):
+        parts = line.split()
+        processed = parts[3]
+        if "vThresh:" in parts:
+            vthresh = float(parts[parts.index("vThresh:") + 1])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")      # file with no events
+        dat = np.loadtxt(fname, delimiter=",", comments="#", skiprows=1, ndmin=2)
+    events = [(int(r[0]), r[1], r[2], r[3]) for r in dat] if dat.size else []
+    fparts = tag[1].split(".")
+    info = {"file": tag[1], "station": fparts[1],
+            "channel": fparts[3] if len(fparts) > 3 else "",
+            "starttime": t0.timestamp(), "csv": fname, "events": len(events),
+            "processed": processed, "vThresh": vthresh}
+    return info, events
+
+
+def _epoch(t):
+    """None, epoch seconds, datetime, or ISO date/time string -> epoch seconds."""
+    if t is None or isinstance(t, (int, float)):
+        return t
+    if isinstance(t, str):
+        t = datetime.datetime.fromisoformat(t.replace("Z", "+00:00"))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=datetime.timezone.utc)
+    return t.timestamp()
+
+
+class EventCatalog:
+    """The catalog database. Safe to reopen; the schema is created if missing."""
+
+    def __init__(self, path="events.sqlite"):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_file(self, info, events, vthresh=None):
+        """Store the events of one processed file, replacing any earlier run of it."""
+        t0 = info["starttime"]
+        rows = [(info["station"], info.get("channel", ""), t0 + 60.0 * tmin,
+                 float(vmax), float(dur), int(num), info["file"])
+                for num, tmin, vmax, dur in events]
+        processed = info.get("processed") or datetime.datetime.now().astimezone().isoformat()
+        if vthresh is None:
+            vthresh = info.get("vThresh")
+        with self.db:                        # one transaction
+            self.db.execute("DELETE FROM events WHERE file = ?", (info["file"],))
+            self.db.executemany("INSERT INTO events VALUES (?,?,?,?,?,?,?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?)",
+                            (info["file"], info["station"], info.get("channel", ""),
+                             t0, processed, vthresh, len(rows)))
+        return len(rows)
+
+    def import_csv(self, paths, verbose=True):
+        """Add old per-day CSVs (files, directories or glob patterns)."""
+        files = []
+        for p in paths:
+            if os.path.isdir(p):
+                files += sorted(glob.glob(os.path.join(p, "*.*.*.csv")))
+            else:
+                files += sorted(glob.glob(p)) or [p]
+        total = 0
+        for fname in files:
+            try:
+                info, events = read_event_csv(fname)
+            except (OSError, ValueError, IndexError) as e:
+                print("%s: skipped (%s)" % (fname, e))
+                continue
+            total += self.add_file(info, events)
+            if verbose:
+                print("%s: %d events" % (fname, len(events)))
+        return len(files), total
+
+    def _where(self, t0, t1, stations, mag_min, mag_max, dur_min, dur_max):
+        terms, args = [], []
+        for sql, v in (("time >= ?", _epoch(t0)), ("time < ?", _epoch(t1)),
+                       ("mag >= ?", mag_min), ("mag <= ?", mag_max),
+                       ("dur >= ?", dur_min), ("dur <= ?", dur_max)):
+            if v is not None:
+                terms.append(sql)
+                args.append(v)
+        if stations:
+            terms.append("station IN (%s)" % ",".join("?" * len(stations)))
+            args += list(stations)
+        return (" WHERE " + " AND ".join(terms)) if terms else "", args
+
+    def query(self, t0=None, t1=None, stations=None, mag_min=None, mag_max=None,
+              dur_min=None, dur_max=None, limit=None):
+        """Events in [t0, t1) matching the filters, in time order:
+        list of (station, channel, time, mag, dur)."""
+        where, args = self._where(t0, t1, stations, mag_min, mag_max, dur_min, dur_max)
+        sql = "SELECT station, channel, time, mag, dur FROM events" + where + " ORDER BY time"
+        if limit:
+            sql += " LIMIT %d" % int(limit)
+        return self.db.execute(sql, args).fetchall()
+
+    def times(self, station, t0=None, t1=None, **filters):
+        """One station's events as sorted numpy arrays (time, mag, dur)."""
+        rows = self.query(t0, t1, [station], **filters)
+        if not rows:
+            return np.empty(0), np.empty(0), np.empty(0)
+        a = np.array([r[2:] for r in rows], dtype=np.float64)
+        return a[:, 0], a[:, 1], a[:, 2]
+
+    def counts(self, per="hour", t0=None, t1=None, stations=None, mag_min=None,
+               mag_max=None, dur_min=None, dur_max=None):
+        """Aggregates per time bin (UTC) and station:
+        list of (bin start epoch, station, count, mean mag, mean dur)."""
+        size = BINS[per]
+        where, args = self._where(t0, t1, stations, mag_min, mag_max, dur_min, dur_max)
+        sql = ("SELECT CAST(time / %d AS INTEGER) * %d AS bin, station, COUNT(*), AVG(mag), AVG(dur)"
+               " FROM events%s GROUP BY bin, station ORDER BY bin, station" % (size, size, where))
+        return self.db.execute(sql, args).fetchall()
+
+    def stations(self):
+        return [r[0] for r in self.db.execute("SELECT DISTINCT station FROM events ORDER BY station")]
+
+
+def _utc(t):
+    return datetime.datetime.fromtimestamp(t, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-4]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RShake event catalog")
+    parser.add_argument("--db", default="events.sqlite", help="catalog file")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="add per-day event CSVs")
+    imp.add_argument("paths", nargs="+")
+    for name in ("query", "counts"):
+        p = sub.add_parser(name)
+        p.add_argument("--from", dest="t0", help="start, ISO date/time UTC")
+        p.add_argument("--to", dest="t1", help="end, ISO date/time UTC")
+        p.add_argument("-s", "--stations", help="comma separated station list")
+        p.add_argument("--min-mag", type=float)
+        p.add_argument("--max-mag", type=float)
+        p.add_argument("--min-dur", type=float)
+        p.add_argument("--max-dur", type=float)
+        if name == "query":
+            p.add_argument("--limit", type=int)
+        else:
+            p.add_argument("--per", choices=list(BINS), default="hour")
+    args = parser.parse_args(argv)
+
+    with EventCatalog(args.db) as cat:
+        if args.cmd == "import":
+            nfiles, nev = cat.import_csv(args.paths)
+            print("# %d files, %d events -> %s" % (nfiles, nev, args.db))
+            return
+        filters = dict(stations=args.stations.split(",") if args.stations else None,
+                       mag_min=args.min_mag, mag_max=args.max_mag,
+                       dur_min=args.min_dur, dur_max=args.max_dur)
+        if args.cmd == "query":
+            print("time_utc, station, channel, Max, dur(s)")
+            for station, channel, t, mag, dur in cat.query(args.t0, args.t1, limit=args.limit, **filters):
+                print("%s, %s, %s, %2.1f, %4.1f" % (_utc(t), station, channel, mag, dur))
+        else:
+            print("%s_utc, station, count, avg_Max, avg_dur(s)" % args.per)
+            for t, station, n, mag, dur in cat.counts(args.per, args.t0, args.t1, **filters):
+                print("%s, %s, %d, %4.2f, %4.1f" % (_utc(t)[:19], station, n, mag, dur))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -3,7 +3,11 @@
 DFRobot SEN0366 Laser Rangefinder Serial Communication
 Communicates with a laser rangefinder over serial port to read distance measurements.
 Logs distance readings to a CSV file with timestamp, average, standard deviation, range, 
-and trend.
+and trend. Statistics cover a fixed time span and are updated in O(1) per reading.
+Readings are either polled one at a time, or streamed from the device's
+continuous measurement mode (STREAMING) for a higher sample rate.
+With several serial ports on the command line, all devices are read
+concurrently and logged side by side on a common time grid.
 
 """
 
@@ -12,9 +16,12 @@ import time
 import sys
 import csv
 import os
+import queue
+import threading
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import statistics
+from logwriter import LogWriter
 
 class LaserRangefinder:
     def __init__(self, port, baudrate=9600, timeout=1.5):
@@ -36,6 +43,20 @@ class LaserRangefinder:
         
         # Command to set resolution to 0.1mm: [FA 04 0C 02 F4]
         self.config_command = bytes([0xFA, 0x04, 0x0C, 0x02, 0xF4])
+
+        # Continuous measurement: [80 06 03 77], device then sends frames
+        # [80 06 83 ASCII-distance CS], 12 bytes at 0.1mm or 11 at 1mm resolution
+        self.continuous_command = bytes([0x80, 0x06, 0x03, 0x77])
+        self.stream_header = bytes([0x80, 0x06, 0x83])
+
+        # Shutdown, ends continuous measurement: [80 04 02 7A]
+        self.stop_command = bytes([0x80, 0x04, 0x02, 0x7A])
+
+        self.streaming = False
+        self.stream_buf = bytearray()
+        self.frame_errors = 0          # checksum failures / skipped bytes in stream
+        self.frame_times = deque(maxlen=50)  # recent frame timestamps, for sample_rate
+        self.last_latency = None       # sec: polling round trip, or stream frame age when read
         
     def connect(self):
         """Open the serial connection and configure the device."""
@@ -105,6 +126,8 @@ class LaserRangefinder:
     def disconnect(self):
         """Close the serial connection."""
         if self.ser and self.ser.is_open:
+            if self.streaming:
+                self.stop_streaming()
             self.ser.close()
             print("Disconnected")
     
@@ -125,10 +148,12 @@ class LaserRangefinder:
             self.ser.reset_output_buffer()
             
             # Send the read distance command
+            t_start = time.time()
             self.ser.write(self.read_command)
             
             # Read the response - exactly 12 bytes
             response = self.ser.read(12)
+            self.last_latency = time.time() - t_start
             
             if len(response) < 4:
                 print("Invalid response: too short")
@@ -159,6 +184,95 @@ class LaserRangefinder:
             print(f"Error reading distance: {e}")
             return None
     
+    def start_streaming(self):
+        """Start the device's continuous measurement mode."""
+        self.ser.reset_input_buffer()
+        self.ser.write(self.continuous_command)
+        self.stream_buf = bytearray()
+        self.frame_times.clear()
+        self.streaming = True
+
+    def stop_streaming(self):
+        """Stop continuous measurement."""
+        try:
+            self.ser.write(self.stop_command)
+        except serial.SerialException as e:
+            print(f"Error stopping continuous measurement: {e}")
+        self.streaming = False
+
+    def _parse_frames(self):
+        """
+        Take all complete frames out of stream_buf.
+
+        Returns:
+            list: (end, distance_str) per frame, end = index just past the
+                  frame in what is left of stream_buf (may be negative)
+        """
+        buf = self.stream_buf
+        frames = []
+        pos = 0
+        while True:
+            i = buf.find(self.stream_header, pos)
+            if i < 0:
+                keep = max(pos, len(buf) - (len(self.stream_header) - 1))
+                self.frame_errors += keep - pos
+                pos = keep
+                break
+            self.frame_errors += i - pos
+            pos = i
+            # need 12 bytes, or 11 followed by the next header, to tell the frame length
+            avail = len(buf) - i
+            if avail < 11 or (avail < 12 and not buf.startswith(self.stream_header[:1], i + 11)):
+                break
+            for length in (12, 11):
+                frame = buf[i:i + length]
+                if len(frame) == length and self.verify_checksum(frame):
+                    frames.append((i + length, frame[3:-1].decode('ascii', errors='ignore')))
+                    pos = i + length
+                    break
+            else:
+                self.frame_errors += 1
+                pos = i + 1       # not a frame after all, look for the next header
+        del buf[:pos]
+        return [(end - pos, dist) for end, dist in frames]
+
+    def stream(self):
+        """
+        Generator of readings from continuous measurement mode.
+        Reads whatever bytes have arrived and parses all the frames in them.
+
+        Yields:
+            (timestamp, distance_str) per frame; (timestamp, None) when no
+            frame has arrived for the read timeout.
+        """
+        if not self.streaming:
+            self.start_streaming()
+        byte_time = 10.0 / self.baudrate     # 8N1: 10 bit times per byte
+        last_frame = time.time()
+        while self.streaming:
+            chunk = self.ser.read(max(1, self.ser.in_waiting))
+            t_read = time.time()
+            self.stream_buf += chunk
+            frames = self._parse_frames()
+            for end, distance_str in frames:
+                # back-date by the time to receive the bytes that came after this frame
+                ts = t_read - (len(self.stream_buf) - end) * byte_time
+                self.frame_times.append(ts)
+                self.last_latency = t_read - ts
+                last_frame = t_read
+                yield ts, distance_str
+            if not frames and t_read - last_frame >= self.timeout:
+                last_frame = t_read
+                yield t_read, None
+
+    @property
+    def sample_rate(self):
+        """Frames per second over the last few frames, or None."""
+        if len(self.frame_times) < 2:
+            return None
+        span = self.frame_times[-1] - self.frame_times[0]
+        return (len(self.frame_times) - 1) / span if span > 0 else None
+
     def verify_checksum(self, data):
         """
         Verify the checksum of the received data.
@@ -181,57 +295,297 @@ class LaserRangefinder:
         
         return checksum_calc == received_checksum
 
-def calculate_trend(historical_averages, current_time, lookback_seconds=20):
+class RollingStats:
     """
-    Calculate the trend by comparing current average with average from lookback_seconds ago.
-    
-    Args:
-        historical_averages (deque): Deque of (timestamp, average) tuples
-        current_time (float): Current timestamp
-        lookback_seconds (int): How many seconds to look back
-        
-    Returns:
-        float: Trend in meters (positive = increasing, negative = decreasing), or None if insufficient data
+    Mean, standard deviation and range of the readings from the last
+    `span` seconds, updated in O(1) per reading.
+
+    Mean and variance use Welford's update, with the matching removal step
+    when a reading falls out of the window. Min and max come from monotonic
+    deques, so the range needs no scan of the window either.
     """
-    if len(historical_averages) < 2:
-        return None
-    
-    target_time = current_time - lookback_seconds
-    
-    # Find the closest historical average to the target time
-    closest_entry = None
-    min_time_diff = float('inf')
-    
-    for timestamp, avg in historical_averages:
-        time_diff = abs(timestamp - target_time)
-        if time_diff < min_time_diff:
-            min_time_diff = time_diff
-            closest_entry = (timestamp, avg)
-    
-    if closest_entry is None:
-        return None
-    
-    # Get current average (most recent entry)
-    current_avg = historical_averages[-1][1]
-    historical_avg = closest_entry[1]
-    
-    # Calculate trend (change over time period)
-    trend = current_avg - historical_avg
-    
-    return trend
+    RESYNC = 10000  # recompute sums from the window after this many removals (float drift)
+
+    def __init__(self, span):
+        self.span = span
+        self.window = deque()   # (seq, timestamp, value)
+        self.maxq = deque()     # (seq, value), values decreasing
+        self.minq = deque()     # (seq, value), values increasing
+        self.seq = 0
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0           # sum of squared differences from the mean
+        self.removals = 0
+
+    def add(self, timestamp, x):
+        """Add a reading and drop any older than timestamp - span."""
+        self.seq += 1
+        self.window.append((self.seq, timestamp, x))
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        while self.maxq and self.maxq[-1][1] <= x:
+            self.maxq.pop()
+        self.maxq.append((self.seq, x))
+        while self.minq and self.minq[-1][1] >= x:
+            self.minq.pop()
+        self.minq.append((self.seq, x))
+
+        cutoff = timestamp - self.span
+        while self.window[0][1] <= cutoff:
+            self._remove()
+
+    def _remove(self):
+        seq, _, x = self.window.popleft()
+        if self.maxq[0][0] == seq:
+            self.maxq.popleft()
+        if self.minq[0][0] == seq:
+            self.minq.popleft()
+        self.n -= 1
+        if self.n == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        old_mean = self.mean
+        self.mean = old_mean - (x - old_mean) / self.n
+        self.m2 -= (x - old_mean) * (x - self.mean)
+        self.removals += 1
+        if self.removals >= self.RESYNC:
+            self._resync()
+
+    def _resync(self):
+        values = [x for _, _, x in self.window]
+        self.mean = sum(values) / self.n
+        self.m2 = sum((x - self.mean) ** 2 for x in values)
+        self.removals = 0
+
+    def __len__(self):
+        return self.n
+
+    def std(self):
+        """Sample standard deviation, 0 with fewer than 2 readings."""
+        if self.n < 2:
+            return 0.0
+        return (max(self.m2, 0.0) / (self.n - 1)) ** 0.5
 
-def main():
+    def range(self):
+        """Max - min of the window, 0 if empty."""
+        if self.n == 0:
+            return 0.0
+        return self.maxq[0][1] - self.minq[0][1]
+
+
+class RollingTrend:
+    """
+    Least-squares straight line through the readings from the last `span`
+    seconds, kept as running sums so each reading costs O(1).
+    """
+    RESYNC = 10000  # recompute sums from the window after this many removals (float drift)
+
+    def __init__(self, span):
+        self.span = span
+        self.window = deque()   # (t, value), t relative to t0
+        self.t0 = None
+        self.st = self.sy = self.stt = self.sty = 0.0
+        self.removals = 0
+
+    def add(self, timestamp, y):
+        if self.t0 is None:
+            self.t0 = timestamp  # keep t small so t*t doesn't lose precision
+        t = timestamp - self.t0
+        self.window.append((t, y))
+        self.st += t
+        self.sy += y
+        self.stt += t * t
+        self.sty += t * y
+
+        cutoff = t - self.span
+        while self.window[0][0] <= cutoff:
+            ot, oy = self.window.popleft()
+            self.st -= ot
+            self.sy -= oy
+            self.stt -= ot * ot
+            self.sty -= ot * oy
+            self.removals += 1
+        if self.removals >= self.RESYNC:
+            shift = self.window[0][0]   # re-base t0 to the start of the window
+            self.t0 += shift
+            self.window = deque((t - shift, y) for t, y in self.window)
+            self.st = sum(t for t, _ in self.window)
+            self.sy = sum(y for _, y in self.window)
+            self.stt = sum(t * t for t, _ in self.window)
+            self.sty = sum(t * y for t, y in self.window)
+            self.removals = 0
+
+    def slope(self):
+        """Fitted slope in units per second, or None if not enough data."""
+        n = len(self.window)
+        if n < 2:
+            return None
+        denom = n * self.stt - self.st * self.st
+        if denom <= 0:
+            return None
+        return (n * self.sty - self.st * self.sy) / denom
+
+    def trend(self):
+        """
+        Change over the window, as slope * span (positive = increasing),
+        or None if insufficient data.
+        """
+        slope = self.slope()
+        return None if slope is None else slope * self.span
+
+class RangefinderArray:
+    """
+    Several rangefinders read concurrently, one thread per device, with
+    their readings binned onto a common time grid of `grid` seconds.
+
+    Each grid row has, per device: number of readings, average, standard
+    deviation and range. Per-device counters (readings, errors, error rate,
+    latency) are kept in self.counters.
+    """
+    FIELDS = ('n', 'avg', 'std_mm', 'range_mm')
+
+    def __init__(self, ports, grid=1.0, streaming=True, interval=0, lateness=2.0):
+        self.devices = [LaserRangefinder(p) for p in ports]
+        self.names = [os.path.basename(p) for p in ports]
+        self.grid = grid
+        self.streaming = streaming
+        self.interval = interval
+        self.lateness = lateness      # sec to wait for slow devices before closing a grid cell
+        self.readings = queue.Queue()
+        self.stop = threading.Event()
+        self.threads = []
+        self.bins = {}                # grid index -> per-device [n, sum, sumsq, min, max]
+        self.counters = [dict(readings=0, errors=0, latency_sum=0.0, latency_max=0.0)
+                         for _ in ports]
+
+    def connect(self):
+        """Connect (and configure) all devices in parallel. Returns True if all connected."""
+        with ThreadPoolExecutor(max_workers=len(self.devices)) as pool:
+            return all(pool.map(lambda d: d.connect(), self.devices))
+
+    def disconnect(self):
+        self.stop.set()               # readers exit at their next reading or timeout
+        for t in self.threads:
+            t.join(timeout=3)
+        for d in self.devices:
+            d.disconnect()            # still streaming, so this sends the stop command
+
+    def start(self):
+        for i in range(len(self.devices)):
+            t = threading.Thread(target=self._reader, args=(i,), daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _reader(self, i):
+        """Device thread: push (device, timestamp, value or None) onto the queue."""
+        dev = self.devices[i]
+        c = self.counters[i]
+        source = dev.stream() if self.streaming else poll_readings(dev, self.interval)
+        try:
+            for ts, distance in source:
+                if self.stop.is_set():
+                    break
+                try:
+                    value = float(distance) if distance else None
+                except ValueError:
+                    value = None
+                if value is None:
+                    c['errors'] += 1
+                else:
+                    c['readings'] += 1
+                    if dev.last_latency is not None:
+                        c['latency_sum'] += dev.last_latency
+                        c['latency_max'] = max(c['latency_max'], dev.last_latency)
+                self.readings.put((i, ts, value))
+        except serial.SerialException as e:
+            print(f"{self.names[i]}: serial error: {e}")
+            self.readings.put((i, time.time(), None))
+
+    def counter_summary(self):
+        """One line per device: readings, error rate, mean / max latency."""
+        lines = []
+        for name, c in zip(self.names, self.counters):
+            total = c['readings'] + c['errors']
+            err_rate = c['errors'] / total if total else 0.0
+            lat = c['latency_sum'] / c['readings'] if c['readings'] else 0.0
+            lines.append(f"{name}: readings {c['readings']} errors {c['errors']} "
+                         f"({100*err_rate:.1f}%) latency avg {1000*lat:.1f} ms "
+                         f"max {1000*c['latency_max']:.1f} ms")
+        return lines
+
+    def header(self):
+        return ['timestamp'] + [f"{name}_{f}" for name in self.names for f in self.FIELDS]
+
+    def _add(self, i, ts, value):
+        key = int(ts // self.grid)
+        cell = self.bins.setdefault(key, [None] * len(self.devices))
+        acc = cell[i]
+        if acc is None:
+            cell[i] = [1, value, value * value, value, value]
+        else:
+            acc[0] += 1
+            acc[1] += value
+            acc[2] += value * value
+            acc[3] = min(acc[3], value)
+            acc[4] = max(acc[4], value)
+
+    def _row(self, key):
+        row = [round(key * self.grid, 3)]
+        for acc in self.bins.pop(key):
+            if acc is None:
+                row += [0, "", "", ""]
+                continue
+            n, s, ss, lo, hi = acc
+            avg = s / n
+            # n is small here (one grid cell), so the sum-of-squares form is fine
+            std = ((ss - n * avg * avg) / (n - 1)) ** 0.5 if n > 1 and ss > n * avg * avg else 0.0
+            row += [n, f"{avg:.6f}", f"{std*1000:.3f}", f"{(hi-lo)*1000:.3f}"]
+        return row
+
+    def rows(self):
+        """
+        Generator of wide CSV rows, one per grid cell, in time order. A cell
+        is emitted once it ended more than `lateness` seconds ago.
+        """
+        while not self.stop.is_set():
+            try:
+                i, ts, value = self.readings.get(timeout=self.grid)
+                if value is not None:
+                    self._add(i, ts, value)
+            except queue.Empty:
+                pass
+            if not any(t.is_alive() for t in self.threads):
+                break
+            done = (time.time() - self.lateness) // self.grid
+            for key in sorted(k for k in self.bins if k < done):
+                yield self._row(key)
+        for key in sorted(self.bins):
+            yield self._row(key)
+
+def poll_readings(rangefinder, interval):
+    """Generator of (timestamp, distance_str) from request/response polling."""
+    while True:
+        distance = rangefinder.read_distance()
+        yield time.time(), distance
+        # Wait before next measurement
+        time.sleep(interval)
+
+def main(port=None):
     # Configuration
     # SERIAL_PORT = input("Enter serial port (e.g., COM3, /dev/ttyUSB0): ").strip()
-    SERIAL_PORT = "COM17"
+    SERIAL_PORT = port or "COM17"
 
     if not SERIAL_PORT:
         print("No port specified, exiting.")
         return
     
-    MEASUREMENT_INTERVAL = 0  # added delay between measurements (0 => 0.75s per reading)
-    WINDOW_SIZE = 60  # Number of recent readings for statistics
-    TREND_LOOKBACK = 60  # seconds to look back for trend calculation
+    STREAMING = True  # True: device continuous measurement mode, False: poll each reading
+    MEASUREMENT_INTERVAL = 0  # polling: added delay between measurements (0 => 0.75s per reading)
+    WINDOW_SECONDS = 45  # Time span of recent readings for statistics (~60 readings at 0.75 s)
+    TREND_LOOKBACK = 60  # seconds of readings used for the trend fit
     
     # Create CSV filename with current date and time
     current_time = datetime.now()    
@@ -248,22 +602,25 @@ def main():
     if not rangefinder.connect():
         return
     
-    # Storage for rolling statistics
-    recent_readings = deque(maxlen=WINDOW_SIZE)
-    
-    # Storage for historical averages (timestamp, average) for trend calculation
-    # Keep about 30 seconds of history (assuming ~0.75s intervals, that's ~40 entries)
-    historical_averages = deque(maxlen=150)
+    # Rolling statistics and trend fit over the most recent readings
+    recent_stats = RollingStats(WINDOW_SECONDS)
+    recent_trend = RollingTrend(TREND_LOOKBACK)
     
     try:
         # Open CSV file for writing
-        with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
+        # flush every 10 rows or 5 seconds, whichever comes first
+        with LogWriter(csv_filename, 'w', newline='', flush_lines=10, max_latency=5) as csvfile:
             csv_writer = csv.writer(csvfile)
             
             # Write CSV header
             csv_writer.writerow(['timestamp', 'count', 'distance', 'avg', 'std_dev_mm', 'range_mm', 'trend_20s'])
             
-            print(f"Starting distance measurements every {MEASUREMENT_INTERVAL} seconds...")
+            if STREAMING:
+                print("Starting continuous distance measurements...")
+                readings = rangefinder.stream()
+            else:
+                print(f"Starting distance measurements every {MEASUREMENT_INTERVAL} seconds...")
+                readings = poll_readings(rangefinder, MEASUREMENT_INTERVAL)
             print("Press Ctrl+C to stop")
             print("Output format: timestamp,count,distance,avg,std_dev_mm,range_mm,trend_20s")
             print("-" * 70)
@@ -272,12 +629,13 @@ def main():
             consecutive_failures = 0
             MAX_CONSECUTIVE_FAILURES = 20  # Exit after 5 consecutive failures
             
-            while True:
+            for now, distance in readings:
                 measurement_count += 1
-                
-                # Read distance
-                distance = rangefinder.read_distance()
-                epoch_time = round(time.time(), 1)
+                epoch_time = round(now, 1)
+                if STREAMING and (measurement_count % 100) == 0:
+                    rate = rangefinder.sample_rate
+                    if rate:
+                        print(f"# {rate:.2f} readings/s, frame errors: {rangefinder.frame_errors}")
                 
                 if distance:
                     # Reset failure counter on successful reading
@@ -286,30 +644,15 @@ def main():
                     try:
                         # Convert distance to float for statistics
                         distance_value = float(distance)
-                        recent_readings.append(distance_value)
-                        
-                        # Calculate statistics if we have readings
-                        if len(recent_readings) >= 1:
-                            avg = statistics.mean(recent_readings)
-                            
-                            # Store current average with timestamp for trend calculation
-                            historical_averages.append((epoch_time, avg))
-                            
-                            if len(recent_readings) >= 2:
-                                std_dev = statistics.stdev(recent_readings)
-                                range_val = max(recent_readings) - min(recent_readings)
-                            else:
-                                std_dev = 0.0
-                                range_val = 0.0
-                        else:
-                            avg = 0.0
-                            std_dev = 0.0
-                            range_val = 0.0
-                            # Still store the average for trend calculation
-                            historical_averages.append((epoch_time, avg))
-                        
-                        # Calculate 20-second trend
-                        trend = calculate_trend(historical_averages, epoch_time, TREND_LOOKBACK)
+                        recent_stats.add(now, distance_value)
+                        recent_trend.add(now, distance_value)
+
+                        avg = recent_stats.mean
+                        std_dev = recent_stats.std()
+                        range_val = recent_stats.range()
+
+                        # Change over the trend window, from the fitted slope
+                        trend = recent_trend.trend()
                         
                         range_mm = range_val * 1000  # Convert to mm
                         std_mm = std_dev * 1000  # Convert to mm
@@ -331,7 +674,6 @@ def main():
                             f"{range_mm:.3f}",
                             trend_str
                         ])
-                        csvfile.flush()  # Ensure data is written immediately
                         
                     except ValueError:
                         # If distance can't be converted to float, treat as error
@@ -339,25 +681,22 @@ def main():
                         error_line = f"{epoch_time},{measurement_count},ERROR,,,,"
                         print(error_line)
                         # csv_writer.writerow([epoch_time, measurement_count, "ERROR", "", "", "", ""])
-                        csvfile.flush()
-                        time.sleep(2)  # Wait a bit longer after error
+                        if not STREAMING:
+                            time.sleep(2)  # Wait a bit longer after error
                 else:
                     # Increment failure counter
                     consecutive_failures += 1
                     error_line = f"{epoch_time},{measurement_count},ERROR,,,,"
                     print(error_line)
                     # csv_writer.writerow([epoch_time, measurement_count, "ERROR", "", "", "", ""])
-                    csvfile.flush()
-                    time.sleep(2)  # Wait a bit longer after error
+                    if not STREAMING:
+                        time.sleep(2)  # Wait a bit longer after error
 
                     # Check if we should exit due to too many consecutive failures
                     if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
                         print(f"\nExiting: {MAX_CONSECUTIVE_FAILURES} consecutive communication failures detected.")
                         print("This usually indicates the device has been disconnected.")
                         break
-                
-                # Wait before next measurement
-                time.sleep(MEASUREMENT_INTERVAL)
             
     except KeyboardInterrupt:
         print("\nStopping measurements...")
@@ -369,8 +708,50 @@ def main():
         rangefinder.disconnect()
         print(f"Final log file: {os.path.abspath(csv_filename)}")
 
+def main_array(ports):
+    """Log several rangefinders at once into one wide CSV file."""
+    STREAMING = True  # True: device continuous measurement mode, False: poll each reading
+    MEASUREMENT_INTERVAL = 0  # polling: added delay between measurements
+    GRID_SECONDS = 1.0  # common time grid for all devices
+    COUNTER_EVERY = 60  # print per-device counters every this many rows
+
+    current_time = datetime.now()
+    outDir = r"C:\Users\beale\Documents\Rangefinder"
+    logname = f"rangearray_{current_time.strftime('%Y%m%d_%H%M')}.csv"
+    csv_filename = os.path.join(outDir, logname)
+    print(f"Logging {len(ports)} devices to: {csv_filename}")
+
+    array = RangefinderArray(ports, GRID_SECONDS, STREAMING, MEASUREMENT_INTERVAL)
+    if not array.connect():
+        print("Not all devices connected, exiting.")
+        array.disconnect()
+        return
+
+    try:
+        with LogWriter(csv_filename, 'w', newline='', flush_lines=10, max_latency=5) as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(array.header())
+            print(",".join(array.header()))
+            array.start()
+            for count, row in enumerate(array.rows(), 1):
+                csv_writer.writerow(row)
+                print(",".join(str(x) for x in row))
+                if count % COUNTER_EVERY == 0:
+                    for line in array.counter_summary():
+                        print("# " + line)
+    except KeyboardInterrupt:
+        print("\nStopping measurements...")
+    finally:
+        array.disconnect()
+        for line in array.counter_summary():
+            print("# " + line)
+        print(f"Final log file: {os.path.abspath(csv_filename)}")
+
 if __name__ == "__main__":
     print("Laser Rangefinder Distance Reader with 20-Second Trend Analysis")
     print("=" * 60)
-    main()
+    if len(sys.argv) > 2:
+        main_array(sys.argv[1:])  # eg. laser-distance-meter.py COM17 COM18 COM19
+    else:
+        main(sys.argv[1] if len(sys.argv) > 1 else None)
     
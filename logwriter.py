@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+# Buffered log file writer shared by the line loggers
+# (serial_log.py, FMES-log.py, MCP3424_read.py, DXL360S-TiltMeter-Log.py ...)
+#
+# Flushes on whichever comes first: a number of lines, a number of bytes,
+# or the oldest unflushed line getting older than max_latency seconds.
+# That bounds how much data a power cut can lose, while keeping SD card
+# writes to a few predictable block-sized chunks. Optional fsync after a
+# flush, at most every fsync_secs; flushed data still waiting for one is
+# fsync'd by the timer once fsync_secs have passed, even if nothing more
+# is written. On SIGTERM (systemd stop, shutdown)
+# and at normal exit, every open LogWriter is flushed and fsync'd.
+#
+#   from logwriter import LogWriter
+#   f = LogWriter("log.csv", "w", flush_lines=100, max_latency=30)
+#   f.write("1, 2, 3\n")
+
+import os
+import sys
+import time
+import atexit
+import signal
+import threading
+
+_writers = set()              # open LogWriters, for the SIGTERM / exit handlers
+_writers_lock = threading.Lock()
+_handlers_installed = False
+
+
+class LogWriter:
+    """
+    File-like text log writer with a batched flush policy.
+
+    flush_lines   flush after this many lines (None = no line limit)
+    flush_bytes   flush after this many bytes (None = no size limit)
+    max_latency   flush when the oldest unflushed data is this many seconds
+                  old; checked by a background thread, so it also holds
+                  when no more lines arrive (None = no time limit)
+    fsync_secs    None: never fsync; 0: fsync on every flush;
+                  N: fsync at most every N seconds, and no later than N
+                  seconds after a flush (also checked by the timer thread)
+    """
+    def __init__(self, path, mode="a", flush_lines=100, flush_bytes=64*1024,
+                 max_latency=60.0, fsync_secs=None, encoding="utf-8", newline=None):
+        self.path = path
+        self.f = open(path, mode, encoding=encoding, newline=newline)
+        self.flush_lines = flush_lines
+        self.flush_bytes = flush_bytes
+        self.max_latency = max_latency
+        self.fsync_secs = fsync_secs
+        self.lines = 0            # lines written since last flush
+        self.nbytes = 0           # characters written since last flush
+        self.oldest = None        # monotonic time of oldest unflushed write
+        self.lastSync = time.monotonic()
+        self.unsynced = False     # flushed data not yet fsync'd
+        self.lock = threading.RLock()
+        self.timer = None
+        with _writers_lock:
+            _writers.add(self)
+        install_handlers()
+        if max_latency is not None or fsync_secs:
+            self.stopTimer = threading.Event()
+            self.timer = threading.Thread(target=self._timer, daemon=True)
+            self.timer.start()
+
+    def write(self, s):
+        with self.lock:
+            n = self.f.write(s)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            self.lines += s.count("\n")
+            self.nbytes += len(s)
+            if ((self.flush_lines is not None and self.lines >= self.flush_lines) or
+                    (self.flush_bytes is not None and self.nbytes >= self.flush_bytes)):
+                self.flush()
+        return n
+
+    def flush(self, sync=False):
+        """Flush to the OS. fsync too if sync=True or fsync_secs says so."""
+        with self.lock:
+            if self.f.closed:
+                return
+            self.f.flush()
+            if self.oldest is not None:
+                self.unsynced = True
+            self.lines = 0
+            self.nbytes = 0
+            self.oldest = None
+            now = time.monotonic()
+            if sync or (self.fsync_secs is not None and now - self.lastSync >= self.fsync_secs):
+                os.fsync(self.f.fileno())
+                self.lastSync = now
+                self.unsynced = False
+
+    def poll(self):
+        """Flush if the oldest unflushed data is older than max_latency,
+        fsync if flushed data has waited fsync_secs for one."""
+        with self.lock:
+            now = time.monotonic()
+            if (self.oldest is not None and self.max_latency is not None and
+                    now - self.oldest >= self.max_latency):
+                self.flush()
+            elif (self.unsynced and self.fsync_secs is not None and
+                    now - self.lastSync >= self.fsync_secs):
+                self.flush()
+
+    def _timer(self):
+        period = 1.0 if self.max_latency is None else min(1.0, self.max_latency / 4)
+        while not self.stopTimer.wait(period):
+            self.poll()
+
+    def close(self):
+        if self.timer is not None:
+            self.stopTimer.set()
+        with self.lock:
+            if not self.f.closed:
+                self.flush(sync=self.fsync_secs is not None)
+                self.f.close()
+        with _writers_lock:
+            _writers.discard(self)
+
+    @property
+    def closed(self):
+        return self.f.closed
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def flush_all(sync=True):
+    """Flush (and by default fsync) every open LogWriter."""
+    with _writers_lock:
+        writers = list(_writers)
+    for w in writers:
+        try:
+            w.flush(sync=sync)
+        except (OSError, ValueError) as e:
+            print("logwriter: flush of %s failed: %s" % (w.path, e), file=sys.stderr)
+
+
+def _on_sigterm(signum, frame):
+    flush_all(sync=True)
+    raise SystemExit(128 + signum)   # run finally: blocks, then exit
+
+
+def install_handlers():
+    """Flush durably on SIGTERM and at interpreter exit. Only once, main thread only."""
+    global _handlers_installed
+    if _handlers_installed:
+        return
+    atexit.register(flush_all)
+    if threading.current_thread() is threading.main_thread():
+        if signal.getsignal(signal.SIGTERM) in (signal.SIG_DFL, None):
+            signal.signal(signal.SIGTERM, _on_sigterm)
+    _handlers_installed = True
@@ -1,11 +1,16 @@
 # display spectra of MiniSEED time series (eg. infrasound)
 # 17-Feb-2025 J.Beale
 
+import sys
+import time
+import tracemalloc
 import numpy as np
 import obspy
 import matplotlib.pyplot as plt
 from scipy.signal import spectrogram
 
+import movavg
+
 def printMetaData(trace):
     print(f"Network: {trace.stats.network}")
     print(f"Station: {trace.stats.station}")
@@ -18,49 +23,29 @@ def printMetaData(trace):
     print(f"Data Format: {trace.stats.mseed['dataquality']}")
     print("----------------------")
 
-def boxcar_average(data, n):
+def boxcar_average(data, n, mode='hold'):
     """
-    Computes the boxcar average of a 1D NumPy array.
+    Computes the boxcar average of a 1D NumPy array (see movavg.py).
 
     Args:
         data (np.ndarray): The input 1D array.
-        window_size (int): The size of the moving window.
+        n (int): The size of the moving window, odd or even.
+        mode (str, optional): Edge handling. 'hold' repeats the first and last
+                              full-window averages (the original behaviour);
+                              'reflect', 'nearest', 'mirror' pad like
+                              uniform_filter1d; 'valid' returns only full windows.
 
     Returns:
-        np.ndarray: An array containing the boxcar average values. 
-                    Returns an empty array if window_size is invalid.
+        np.ndarray: float64 boxcar average values.
     """
-    elems = len(data)
-    output = np.zeros_like(data)
-    pad = int(np.floor(n/2))
-    #print("pad = %d" % pad)
-
     if not isinstance(data, np.ndarray) or data.ndim != 1:
         raise ValueError("Input data must be a 1D NumPy array.")
-    
-    if not isinstance(n, int) or n <= 0 or n > len(data):
-      raise ValueError("Window size must be a positive integer less than or equal to the length of the data.")
-    
-    csum = np.cumsum(data, dtype=float)
-    csum[n:] = csum[n:] - csum[:-n]
-    output[pad:-pad] = csum[n - 1:] / n
-    output[0:pad] = output[pad]
-    output[elems-pad:] = output[elems-pad-1]
-    return output
+    return movavg.boxcar(data, n, mode)
 
-def apply_window_fft(data, window_type='hann'):
+def get_window(window_type, n):
     """
-    Applies a windowing function to the input data and then computes the FFT.
-    Args:
-        data (numpy.ndarray): The input data array.
-        window_type (str, optional): The type of window to apply 
-                                     ('hann', 'hamming', 'blackman', or None). 
-                                     Defaults to 'hann'.
-    Returns:
-        numpy.ndarray: The FFT of the windowed data.
+    Window function of length n: 'hann', 'hamming', 'blackman', or None (rectangular).
     """
-    n = len(data)
-    
     if window_type == 'hann':
         window = np.hanning(n)
     elif window_type == 'hamming':
@@ -68,14 +53,120 @@ def apply_window_fft(data, window_type='hann'):
     elif window_type == 'blackman':
         window = np.blackman(n)
     elif window_type is None:
-      window = 1
+        window = np.ones(n)
     else:
         raise ValueError("Invalid window type. Choose from 'hann', 'hamming', 'blackman', or None.")
-    
-    windowed_data = data * window
+    return window
+
+def apply_window_fft(data, window_type='hann'):
+    """
+    Applies a windowing function to the input data and then computes the FFT.
+    Args:
+        data (numpy.ndarray): The input data array.
+        window_type (str, optional): The type of window to apply 
+                                     ('hann', 'hamming', 'blackman', or None). 
+                                     Defaults to 'hann'.
+    Returns:
+        numpy.ndarray: The FFT of the windowed data.
+    """
+    windowed_data = data * get_window(window_type, len(data))
     fft_result = np.fft.fft(windowed_data)
     return fft_result
 
+def segment_psd(data, sampleRate, nperseg, noverlap=None, window_type='hann'):
+    """
+    One-sided PSD of each overlapping segment of data (a short-time spectrum).
+
+    Args:
+        data (np.ndarray): 1D input, counts. Segments containing NaN give NaN rows.
+        sampleRate (float): Samples per second.
+        nperseg (int): Segment length.
+        noverlap (int, optional): Overlap between segments. Defaults to nperseg // 2.
+        window_type (str, optional): See get_window(). Defaults to 'hann'.
+
+    Returns:
+        (freqs, psd): freqs (nperseg//2 + 1,) in Hz, and psd (nseg, nfreq) in
+        counts^2/Hz; segment k starts at sample k * (nperseg - noverlap).
+    """
+    if noverlap is None:
+        noverlap = nperseg // 2
+    step = nperseg - noverlap
+    nseg = (len(data) - nperseg) // step + 1 if len(data) >= nperseg else 0
+    freqs = np.fft.rfftfreq(nperseg, d=1.0/sampleRate)
+    if nseg <= 0:
+        return freqs, np.empty((0, len(freqs)))
+    window = get_window(window_type, nperseg)
+    if not np.any(window):
+        raise ValueError("segment_psd: %s window of %d samples is all zero" % (window_type, nperseg))
+    segs = np.lib.stride_tricks.sliding_window_view(data, nperseg)[::step][:nseg]
+    segs = segs - segs.mean(axis=1, keepdims=True)      # remove each segment's mean
+    spec = np.fft.rfft(segs * window, axis=1)
+    psd = (spec.real**2 + spec.imag**2) / (sampleRate * np.sum(window**2))
+    psd[:, 1:] *= 2                                     # one-sided: fold negative frequencies
+    if nperseg % 2 == 0:
+        psd[:, -1] /= 2                                 # Nyquist bin has no mirror
+    return freqs, psd
+
+def psd_welch(data, sampleRate, nperseg=8192, overlap=0.5, window_type='hann',
+              smooth=1, block=256):
+    """
+    Averaged (Welch) power spectral density of a long trace.
+
+    Segments are processed block segments at a time and summed, so memory stays
+    at about block * nperseg samples however long the trace is.
+
+    Args:
+        data (np.ndarray): 1D input, counts.
+        sampleRate (float): Samples per second.
+        nperseg (int, optional): Segment length; sets the resolution sampleRate/nperseg.
+            Shortened to len(data) for shorter input.
+        overlap (float, optional): Fraction of segment overlap. Defaults to 0.5.
+        window_type (str, optional): See get_window(). Defaults to 'hann'.
+        smooth (int, optional): boxcar_average() width in bins, 1 = none;
+            at most the number of bins.
+        block (int, optional): Segments per FFT batch.
+
+    Returns:
+        (freqs, psd): one-sided PSD in counts^2/Hz, averaged over all segments.
+    """
+    if len(data) == 0:
+        raise ValueError("psd_welch: empty input")
+    if nperseg < 1:
+        raise ValueError("psd_welch: nperseg must be positive")
+    nperseg = min(nperseg, len(data))
+    noverlap = int(nperseg * overlap)
+    step = nperseg - noverlap
+    nseg = (len(data) - nperseg) // step + 1
+    total = None
+    for k in range(0, nseg, block):
+        k1 = min(nseg, k + block)
+        chunk = data[k*step : (k1 - 1)*step + nperseg]
+        freqs, p = segment_psd(chunk, sampleRate, nperseg, noverlap, window_type)
+        total = p.sum(axis=0) if total is None else total + p.sum(axis=0)
+    psd = total / nseg
+    if smooth > 1:
+        psd = boxcar_average(psd, min(smooth, len(psd)))
+    return freqs, psd
+
+def benchmark_psd(hours=24, sampleRate=100.0):
+    """Time the old full-FFT path of plotLogLog against psd_welch on a synthetic trace."""
+    rng = np.random.default_rng(0)
+    data = rng.normal(0, 1000, int(hours * 3600 * sampleRate)).astype(np.int32)
+    print("%g hours at %g Hz: %d samples" % (hours, sampleRate, len(data)))
+    def fft_path():
+        magnitude = boxcar_average(np.abs(np.fft.fft(data)), 201)
+        return np.fft.fftfreq(len(data), d=1.0/sampleRate), magnitude
+    def welch_path():
+        return psd_welch(data, sampleRate, nperseg=8192, smooth=5)
+    for name, fn in (("fft + boxcar (old)", fft_path), ("psd_welch", welch_path)):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("%-20s %7.3f s   peak memory %7.1f MB" % (name, dt, peak / 1e6))
+
 def plotSpec(vector, sampleRate):
     plt.figure(figsize=(12, 6))
 
@@ -108,18 +199,12 @@ def plotSpec(vector, sampleRate):
 
 def plotLogLog(vector,sampleRate,traceLabel):    
     global ax
-    fft_result = np.fft.fft(vector)    
-    #fft_result = apply_window_fft(vector, window_type = 'hamming')  # using windowing function
-    magnitude1 = np.abs(fft_result)
-    bSize = 201 # boxcar-filter size
-    magnitude = boxcar_average(magnitude1, bSize)
-    frequencies = np.fft.fftfreq(len(vector),d=(1.0/sampleRate))
-    # print(frequencies)
-    size = len(frequencies)
-    magnitude /= np.sqrt(size)  # normalize?
-    rs = int(size/2) # only use the positive real frequencies
-    #plt.loglog(np.abs(frequencies), magnitude)
-    ax.loglog(frequencies[bSize:rs], magnitude[bSize:rs], label=traceLabel)
+    nperseg = 16384  # 0.006 Hz resolution at 100 Hz
+    bSize = 5        # boxcar-filter size, in frequency bins
+    frequencies, psd = psd_welch(vector, sampleRate, nperseg=nperseg, window_type='hann', smooth=bSize)
+    asd = np.sqrt(psd)  # amplitude spectral density, counts/sqrt(Hz)
+    skip = min(bSize, len(asd) - 1)   # lowest bins, where the smoothing edge is held
+    ax.loglog(frequencies[skip:], asd[skip:], label=traceLabel)
 
 def plot_miniseed(file_path):
     global ax
@@ -152,11 +237,10 @@ def plot_miniseed(file_path):
 
 
         plt.xlabel("Frequency (Hz)")
-        plt.ylabel("Magnitude")
+        plt.ylabel("ASD (counts/$\\sqrt{Hz}$)")
         plt.title(tString)
         plt.legend()
         plt.xlim(1E-2, 1E1)  # Set x-axis limits 
-        plt.ylim(1E2, 1E6)
         #plt.ylim(1E5, 1E9)
         #plt.ylim(5E-2, 2E2)
         text1 = "Start: %s" % trace.stats.starttime
@@ -174,6 +258,10 @@ def plot_miniseed(file_path):
 if __name__ == "__main__":
     frac = 1 # divide full dataset into this many parts
 
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":   # miniSeedPlot.py bench [hours]
+        benchmark_psd(float(sys.argv[2]) if len(sys.argv) > 2 else 24)
+        sys.exit()
+
     file_path = r"C:\Users\beale\Documents\Tiltmeter\AM.RC93C.00.HDF.D.2025.047"
     #file_path = r"C:\Users\beale\Documents\Tiltmeter\AM.RC93C.00.HDF.D.2025.048"
     #file_path = r"C:\Users\beale\Documents\Tiltmeter\AM.RC93C.00.HDF.D.2025.049"
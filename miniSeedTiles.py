@@ -0,0 +1,241 @@
+# spectrogram tiles for long MiniSEED archives (eg. weeks of infrasound)
+#
+# The archive is cut into one-hour tiles per channel. Each tile is computed
+# once, from only that hour of data, and cached as a small .npz file:
+#   psd    60 x nf    Welch PSD of each minute  (counts^2/Hz, float32)
+#   fine   nt x nf2   STFT power, ~1.3 s columns (dB, float16)
+# both from the estimators in miniSeedPlot.py (psd_welch, segment_psd).
+# Overview images are assembled from the cached tiles at several zoom levels:
+#   week   7 days,  10-minute columns (from psd)
+#   day    24 hours, 1-minute columns (from psd)
+#   hour   one tile, fine columns
+#   minute one minute of the fine columns
+# so browsing weeks of data never holds more than one hour of samples in
+# memory, and no FFT is repeated once its tile exists.
+#
+#   python miniSeedTiles.py build  <files, dirs or SDS archive> [--from 2025-02-16] [--to ...]
+#   python miniSeedTiles.py render <files ...> --level day --at 2025-02-16 [-o day.png]
+
+import argparse
+import glob
+import os
+import warnings
+
+import numpy as np
+import obspy
+
+from miniSeedPlot import psd_welch, segment_psd
+
+CACHE_DIR = "tiles"         # tile cache directory
+TILE_SECS = 3600            # one tile per hour
+WELCH_SECS = 20             # Welch segment length (rounded down to a power of 2 samples)
+FINE_SECS = 2.56            # STFT segment length for the fine level, 50% overlap
+LEVELS = {"week": (7*86400, 600), "day": (86400, 60),    # span, column width (s)
+          "hour": (3600, None), "minute": (60, None)}
+
+
+def pow2(n):
+    """Largest power of 2 <= n."""
+    return 1 << int(np.floor(np.log2(n)))
+
+
+class ArchiveSource:
+    """
+    MiniSEED files (paths, directories searched recursively, or glob patterns)
+    indexed by channel and time from their headers, so any time window can be
+    read without loading whole files.
+    """
+
+    def __init__(self, paths):
+        self.files = {}         # nslc -> list of (start, end, path)
+        for p in paths:
+            if os.path.isdir(p):
+                found = [f for f in glob.glob(os.path.join(p, "**", "*"), recursive=True)
+                         if os.path.isfile(f)]
+            else:
+                found = glob.glob(p) or [p]
+            for f in sorted(found):
+                try:
+                    st = obspy.read(f, headonly=True)
+                except Exception:
+                    continue    # not MiniSEED (state files etc.)
+                for tr in st:
+                    self.files.setdefault(tr.id, []).append(
+                        (tr.stats.starttime, tr.stats.endtime, f))
+        self.rate = {}
+        for nslc, lst in self.files.items():
+            lst.sort()
+            self.rate[nslc] = obspy.read(lst[0][2], headonly=True).select(id=nslc)[0].stats.sampling_rate
+
+    def channels(self):
+        return sorted(self.files)
+
+    def span(self, nslc):
+        lst = self.files[nslc]
+        return min(s for s, e, f in lst), max(e for s, e, f in lst)
+
+    def read(self, nslc, t0, t1):
+        """Samples of nslc in [t0, t1) as a float64 array, NaN where there is no data."""
+        fs = self.rate[nslc]
+        n = int(round((t1 - t0) * fs))
+        out = np.full(n, np.nan)
+        for s, e, f in self.files[nslc]:
+            if e < t0 or s >= t1:
+                continue
+            st = obspy.read(f, starttime=t0, endtime=t1).select(id=nslc)
+            for tr in st:
+                i = int(round((tr.stats.starttime - t0) * fs))
+                x = tr.data.astype(np.float64)
+                if i < 0:
+                    x, i = x[-i:], 0
+                x = x[:max(0, n - i)]
+                out[i:i+len(x)] = x
+        return out
+
+
+class TileCache:
+    """Per-hour spectrogram tiles of one channel, computed on demand and cached."""
+
+    def __init__(self, source, nslc, cache_dir=CACHE_DIR):
+        self.source = source
+        self.nslc = nslc
+        self.fs = source.rate[nslc]
+        self.nWelch = pow2(WELCH_SECS * self.fs)
+        self.nFine = pow2(FINE_SECS * self.fs)
+        self.dir = os.path.join(cache_dir, "%s_w%d_f%d" % (nslc, self.nWelch, self.nFine))
+
+    def path(self, t0):
+        return os.path.join(self.dir, t0.strftime("%Y"), t0.strftime("%j"), t0.strftime("%H") + ".npz")
+
+    def compute(self, t0):
+        """Compute the tile starting at t0 (a whole hour)."""
+        x = self.source.read(self.nslc, t0, t0 + TILE_SECS)
+        fs = self.fs
+        spm = int(round(60 * fs))
+        minutes = x[:60*spm].reshape(60, spm)
+        nw = min(self.nWelch, spm)
+        f = np.fft.rfftfreq(nw, d=1.0/fs)
+        psd = np.full((60, len(f)), np.nan, dtype=np.float32)
+        for m in range(60):
+            if not np.isnan(minutes[m]).any():
+                psd[m] = psd_welch(minutes[m], fs, nperseg=nw)[1]
+        ff, sxx = segment_psd(x, fs, self.nFine)        # NaN rows where data is missing
+        tt = (np.arange(len(sxx)) * (self.nFine - self.nFine // 2) + self.nFine / 2) / fs
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fine = (10 * np.log10(sxx)).astype(np.float16)
+        return {"t0": float(t0.timestamp), "f": f.astype(np.float32), "psd": psd,
+                "ff": ff.astype(np.float32), "tt": tt.astype(np.float32), "fine": fine,
+                "coverage": float(np.mean(~np.isnan(x)))}
+
+    def tile(self, t0):
+        """The tile for the hour containing t0, from the cache when up to date."""
+        t0 = obspy.UTCDateTime(int(t0.timestamp // TILE_SECS) * TILE_SECS)
+        fname = self.path(t0)
+        srcEnd = self.source.span(self.nslc)[1]
+        if os.path.exists(fname):
+            z = dict(np.load(fname))
+            # an hour that was still filling when cached: redo once more data exists
+            if z["coverage"] >= 1.0 or float(z["srcEnd"]) >= min(srcEnd.timestamp, t0.timestamp + TILE_SECS):
+                return z
+        z = self.compute(t0)
+        z["srcEnd"] = srcEnd.timestamp
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        np.savez(fname, **z)
+        return z
+
+    def build(self, t0=None, t1=None, verbose=True):
+        """Make sure every tile in [t0, t1) is cached."""
+        s, e = self.source.span(self.nslc)
+        t0 = max(s, obspy.UTCDateTime(t0)) if t0 else s
+        t1 = min(e, obspy.UTCDateTime(t1)) if t1 else e
+        t = obspy.UTCDateTime(int(t0.timestamp // TILE_SECS) * TILE_SECS)
+        while t < t1:
+            z = self.tile(t)
+            if verbose:
+                print("%s %s coverage %5.1f%%" % (self.nslc, t, 100 * z["coverage"]))
+            t += TILE_SECS
+
+    def image(self, level, t):
+        """
+        Spectrogram image for a zoom level starting at t (rounded down to the level).
+
+        Returns:
+            (times, freqs, dB): column start times (epoch s), frequencies (Hz),
+            and a len(freqs) x len(times) array of 10*log10(PSD).
+        """
+        span, col = LEVELS[level]
+        t = obspy.UTCDateTime(t)
+        t0 = obspy.UTCDateTime(int(t.timestamp // min(span, 86400)) * min(span, 86400))
+        if span > TILE_SECS:
+            cols = []
+            f = None
+            s, e = self.source.span(self.nslc)
+            for h in range(span // TILE_SECS):
+                th = t0 + h * TILE_SECS
+                if th + TILE_SECS <= s or th > e:
+                    cols.append(None)
+                    continue
+                z = self.tile(th)
+                f = z["f"]
+                cols.append(z["psd"])
+            nf = len(f) if f is not None else 1
+            psd = np.concatenate([c if c is not None else np.full((60, nf), np.nan) for c in cols])
+            k = col // 60                                   # minutes per column
+            with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+                warnings.simplefilter("ignore", RuntimeWarning)   # columns with no data
+                psd = np.nanmean(psd.reshape(-1, k, nf), axis=1) if k > 1 else psd
+                db = 10 * np.log10(psd.T)
+            times = t0.timestamp + col * np.arange(psd.shape[0])
+            return times, f, db
+        z = self.tile(t0)
+        times = z["t0"] + z["tt"] - self.nFine / (2 * self.fs)
+        db = z["fine"].astype(np.float32).T
+        if level == "minute":
+            m = int((t.timestamp - z["t0"]) // 60)
+            sel = (times >= z["t0"] + 60*m) & (times < z["t0"] + 60*(m+1))
+            times, db = times[sel], db[:, sel]
+        return times, z["ff"], db
+
+    def render(self, level, t, fname=None, vmin=None, vmax=None, fmin=None):
+        """Draw image(level, t) with a log frequency axis; save to fname or show."""
+        import matplotlib.pyplot as plt
+        import matplotlib.dates as mdates
+        times, f, db = self.image(level, t)
+        sel = f > (fmin or 0)                               # log axis: no DC
+        tm = [obspy.UTCDateTime(x).matplotlib_date for x in times]
+        fig, ax = plt.subplots(figsize=(14, 5))
+        m = ax.pcolormesh(tm, f[sel], db[sel], shading="nearest", vmin=vmin, vmax=vmax)
+        ax.set_yscale("log")
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d %H:%M:%S" if level == "minute" else "%m-%d %H:%M"))
+        ax.set_ylabel("Frequency (Hz)")
+        ax.set_title("%s  %s  %s" % (self.nslc, level, obspy.UTCDateTime(times[0]) if len(times) else t))
+        fig.colorbar(m, label="PSD (dB counts^2/Hz)")
+        fig.autofmt_xdate()
+        if fname:
+            fig.savefig(fname, dpi=100)
+            plt.close(fig)
+        else:
+            plt.show()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cached spectrogram tiles for MiniSEED archives")
+    parser.add_argument("cmd", choices=["build", "render"])
+    parser.add_argument("paths", nargs="+", help="MiniSEED files, directories or glob patterns")
+    parser.add_argument("--nslc", help="channel id, eg. AM.RC93C.00.HDF (default: all / first)")
+    parser.add_argument("--from", dest="t0", help="build: start time")
+    parser.add_argument("--to", dest="t1", help="build: end time")
+    parser.add_argument("--level", choices=list(LEVELS), default="day")
+    parser.add_argument("--at", help="render: time inside the image (default: start of data)")
+    parser.add_argument("--cache", default=CACHE_DIR, help="tile cache directory")
+    parser.add_argument("-o", "--out", help="render: PNG file (default: show)")
+    args = parser.parse_args()
+
+    src = ArchiveSource(args.paths)
+    ids = [args.nslc] if args.nslc else src.channels()
+    if args.cmd == "build":
+        for nslc in ids:
+            TileCache(src, nslc, args.cache).build(args.t0, args.t1)
+    else:
+        tc = TileCache(src, ids[0], args.cache)
+        tc.render(args.level, args.at or src.span(ids[0])[0], args.out)
@@ -0,0 +1,192 @@
+# moving (boxcar) average for long series, whole-array or streamed in chunks
+#
+# Window convention is the same as scipy.ndimage.uniform_filter1d(x, n):
+# output[i] = mean(x[i - n//2 : i - n//2 + n]), for odd and even n.
+# Edges are padded by `mode`:
+#   'reflect'  d c b a | a b c d | d c b a   (uniform_filter1d default)
+#   'nearest'  a a a a | a b c d | d d d d
+#   'mirror'   d c b | a b c d | c b a
+#   'hold'     first/last full-window average repeated (old boxcar_average)
+#   'valid'    no padding, only the len(x)-n+1 full windows
+# Sums are done in blocks of BLOCK outputs: integer input is summed exactly
+# in int64, float input in float64 as deviations from the block's first
+# value, restarted every block, so the rounding error neither grows with the
+# length of the series nor with a large DC offset, and temporaries stay at
+# about BLOCK elements.
+# sequential=True instead adds up each window left to right (n passes over
+# the data). Slower for long windows, but every output depends only on its
+# own window, so MovingAverage gives the same bits as boxcar() however the
+# input is chunked (the block sums above can differ in the last bit).
+#
+#   python movavg.py     benchmark against uniform_filter1d
+
+import time
+
+import numpy as np
+
+BLOCK = 1 << 16
+
+_PAD = {"reflect": "symmetric", "nearest": "edge", "mirror": "reflect"}
+
+
+def _window_means(x, n, out, sequential=False):
+    """out[i] = mean(x[i:i+n]) for i in range(len(x)-n+1), blockwise."""
+    m = len(x) - n + 1
+    if sequential:
+        out[:] = x[:m]
+        for j in range(1, n):
+            out += x[j:j+m]
+        out /= n
+        return out
+    integer = np.issubdtype(x.dtype, np.integer)
+    acc = np.int64 if integer else np.float64
+    for b in range(0, m, BLOCK):
+        e = min(m, b + BLOCK)
+        seg = x[b:e+n-1]
+        c = np.empty(e - b + n, dtype=acc)
+        c[0] = 0
+        if integer:
+            np.cumsum(seg, dtype=acc, out=c[1:])
+            np.subtract(c[n:], c[:-n], out=out[b:e], casting="unsafe")
+            out[b:e] /= n
+        else:                           # sum deviations from the block's first value
+            off = float(seg[0])
+            np.cumsum(seg - off, dtype=acc, out=c[1:])
+            np.subtract(c[n:], c[:-n], out=out[b:e])
+            out[b:e] /= n
+            out[b:e] += off
+    return out
+
+
+def boxcar(data, n, mode="reflect", sequential=False):
+    """
+    Centered moving average of a 1D array, same alignment as uniform_filter1d.
+
+    Args:
+        data (array_like): 1D input, any int or float dtype.
+        n (int): Window length, odd or even, 1 <= n <= len(data).
+        mode (str): Edge handling, see the module header.
+        sequential (bool): Sum each window in order, see the module header.
+
+    Returns:
+        np.ndarray: float64 averages, len(data) long (len(data)-n+1 for 'valid').
+    """
+    x = np.asarray(data)
+    if x.ndim != 1:
+        raise ValueError("Input data must be 1D.")
+    if not isinstance(n, (int, np.integer)) or n <= 0 or n > len(x):
+        raise ValueError("Window size must be a positive integer <= the length of the data.")
+    L = n // 2
+    R = n - 1 - L
+    if mode == "valid":
+        return _window_means(x, n, np.empty(len(x) - n + 1), sequential)
+    if mode == "hold":
+        out = np.empty(len(x))
+        _window_means(x, n, out[L:len(x)-R], sequential)
+        out[:L] = out[L]
+        out[len(x)-R:] = out[len(x)-R-1]
+        return out
+    if mode not in _PAD:
+        raise ValueError("mode must be one of: valid, hold, " + ", ".join(_PAD))
+    return _window_means(np.pad(x, (L, R), mode=_PAD[mode]), n, np.empty(len(x)), sequential)
+
+
+class MovingAverage:
+    """
+    Streaming version of boxcar(): feed chunks of any size, get each output
+    as soon as its whole window has arrived (R = n-1-n//2 samples late).
+    Concatenated process() + flush() outputs equal boxcar(all data, n, mode)
+    for 'reflect', 'nearest' and 'valid' (bit for bit with sequential=True).
+    Memory is n-1 carried samples.
+    """
+
+    def __init__(self, n, mode="reflect", sequential=False):
+        if mode not in ("reflect", "nearest", "valid"):
+            raise ValueError("streaming mode must be reflect, nearest or valid")
+        self.n = n
+        self.mode = mode
+        self.sequential = sequential
+        self.L = n // 2
+        self.R = n - 1 - self.L
+        self.buf = None         # carried input (last n-1 samples), start padding applied
+        self.head = []          # input held back until the start padding can be built
+        self.count = 0          # input samples seen
+        self.outputs = 0        # outputs returned
+
+    def _start(self, x):
+        if self.mode == "reflect":
+            return np.concatenate((x[:self.L][::-1], x))
+        if self.mode == "nearest":
+            return np.concatenate((np.repeat(x[:1], self.L), x))
+        return x
+
+    def _emit(self, x):
+        buf = x if self.buf is None else np.concatenate((self.buf, x))
+        m = len(buf) - self.n + 1
+        if m <= 0:
+            self.buf = buf
+            return np.empty(0)
+        out = _window_means(buf, self.n, np.empty(m), self.sequential)
+        self.buf = buf[m:]
+        self.outputs += m
+        return out
+
+    def process(self, chunk):
+        """Add samples; return the averages that are now complete."""
+        x = np.asarray(chunk)
+        self.count += len(x)
+        if self.buf is None:
+            self.head.append(x)
+            x = np.concatenate(self.head)
+            if len(x) < max(self.L, 1):
+                return np.empty(0)
+            self.head = []
+            x = self._start(x)
+        return self._emit(x)
+
+    def flush(self):
+        """End of data: pad the right edge and return the remaining averages."""
+        if self.head:                      # everything is still in the head
+            x = np.concatenate(self.head)
+            self.head = []
+            if len(x) == 0:
+                return np.empty(0)
+            return boxcar(x, min(self.n, len(x)), self.mode, self.sequential)
+        if self.buf is None or self.mode == "valid":
+            return np.empty(0)
+        tail = self.buf[len(self.buf) - self.R:] if self.R else self.buf[:0]
+        if self.mode == "reflect":
+            pad = tail[::-1]
+        else:
+            pad = np.repeat(self.buf[-1:], self.R)
+        return self._emit(pad)
+
+
+def benchmark(npts=8640000, sizes=(50, 201, 2000)):
+    """Compare boxcar() and MovingAverage with scipy uniform_filter1d."""
+    from scipy.ndimage import uniform_filter1d
+    rng = np.random.default_rng(0)
+    xi = rng.integers(-2**31, 2**31 - 1, npts).astype(np.int32)
+    xf = rng.normal(1e6, 1.0, npts)
+    print("%d samples" % npts)
+    print("   n  input    uniform_filter1d   boxcar    stream(10k)   max |diff| vs exact")
+    for n in sizes:
+        for name, x in (("int32", xi), ("float", xf)):
+            t0 = time.perf_counter()
+            ref = uniform_filter1d(x.astype(np.float64), n, mode="reflect")
+            t1 = time.perf_counter()
+            b = boxcar(x, n, "reflect")
+            t2 = time.perf_counter()
+            ma = MovingAverage(n, "reflect")
+            s = np.concatenate([ma.process(x[i:i+10000]) for i in range(0, npts, 10000)] + [ma.flush()])
+            t3 = time.perf_counter()
+            k = slice(npts // 2, npts // 2 + 1000)     # check a stretch exactly
+            exact = np.array([np.sum(x[i - n//2 : i - n//2 + n], dtype=np.float128 if hasattr(np, "float128") else np.float64) / n
+                              for i in range(k.start, k.stop)])
+            print("%5d  %-6s %10.3f s %12.3f s %10.3f s    uf %.2e  boxcar %.2e  stream %.2e" % (
+                n, name, t1 - t0, t2 - t1, t3 - t2,
+                np.max(np.abs(ref[k] - exact)), np.max(np.abs(b[k] - exact)), np.max(np.abs(s[k] - exact))))
+
+
+if __name__ == "__main__":
+    benchmark()
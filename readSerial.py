@@ -2,13 +2,14 @@
 
 # tested with Python 3.6.5 (default, Apr  1 2018, 05:46:30) 
 import serial, datetime
+from logwriter import LogWriter
 
 logfile='/home/myshake/serlog/temp-log.csv'
 FLIM = 10  # flush buffer after this many lines
+FSEC = 60  # ... or when the oldest unwritten line is this many seconds old
 
-f = open(logfile, 'w')
+f = LogWriter(logfile, 'w', flush_lines=FLIM, max_latency=FSEC)
 
-fctr = 8  # saved-line counter (flush buffer after FLIM lines)
 pctr = 5  # sample decimation counter 
 firstline = 1  # have not yet finished the first line
 
@@ -33,8 +34,4 @@ with serial.Serial('/dev/ttyUSB0', 9600, timeout=10) as ser:
           oline = str(datetime.datetime.now()) + ", " + s
 
         f.write(oline)
-        fctr += 1
-        if (fctr > FLIM):
-          f.flush()
-          fctr = 0
       # print(s,end='')
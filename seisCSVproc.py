@@ -1,82 +1,191 @@
 #!/usr/bin/python
 
-# read two CSV files with seismic event summaries to match coincident events
+# read CSV files with seismic event summaries from N stations to match coincident events
 # J.Beale 28-April-2020
-
-import csv
-import sys			# command-line params
+#
+# Event files are the per-day output of RShake_EventFind.py: <station>.<year>.<day>.csv
+# Event times are absolute: the "# <file> <starttime>" line plus start(m)*60, so
+# matching works across midnight and over any range of days.
+# For each event (the anchor), the nearest event of every other station is found
+# with searchsorted; it matches if it is within the window (default: half the
+# anchor event's width, as before). A coincidence is k of the N stations matching,
+# reported once per set of matched events (groups inside a larger group are
+# dropped), at its earliest event, with each station's offset in seconds from
+# the group's mean time.
+#
+# Usage:  seisCSVproc.py 115 [p]                           (old form: 2 stations, one day)
+#         seisCSVproc.py 2020.110-2020.140 -s RF7DC,R79D5,R1234 -k 2 [-w 3] [-p]
+#         add --db events.sqlite to read the event catalog (event_catalog.py)
+#         instead of the day CSVs
+
+import argparse
+import datetime
+import os
 import numpy as np
-import matplotlib.pyplot as plt
-
-data_path = '/home/john/RShake/'
-fbase1='RF7DC.2020.'
-fbase2='R79D5.2020.'
-
-tdThresh = 0.10  # in minutes
 
-pEvent = False
-fnum = '115'                 # default dataset number
-if __name__ == "__main__":
-  if (len(sys.argv) > 1):
-    fnum=sys.argv[1]       # day number in dataset filename
-  if (len(sys.argv) > 2):
-    pEvent = True          # print data for each confirmed event
+from event_catalog import EventCatalog, read_event_csv
 
-fname1 = fbase1 + fnum + '.csv'
-fname2 = fbase2 + fnum + '.csv'
+data_path = '/home/john/RShake/'
+stations = ['RF7DC', 'R79D5']
+year = 2020
 
-ffname1=data_path + fname1
-ffname2=data_path + fname2
 # ==========================================
 
-with open(ffname1, 'r') as f:
-    reader = csv.reader(filter(lambda row: row[0]!='#', f), delimiter=',')
-    header1 = next(reader, None)  # read in the header line
-    dat1 = list(reader)
-
-with open(ffname2, 'r') as f:
-    reader = csv.reader(filter(lambda row: row[0]!='#', f), delimiter=',')
-    header2 = next(reader, None)  # read in the header line
-    dat2 = list(reader)
-
-row1 = 1
-row2 = 1
-row1Max = len(dat1)
-row2Max = len(dat2)
-# print("# Lines: %d , %d" % (row1Max, row2Max))
+def parse_days(spec, year=year):
+  "'115', '110-140', '2020.350-2021.010' -> list of (year, day of year)"
+  def one(s):
+    if '.' in s:
+      y, d = s.split('.')
+      return datetime.date(int(y), 1, 1) + datetime.timedelta(int(d) - 1)
+    return datetime.date(year, 1, 1) + datetime.timedelta(int(s) - 1)
+  parts = spec.split('-')
+  d0 = one(parts[0])
+  d1 = one(parts[1]) if len(parts) > 1 else d0
+  return [(d.year, d.timetuple().tm_yday) for d in
+          (d0 + datetime.timedelta(i) for i in range((d1 - d0).days + 1))]
+
+def read_event_file(fname):
+  "One RShake_EventFind CSV -> (epoch times, Max, dur(s)) arrays."
+  info, events = read_event_csv(fname)
+  if not events:
+    return np.empty(0), np.empty(0), np.empty(0)
+  dat = np.array(events)
+  return info["starttime"] + dat[:, 1] * 60, dat[:, 2], dat[:, 3]
+
+def load_station(station, days, path=data_path):
+  "All events of one station over the days, sorted by time."
+  T, M, D = [], [], []
+  missing = 0
+  for y, d in days:
+    fname = os.path.join(path, '%s.%d.%03d.csv' % (station, y, d))
+    if not os.path.exists(fname):
+      missing += 1
+      continue
+    t, m, dur = read_event_file(fname)
+    T.append(t); M.append(m); D.append(dur)
+  if missing:
+    print("# %s: %d of %d day files missing" % (station, missing, len(days)))
+  if not T:
+    return np.empty(0), np.empty(0), np.empty(0)
+  t, m, dur = np.concatenate(T), np.concatenate(M), np.concatenate(D)
+  i = np.argsort(t, kind='stable')
+  return t[i], m[i], dur[i]
+
+def nearest(tb, ta):
+  "Index into sorted tb of the nearest event to each ta, and the time difference tb-ta."
+  i = np.searchsorted(tb, ta)
+  lo = np.clip(i - 1, 0, len(tb) - 1)
+  hi = np.clip(i, 0, len(tb) - 1)
+  pick = np.where(np.abs(tb[hi] - ta) < np.abs(tb[lo] - ta), hi, lo)
+  return pick, tb[pick] - ta
+
+def coincidences(events, k=2, window=None):
+  """
+  events: list of (times, mag, dur) per station, times sorted.
+  Returns (tA, idx, dt) for the G k-of-N groups, in time order: tA[G] is the
+  earliest event time of the group, idx[G,N] the matching event of each station
+  (-1 if none), dt[G,N] its time relative to tA in seconds (nan if none).
+  Every event is tried as the anchor of a group; the same group found from
+  several anchors is reported once, and a group whose events all belong to a
+  larger group is not reported on its own.
+  """
+  N = len(events)
+  tA, IDX, DT = [np.empty(0)], [np.empty((0, N), dtype=int)], [np.empty((0, N))]
+  for a, (ta, ma, da) in enumerate(events):
+    if len(ta) == 0:
+      continue
+    w = np.full(len(ta), window) if window else da / 2.0   # seconds
+    idx = np.full((len(ta), N), -1)
+    dt = np.full((len(ta), N), np.nan)
+    idx[:, a] = np.arange(len(ta))
+    dt[:, a] = 0.0
+    for b, (tb, mb, db) in enumerate(events):
+      if b == a or len(tb) == 0:
+        continue
+      j, d = nearest(tb, ta)
+      ok = np.abs(d) < w
+      idx[ok, b] = j[ok]
+      dt[ok, b] = d[ok]
+    keep = (idx >= 0).sum(axis=1) >= k
+    tA.append(ta[keep]); IDX.append(idx[keep]); DT.append(dt[keep])
+  tA, IDX, DT = np.concatenate(tA), np.concatenate(IDX), np.concatenate(DT)
+  if len(tA) == 0:
+    return tA, IDX, DT
+  # one row per distinct set of matched events, timed from its earliest member
+  IDX, first = np.unique(IDX, axis=0, return_index=True)
+  t0 = np.nanmin(DT[first], axis=1)
+  tA = tA[first] + t0
+  DT = DT[first] - t0[:, None]
+  # drop groups contained in a larger one (seen from an anchor with a wider window)
+  n = (IDX >= 0).sum(axis=1)
+  groups = {}                                  # (station, event) -> groups containing it
+  for g, row in enumerate(IDX):
+    for b in np.flatnonzero(row >= 0):
+      groups.setdefault((b, row[b]), []).append(g)
+  keep = np.ones(len(IDX), dtype=bool)
+  for g, row in enumerate(IDX):
+    members = np.flatnonzero(row >= 0)
+    for h in groups[(members[0], row[members[0]])]:
+      if n[h] > n[g] and (IDX[h, members] == row[members]).all():
+        keep[g] = False
+        break
+  tA, IDX, DT = tA[keep], IDX[keep], DT[keep]
+  i = np.argsort(tA, kind='stable')
+  return tA[i], IDX[i], DT[i]
 
-tCount = 0            # total number of matching (confirmed) events found
-while True:
-
-  flist1 = [ float(i) for i in dat1[row1] ]  # convert list of strings to list of floats
-  flist2 = [ float(i) for i in dat2[row2] ]
-  # print(flist1[1], flist2[1])
-
-  E1 = flist1[1]                    # minute-of-day for event #1
-  E2 = flist2[1]                    # minute-of-day for event #2
+# ==========================================
 
-  tdThresh = flist1[3]/(2*60)            # other peak within 1/2 width of this one
-  tDiff = (E1 - E2)   # difference in minutes between event times
-  if (abs(tDiff) < tdThresh):
-    tCount += 1                     # total number of confirmed events
-    avgTime = (flist1[1] + flist2[1])/2.0
-    # print("%d: %5.2f (%5.2f): %5.2f, %5.2f" % (tCount,tDiff,tdThresh,flist1[1], flist2[1]) )
-    if (pEvent):
-      print("%d: T=%5.2f : Width= %4.1f,%4.1f Mag= %4.2f,%4.2f (%5.2f)" % 
-          (tCount,avgTime,flist1[3],flist2[3],flist1[2],flist2[2],flist2[2]-flist1[2] ) )
-  
-  if (E1 < E2):  # get next sensor1 record if current sensor1 event is earlier in time
-    row1 += 1
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Match coincident events between seismic stations")
+  parser.add_argument("days", nargs="?", default="115",
+                      help="day of year, range 110-140, or year.day-year.day")
+  parser.add_argument("pEvent", nargs="?", default=None, help="(old form) any value: print each event")
+  parser.add_argument("-s", "--stations", default=",".join(stations), help="comma separated station list")
+  parser.add_argument("-k", type=int, default=2, help="minimum number of stations in a coincidence")
+  parser.add_argument("-w", "--window", type=float, default=None,
+                      help="match window in seconds (default: half the event width)")
+  parser.add_argument("-y", "--year", type=int, default=year, help="year for plain day numbers")
+  parser.add_argument("-d", "--dir", default=data_path, help="event CSV directory")
+  parser.add_argument("--db", default=None, help="read events from this catalog instead of CSVs")
+  parser.add_argument("-p", "--print", dest="pEvents", action="store_true", help="print each coincidence")
+  args = parser.parse_args()
+
+  sta = args.stations.split(",")
+  days = parse_days(args.days, args.year)
+  pEvent = args.pEvents or args.pEvent is not None
+  if args.db:
+    t0 = datetime.datetime(days[0][0], 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(days[0][1] - 1)
+    t1 = datetime.datetime(days[-1][0], 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(days[-1][1])
+    with EventCatalog(args.db) as cat:
+      events = [cat.times(s, t0.timestamp(), t1.timestamp()) for s in sta]
   else:
-    row2 += 1
-
-  if (row1 >= row1Max):
-    break
-  if (row2 >= row2Max):
-    break
-
-mCount = min(row1Max, row2Max)
-pct = (tCount / mCount) * 100.0
-# print("# Files: %s , %s" % (fname1 , fname2) )
-print("# %s Total: %d matching is %5.1f %% of orig events" % (fnum,tCount, pct) )
-
+    events = [load_station(s, days, args.dir) for s in sta]
+  tA, idx, dt = coincidences(events, args.k, args.window)
+  tMean = tA + np.nanmean(dt, axis=1)
+  kGroup = (idx >= 0).sum(axis=1)
+  kCount = np.bincount(kGroup, minlength=len(sta) + 1)
+  offs = dt - (tMean - tA)[:, None]          # per-station offsets from the group mean
+
+  if pEvent:
+    print("time_utc, k, " + ", ".join("%s_dt(s), %s_Max, %s_dur(s)" % (s, s, s) for s in sta))
+    for g in range(len(tA)):
+      cols = []
+      for s, j in enumerate(idx[g]):
+        if j < 0:
+          cols.append(",,")
+        else:
+          cols.append("%6.2f, %4.2f, %4.1f" % (offs[g, s], events[s][1][j], events[s][2][j]))
+      tUTC = datetime.datetime.fromtimestamp(tMean[g], datetime.timezone.utc)
+      print("%s, %d, %s" % (tUTC.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-4], kGroup[g], ", ".join(cols)))
+
+  print("# Days: %s (%d)  Stations: %s  k >= %d" % (args.days, len(days), ",".join(sta), args.k))
+  for s, name in enumerate(sta):
+    nEv = len(events[s][0])
+    o = offs[idx[:, s] >= 0, s]
+    nM = len(o)
+    pct = 100.0 * nM / nEv if nEv else 0.0
+    med = np.median(o) if nM else float('nan')
+    print("# %s: %d events, %d in coincidences (%5.1f %%), median offset %6.2f s" %
+          (name, nEv, nM, pct, med))
+  print("# Total: %d coincidences  " % len(tA) +
+        "  ".join("k=%d: %d" % (k, kCount[k]) for k in range(args.k, len(sta) + 1)))
@@ -0,0 +1,305 @@
+#!/usr/bin/python3
+"""
+serial_daemon.py  -  log many serial instruments from one process
+
+Replaces the one-script-per-instrument loggers (serial_log.py, FMES-log.py,
+readSerial.py, SerialLog-Even10s.py, PMS5003_log.py, DXL360S-TiltMeter-Log.py ...)
+with a single asyncio event loop that reads every configured port without
+blocking. Each port is one [section] of an INI file, see serial_daemon.ini.
+
+Per-port options:
+  port, baud            serial device and speed
+  parser                line:   text lines ending in \\n
+                        fixed:  fixed-length ASCII records starting with a sync
+                                byte, eg. DXL360S "X-0005Y-0001" (reclen, sync,
+                                pattern, scale)
+                        binary: fixed-length binary records (format = struct
+                                format like >15i, optional sync = hex bytes)
+  decimate              keep only every Nth record
+  average               average N numeric records into one output line
+  timestamp             prefix each line with: none, iso, epoch
+  minute_marks          write "# <date time>" at the top of each minute
+  skip                  discard this many records after opening the port
+  init                  line sent after opening, {epoch} = current Unix time
+  logfile               output file name, strftime() codes allowed
+  header                CSV column header line
+  flush_lines, flush_bytes, flush_secs
+                        flush the log after this many lines or bytes, or when
+                        the oldest unflushed line is flush_secs old (logwriter.py)
+  fsync_secs            fsync after a flush at most this often (unset = never)
+
+Usage: serial_daemon.py [config.ini]
+"""
+
+import asyncio
+import configparser
+import datetime
+import os
+import re
+import signal
+import struct
+import sys
+import time
+
+import serial
+from logwriter import LogWriter
+
+VERSION = "serial_daemon v0.2"
+RETRY_SEC = 5.0          # wait this long before reopening a failed port
+
+
+class LineParser:
+    """Text lines; output is the line without whitespace or NUL bytes."""
+    def __init__(self, cfg):
+        self.buf = bytearray()
+
+    def feed(self, data):
+        self.buf += data
+        out = []
+        while True:
+            i = self.buf.find(b"\n")
+            if i < 0:
+                break
+            line = self.buf[:i].decode("utf-8", errors="ignore").strip().strip("\0")
+            del self.buf[:i+1]
+            if line:
+                out.append(line)
+        return out
+
+
+class FixedParser:
+    """Fixed-length ASCII records beginning with a sync character."""
+    def __init__(self, cfg):
+        self.reclen = cfg.getint("reclen")
+        self.sync = cfg.get("sync", "").encode()
+        pattern = cfg.get("pattern", "")
+        self.pattern = re.compile(pattern) if pattern else None
+        self.scale = cfg.getfloat("scale", 1.0)
+        self.errors = 0          # records that did not match pattern
+        self.buf = bytearray()
+
+    def feed(self, data):
+        self.buf += data
+        out = []
+        while True:
+            if self.sync:
+                i = self.buf.find(self.sync)
+                if i < 0:
+                    self.buf.clear()
+                    break
+                del self.buf[:i]
+            if len(self.buf) < self.reclen:
+                break
+            rec = self.buf[:self.reclen].decode("ascii", errors="ignore")
+            if self.pattern is None:
+                out.append(rec.strip())
+                del self.buf[:self.reclen]
+                continue
+            m = self.pattern.fullmatch(rec)
+            if m is None:
+                self.errors += 1
+                del self.buf[:1]     # misaligned, look for the next sync
+                continue
+            out.append(",".join("%g" % (int(g) * self.scale) for g in m.groups()))
+            del self.buf[:self.reclen]
+        return out
+
+
+class BinaryParser:
+    """Fixed-length binary records described by a struct format string."""
+    def __init__(self, cfg):
+        self.fmt = struct.Struct(cfg.get("format"))
+        self.sync = bytes.fromhex(cfg.get("sync", ""))
+        self.reclen = len(self.sync) + self.fmt.size
+        self.buf = bytearray()
+
+    def feed(self, data):
+        self.buf += data
+        out = []
+        while True:
+            if self.sync:
+                i = self.buf.find(self.sync)
+                if i < 0:
+                    del self.buf[:max(0, len(self.buf) - len(self.sync) + 1)]
+                    break
+                del self.buf[:i]
+            if len(self.buf) < self.reclen:
+                break
+            vals = self.fmt.unpack_from(self.buf, len(self.sync))
+            out.append(",".join(map(str, vals)))
+            del self.buf[:self.reclen]
+        return out
+
+
+PARSERS = {"line": LineParser, "fixed": FixedParser, "binary": BinaryParser}
+
+
+class PortLogger:
+    """Read one serial port, parse, decimate/average and log its records."""
+    def __init__(self, name, cfg):
+        self.name = name
+        self.port = cfg.get("port")
+        self.baud = cfg.getint("baud", 9600)
+        self.parserName = cfg.get("parser", "line")
+        if self.parserName not in PARSERS:
+            raise ValueError("[%s] unknown parser %r. Choose from: %s"
+                             % (name, self.parserName, ", ".join(PARSERS)))
+        self.cfg = cfg
+        self.decimate = cfg.getint("decimate", 1)
+        self.average = cfg.getint("average", 0)
+        self.timestamp = cfg.get("timestamp", "none")
+        self.minuteMarks = cfg.getboolean("minute_marks", False)
+        self.skip = cfg.getint("skip", 0)
+        self.init = cfg.get("init", "")
+        self.flushLines = cfg.getint("flush_lines", 100)
+        self.flushBytes = cfg.getint("flush_bytes", 64*1024)
+        self.flushSecs = cfg.getfloat("flush_secs", 60.0)
+        fsync = cfg.get("fsync_secs", "")
+        self.fsyncSecs = float(fsync) if fsync else None
+        logdir = cfg.get("logdir", ".")
+        fname = datetime.datetime.now().strftime(cfg.get("logfile", name + "_%Y%m%d_%H%M%S.csv"))
+        self.logPath = os.path.join(logdir, fname)
+        self.header = cfg.get("header", "")
+
+        self.ser = None
+        self.f = None
+        self.records = 0          # records received
+        self.lines = 0            # lines written
+        self.oldMinute = None
+        self.avgSum = None
+        self.avgCount = 0
+
+    def openLog(self):
+        self.f = LogWriter(self.logPath, "a", flush_lines=self.flushLines,
+                           flush_bytes=self.flushBytes, max_latency=self.flushSecs,
+                           fsync_secs=self.fsyncSecs)
+        if self.header:
+            self.f.write("%s\n" % self.header)
+        self.f.write("# Start: %s\n" % datetime.datetime.now())
+        self.f.write("# %s  [%s] %s %d baud, parser: %s\n"
+                     % (VERSION, self.name, self.port, self.baud, self.parserName))
+        self.f.flush()
+        print("[%s] logging %s to %s" % (self.name, self.port, self.logPath))
+
+    def openPort(self):
+        self.ser = serial.Serial(self.port, self.baud, timeout=0)   # non-blocking reads
+        self.ser.reset_input_buffer()
+        self.parser = PARSERS[self.parserName](self.cfg)
+        self.toSkip = self.skip
+        if self.init:
+            self.ser.write((self.init.format(epoch=int(time.time())) + "\n").encode())
+        print("[%s] opened %s" % (self.name, self.port))
+
+    def closePort(self):
+        if self.ser is not None and self.ser.is_open:
+            self.ser.close()
+        self.ser = None
+
+    def writeLine(self, s):
+        if self.minuteMarks:
+            m = int(time.time() / 60.0)
+            if m != self.oldMinute:
+                self.f.write("# %s\n" % datetime.datetime.now())
+                self.oldMinute = m
+        if self.timestamp == "iso":
+            s = str(datetime.datetime.now()) + ", " + s
+        elif self.timestamp == "epoch":
+            s = "%.3f, %s" % (time.time(), s)
+        self.f.write(s)
+        self.f.write("\n")
+        self.lines += 1
+
+    def handle(self, rec):
+        """One parsed record: skip, decimate, average, then write."""
+        if self.toSkip > 0:
+            self.toSkip -= 1
+            return
+        self.records += 1
+        if (self.records % self.decimate) != 0:
+            return
+        if self.average > 1:
+            try:
+                vals = [float(v) for v in rec.split(",")]
+            except ValueError:
+                print("[%s] non-numeric record: %s" % (self.name, rec))
+                return
+            if self.avgSum is None or len(vals) != len(self.avgSum):
+                self.avgSum = [0.0] * len(vals)
+                self.avgCount = 0
+            self.avgSum = [a + v for a, v in zip(self.avgSum, vals)]
+            self.avgCount += 1
+            if self.avgCount < self.average:
+                return
+            rec = ",".join("%.4f" % (a / self.avgCount) for a in self.avgSum)
+            self.avgSum = None
+        self.writeLine(rec)
+
+    async def readLoop(self):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        fd = self.ser.fileno()
+
+        def readable():
+            try:
+                chunks.put_nowait(self.ser.read(self.ser.in_waiting or 1))
+            except Exception as e:      # port unplugged etc.
+                loop.remove_reader(fd)
+                chunks.put_nowait(e)
+
+        loop.add_reader(fd, readable)
+        try:
+            while True:
+                data = await chunks.get()
+                if isinstance(data, Exception):
+                    raise data
+                for rec in self.parser.feed(data):
+                    self.handle(rec)
+        finally:
+            loop.remove_reader(fd)
+
+    async def run(self):
+        self.openLog()
+        try:
+            while True:
+                try:
+                    self.openPort()
+                    await self.readLoop()
+                except (serial.SerialException, OSError) as e:
+                    print("[%s] %s error: %s, retry in %.0f s" % (self.name, self.port, e, RETRY_SEC))
+                    self.f.write("# %s serial error: %s\n" % (datetime.datetime.now(), e))
+                self.closePort()
+                self.f.flush()
+                await asyncio.sleep(RETRY_SEC)
+        finally:
+            self.closePort()
+            if self.f is not None:
+                self.f.close()      # flush + fsync (if fsync_secs set)
+                print("[%s] %d records, %d lines written to %s"
+                      % (self.name, self.records, self.lines, self.logPath))
+
+
+def load_config(path):
+    cfg = configparser.ConfigParser(interpolation=None)   # keep % for strftime in logfile
+    if not cfg.read(path):
+        raise FileNotFoundError("Config file not found: %s" % path)
+    return [PortLogger(name, cfg[name]) for name in cfg.sections()]
+
+
+async def main(path):
+    loggers = load_config(path)
+    if not loggers:
+        print("No ports configured in %s" % path)
+        return
+    print("%s: %d ports" % (VERSION, len(loggers)))
+    tasks = [asyncio.create_task(p.run()) for p in loggers]
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: [t.cancel() for t in tasks])
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    config = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "serial_daemon.ini")
+    asyncio.run(main(config))
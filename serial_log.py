@@ -4,15 +4,16 @@
 
 # tested with Python 3.6.5 (default, Apr  1 2018, 05:46:30) 
 import serial, datetime, time
+from logwriter import LogWriter
 
 logfile='log.csv'      # where to write log file
 device='/dev/ttyACM0'  # Teensy 3.2
 
 FLIM = 100  # flush buffer after writing this many lines
+FSEC = 60   # ... or when the oldest unwritten line is this many seconds old
 
-f = open(logfile, 'w')
+f = LogWriter(logfile, 'w', flush_lines=FLIM, max_latency=FSEC)
 
-fctr = 8  # saved-line counter (flush buffer after FLIM lines)
 pctr = 5  # sample decimation counter 
 firstline = 1  # have not yet finished the first line
 
@@ -40,8 +41,4 @@ with serial.Serial(device, 115200, timeout=10) as ser:
         oldm=m
 
       f.write(s)
-      fctr += 1
-      if (fctr > FLIM):
-        f.flush()
-        fctr = 0
       # print(s,end='')
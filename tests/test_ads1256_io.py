@@ -0,0 +1,135 @@
+import binascii
+import struct
+
+import numpy as np
+import pytest
+
+import ads1256_io
+from ads1256_io import FrameParser
+
+WORDS = 15
+
+
+def frame(seq, payload):
+    """One framed "K" packet: A5 5A | seq16 | payload | crc16, as the firmware sends it."""
+    body = struct.pack('>H', seq & 0xFFFF) + payload
+    return ads1256_io.SYNC + body + struct.pack('>H', binascii.crc_hqx(body, 0))
+
+
+def payloads(n):
+    """Packet payloads of small word values, so no A5 5A turns up inside the data."""
+    words = np.arange(n * WORDS, dtype='>i4').reshape(n, WORDS) % 1000
+    return [w.tobytes() for w in words]
+
+
+def feed_pieces(parser, stream, seed=0):
+    """Feed the stream in random-size reads, like ser.read(in_waiting)."""
+    rng = np.random.default_rng(seed)
+    out = []
+    i = 0
+    while i < len(stream):
+        n = int(rng.integers(1, 200))
+        out += parser.feed(stream[i:i+n])
+        i += n
+    return out
+
+
+def test_clean_stream():
+    pl = payloads(100)
+    p = FrameParser(WORDS)
+    assert feed_pieces(p, b"".join(frame(i, x) for i, x in enumerate(pl))) == pl
+    assert (p.packets, p.lost, p.seqGaps, p.resyncs, p.crcErrors, p.skipped) == (100, 0, 0, 0, 0, 0)
+
+
+def test_dropped_byte():
+    pl = payloads(100)
+    frames = [frame(i, x) for i, x in enumerate(pl)]
+    frames[50] = frames[50][:30] + frames[50][31:]     # one byte lost on the link
+    p = FrameParser(WORDS)
+    out = feed_pieces(p, b"".join(frames))
+    assert out == pl[:50] + pl[51:]
+    assert (p.packets, p.lost, p.seqGaps, p.resyncs, p.crcErrors) == (99, 1, 1, 1, 1)
+
+
+def test_corrupted_crc():
+    pl = payloads(20)
+    frames = [frame(i, x) for i, x in enumerate(pl)]
+    frames[7] = frames[7][:-1] + bytes([frames[7][-1] ^ 0xFF])
+    p = FrameParser(WORDS)
+    out = feed_pieces(p, b"".join(frames))
+    assert out == pl[:7] + pl[8:]
+    assert (p.packets, p.lost, p.crcErrors) == (19, 1, 1)
+
+
+def test_sequence_wraparound():
+    pl = payloads(6)
+    p = FrameParser(WORDS)
+    seqs = [65533, 65534, 65535, 0, 1, 2]
+    assert p.feed(b"".join(frame(s, x) for s, x in zip(seqs, pl))) == pl
+    assert (p.lost, p.seqGaps) == (0, 0)
+    p.feed(frame(5, pl[0]))                            # 3 and 4 missing
+    assert (p.lost, p.seqGaps) == (2, 1)
+    q = FrameParser(WORDS)
+    q.feed(frame(65535, pl[0]) + frame(1, pl[1]))      # 0 missing, across the wrap
+    assert (q.lost, q.seqGaps) == (1, 1)
+
+
+def test_unframed():
+    pl = payloads(10)
+    p = FrameParser(WORDS, framed=False)
+    assert feed_pieces(p, b"".join(pl)) == pl
+
+
+def test_npy_append_then_reload(tmp_path):
+    stem = str(tmp_path / "20250524-1200_adc1256-log2")
+    pl = payloads(600)
+    pkts = np.frombuffer(b"".join(pl), dtype=np.uint8).reshape(len(pl), -1)
+    epochs = 1.7e9 + np.arange(len(pl)) * 0.1
+    log = ads1256_io.BinaryLog(stem, "test", WORDS, ["note"])
+    log.write(epochs[0], pl[0])
+    log.write_block(epochs[1:400], pkts[1:400])        # crosses FLUSH_ROWS: header rewritten
+    partial = np.load(stem + "_counts.npy", mmap_mode='r')
+    assert len(partial) == log.counts.rows - log.unflushed   # readable while still open
+    log.write_block(epochs[400:], pkts[400:])
+    log.close()
+    counts = np.load(stem + "_counts.npy")
+    assert counts.dtype == np.dtype('>i4') and counts.shape == (600, WORDS)
+    assert np.array_equal(counts, pkts.view('>i4'))
+    assert np.array_equal(np.load(stem + "_epoch.npy"), epochs)
+    csv, n = ads1256_io.npy_to_csv(stem + "_counts.npy")
+    assert n == 600
+    rows = np.loadtxt(csv, delimiter=",", comments="#", skiprows=1)
+    assert np.array_equal(rows[:, 1:], counts)
+
+
+def test_npy_appender_rejects_partial_rows(tmp_path):
+    a = ads1256_io.NpyAppender(str(tmp_path / "x.npy"), '<i4', (3,))
+    a.append(np.zeros(6, dtype='<i4'))
+    with pytest.raises(ValueError):
+        a.append(b"\0" * 5)
+    a.close()
+    assert np.load(str(tmp_path / "x.npy")).shape == (2, 3)
+
+
+def test_stats_reducer_windows():
+    rng = np.random.default_rng(4)
+    epochs = 1000.0 + np.cumsum(rng.uniform(0.05, 0.3, 200))
+    volts = rng.normal(0, 1e-3, (200, WORDS))
+    red = ads1256_io.StatsReducer(2)
+    rows = []
+    for i in range(0, 200, 17):                        # blocks that split windows
+        rows += red.add(epochs[i:i+17], volts[i:i+17])
+    rows += red.flush()
+    keys = np.floor(epochs / 2)
+    assert len(rows) == len(np.unique(keys))
+    for t, avg, std, vmin, vmax in rows:
+        v = volts[keys == t / 2].ravel()
+        assert np.allclose((avg, std, vmin, vmax), (v.mean(), v.std(), v.min(), v.max()))
+    assert red.flush() == []
+
+
+def test_stats_reducer_per_packet():
+    volts = np.arange(2 * WORDS, dtype=float).reshape(2, WORDS)
+    rows = ads1256_io.StatsReducer(0).add([1.0, 2.0], volts)
+    assert [r[0] for r in rows] == [1.0, 2.0]
+    assert np.allclose(rows[1][1:], (volts[1].mean(), volts[1].std(), volts[1].min(), volts[1].max()))
@@ -0,0 +1,66 @@
+import numpy as np
+
+from event_catalog import EventCatalog, read_event_csv
+from seisCSVproc import coincidences
+
+T0 = 1587254400.0          # 2020-04-19 00:00 UTC
+
+
+def info(station, day=110):
+    return {"file": "AM.%s.00.EHZ.D.2020.%d" % (station, day), "station": station,
+            "channel": "EHZ", "starttime": T0 + (day - 110) * 86400}
+
+
+def test_insert_query_counts(tmp_path):
+    with EventCatalog(str(tmp_path / "events.sqlite")) as cat:
+        # (num, start minute, Max, dur s)
+        assert cat.add_file(info("R79D5"), [(1, 10.0, 6.6, 8.0), (2, 70.0, 7.4, 12.0),
+                                            (4, 75.0, 6.9, 6.0)], 6.55) == 3
+        cat.add_file(info("RF7DC"), [(1, 10.1, 6.5, 7.0)], 6.45)
+        rows = cat.query()
+        assert [(r[0], r[2]) for r in rows] == [("R79D5", T0 + 600), ("RF7DC", T0 + 606),
+                                               ("R79D5", T0 + 4200), ("R79D5", T0 + 4500)]
+        assert len(cat.query(T0 + 3600, T0 + 7200)) == 2            # [t0, t1)
+        assert len(cat.query(T0, T0 + 4200)) == 2
+        assert [r[3] for r in cat.query(stations=["R79D5"], mag_min=6.8)] == [7.4, 6.9]
+        assert len(cat.query(dur_min=7.0, dur_max=8.0)) == 2
+        assert cat.counts("hour") == [(T0, "R79D5", 1, 6.6, 8.0), (T0, "RF7DC", 1, 6.5, 7.0),
+                                      (T0 + 3600, "R79D5", 2, 7.15, 9.0)]
+        # reprocessing a file replaces its events
+        cat.add_file(info("R79D5"), [(1, 20.0, 7.0, 9.0)], 6.55)
+        assert len(cat.query(stations=["R79D5"])) == 1
+        assert cat.stations() == ["R79D5", "RF7DC"]
+    with EventCatalog(str(tmp_path / "events.sqlite")) as cat:     # reopened: still there
+        t, mag, dur = cat.times("RF7DC")
+        assert list(t) == [T0 + 606] and list(mag) == [6.5]
+
+
+def test_import_csv(tmp_path):
+    csv = tmp_path / "R79D5.2020.110.csv"
+    csv.write_text("num,  start(m),  Max,  dur(s)\n"
+                   "# AM.R79D5.00.EHZ.D.2020.110 2020-04-19T00:00:00.000000Z\n"
+                   "# Processed at 2026-10-18T12:00:00-07:00 vThresh: 6.550\n"
+                   "001, 10.00,  6.6, 8.0\n"
+                   "003, 70.00,  7.4, 12.0\n"
+                   "# AM.R79D5.00.EHZ.D.2020.110 2020-04-19T00:00:00.000000Z \n"
+                   "# Events: 2 avg:10.000 std:2.000\n")
+    inf, events = read_event_csv(str(csv))
+    assert inf["station"] == "R79D5" and inf["vThresh"] == 6.55 and inf["starttime"] == T0
+    assert events == [(1, 10.0, 6.6, 8.0), (3, 70.0, 7.4, 12.0)]
+    with EventCatalog(str(tmp_path / "events.sqlite")) as cat:
+        assert cat.import_csv([str(tmp_path)], verbose=False) == (1, 2)
+
+
+def test_k_of_n_from_catalog(tmp_path):
+    # a car seen by all 3 stations, one by 2 of them, one by a single station
+    with EventCatalog(str(tmp_path / "events.sqlite")) as cat:
+        cat.add_file(info("A"), [(1, 10.0, 7.0, 10.0), (2, 30.0, 7.0, 10.0), (3, 50.0, 7.0, 10.0)])
+        cat.add_file(info("B"), [(1, 10.0 + 2/60, 7.0, 10.0), (2, 30.0 - 1/60, 7.0, 10.0)])
+        cat.add_file(info("C"), [(1, 10.0 + 3/60, 7.0, 10.0)])
+        events = [cat.times(s, T0, T0 + 86400) for s in ("A", "B", "C")]
+    tA, idx, dt = coincidences(events, 3)
+    assert [tuple(r) for r in idx] == [(0, 0, 0)]
+    assert tA[0] == T0 + 600 and np.allclose(dt[0], [0, 2, 3])
+    tA, idx, dt = coincidences(events, 2)
+    assert [tuple(r) for r in idx] == [(0, 0, 0), (1, 1, -1)]
+    assert np.allclose(tA - T0, [600, 1799])
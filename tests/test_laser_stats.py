@@ -0,0 +1,48 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+_path = os.path.join(os.path.dirname(__file__), "..", "laser-distance-meter.py")
+_spec = importlib.util.spec_from_file_location("laser_distance_meter", _path)
+ldm = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(ldm)
+
+
+def readings(n, seed=6):
+    """Irregular timestamps (with a dropout), distances around 2.5 m."""
+    rng = np.random.default_rng(seed)
+    dt = rng.uniform(0.05, 0.4, n)
+    dt[n // 2] = 30.0                                # long gap empties the window
+    return np.cumsum(dt), 2.5 + rng.normal(0, 0.002, n) + 0.001 * np.sin(np.arange(n) / 50)
+
+
+@pytest.mark.parametrize("span", [1.0, 10.0])
+def test_rolling_stats_brute_force(span, monkeypatch):
+    monkeypatch.setattr(ldm.RollingStats, "RESYNC", 500)   # exercise the resync too
+    ts, xs = readings(3000)
+    rs = ldm.RollingStats(span)
+    for i, (t, x) in enumerate(zip(ts, xs)):
+        rs.add(t, x)
+        w = xs[(ts > t - span) & (ts <= t)]
+        assert len(rs) == len(w)
+        assert rs.mean == pytest.approx(w.mean(), abs=1e-12)
+        assert rs.std() == pytest.approx(w.std(ddof=1) if len(w) > 1 else 0.0, abs=1e-9)
+        assert rs.range() == w.max() - w.min()
+        assert rs.maxq[0][1] == w.max() and rs.minq[0][1] == w.min()
+
+
+def test_rolling_trend_brute_force():
+    ts, xs = readings(2000, seed=7)
+    tr = ldm.RollingTrend(20.0)
+    for t, x in zip(ts, xs):
+        tr.add(t, x)
+        m = (ts > t - 20.0) & (ts <= t)
+        if m.sum() < 2:
+            assert tr.slope() is None
+            continue
+        slope = np.polyfit(ts[m] - ts[m][0], xs[m], 1)[0]
+        # running sums lose a few digits to cancellation: allow 1e-8 m/s (0.2 um per window)
+        assert tr.slope() == pytest.approx(slope, abs=1e-8)
+        assert tr.trend() == pytest.approx(slope * 20.0, abs=2e-7)
@@ -0,0 +1,40 @@
+import time
+
+import logwriter
+from logwriter import LogWriter
+
+
+def wait_for(cond, secs=3.0):
+    t0 = time.monotonic()
+    while not cond() and time.monotonic() - t0 < secs:
+        time.sleep(0.02)
+    return cond()
+
+
+def test_idle_data_is_fsynced(tmp_path, monkeypatch):
+    # one event, then nothing more: the timer must still fsync it
+    synced = []
+    monkeypatch.setattr(logwriter.os, "fsync", synced.append)
+    f = LogWriter(str(tmp_path / "log.csv"), "w", flush_lines=None,
+                  max_latency=0.1, fsync_secs=0.3)
+    try:
+        f.write("1, 2, 3\n")
+        assert wait_for(lambda: f.oldest is None)   # flushed by the latency timer
+        assert wait_for(lambda: synced)             # and fsync'd without another write
+        assert not f.unsynced
+    finally:
+        f.close()
+
+
+def test_fsync_rate_limited(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(logwriter.os, "fsync", synced.append)
+    f = LogWriter(str(tmp_path / "log.csv"), "w", flush_lines=1,
+                  max_latency=None, fsync_secs=60)
+    try:
+        for i in range(20):
+            f.write("%d\n" % i)
+        assert synced == []
+    finally:
+        f.close()
+    assert len(synced) == 1                         # close always fsyncs
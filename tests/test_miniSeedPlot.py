@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from scipy.signal import welch
+
+from miniSeedPlot import get_window, psd_welch
+
+
+def test_psd_welch_matches_scipy():
+    data = np.random.default_rng(0).normal(0, 100, 50000)
+    f, p = psd_welch(data, 100.0, nperseg=4096, block=3)
+    f2, p2 = welch(data, 100.0, window=get_window('hann', 4096), nperseg=4096)
+    assert np.allclose(f, f2)
+    assert np.allclose(p, p2)
+
+
+@pytest.mark.parametrize("n", [1, 3, 100])
+def test_psd_welch_short_input(n):
+    data = np.random.default_rng(1).normal(0, 100, n)
+    f, p = psd_welch(data, 100.0)               # nperseg shortened to n
+    f2, p2 = welch(data, 100.0, window=get_window('hann', n), nperseg=n)
+    assert len(f) == n // 2 + 1
+    assert np.allclose(p, p2)
+
+
+def test_psd_welch_rejects_empty():
+    with pytest.raises(ValueError):
+        psd_welch(np.array([]), 100.0)
+
+
+@pytest.mark.parametrize("n", [2, 7, 9])
+def test_psd_welch_smooth_short_spectrum(n):
+    # fewer bins than the smoothing width: smoothed over all the bins instead of raising
+    data = np.random.default_rng(2).normal(0, 100, n)
+    f, p = psd_welch(data, 100.0, nperseg=n, window_type=None, smooth=5)
+    assert len(p) == len(f) == n // 2 + 1
+    assert np.all(np.isfinite(p))
+
+
+def test_plotLogLog_short_trace():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import miniSeedPlot
+    fig, miniSeedPlot.ax = plt.subplots()
+    try:
+        miniSeedPlot.plotLogLog(np.random.default_rng(3).normal(0, 100, 6), 100.0, 1)
+        assert len(miniSeedPlot.ax.lines) == 1
+    finally:
+        plt.close(fig)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy.ndimage import uniform_filter1d
+
+import movavg
+
+
+@pytest.fixture(scope="module")
+def series():
+    rng = np.random.default_rng(5)
+    return {"float": rng.normal(1e6, 1.0, 20000),                     # large DC offset
+            "int32": rng.integers(-2**31, 2**31 - 1, 20000).astype(np.int32)}
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, 50, 51, 1000])
+@pytest.mark.parametrize("mode", ["reflect", "nearest", "mirror"])
+@pytest.mark.parametrize("kind", ["float", "int32"])
+def test_boxcar_matches_uniform_filter1d(series, n, mode, kind):
+    x = series[kind]
+    ref = uniform_filter1d(x.astype(np.float64), n, mode=mode)
+    for sequential in (False, True):
+        out = movavg.boxcar(x, n, mode, sequential=sequential)
+        assert out.dtype == np.float64
+        assert np.allclose(out, ref, rtol=0, atol=1e-6 * max(1.0, np.abs(x).max() / 1e6))
+
+
+@pytest.mark.parametrize("n", [2, 7, 50])
+def test_valid_and_hold(series, n):
+    x = series["float"]
+    L, R = n // 2, n - 1 - n // 2
+    ref = uniform_filter1d(x, n)[L:len(x) - R]
+    assert np.allclose(movavg.boxcar(x, n, "valid"), ref, rtol=0, atol=1e-6)
+    hold = movavg.boxcar(x, n, "hold")
+    assert np.allclose(hold[L:len(x) - R], ref, rtol=0, atol=1e-6)
+    assert np.all(hold[:L] == hold[L]) and np.all(hold[len(x) - R:] == hold[len(x) - R - 1])
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, 50, 51])
+@pytest.mark.parametrize("mode", ["reflect", "nearest", "valid"])
+def test_streaming_matches_whole(series, n, mode):
+    x = series["float"]
+    rng = np.random.default_rng(n)
+    cuts = np.sort(rng.integers(0, len(x), 200))
+    whole = movavg.boxcar(x, n, mode, sequential=True)
+    ma = movavg.MovingAverage(n, mode, sequential=True)
+    out = np.concatenate([ma.process(p) for p in np.split(x, cuts)] + [ma.flush()])
+    assert np.array_equal(out, whole)                  # bit for bit with sequential sums
+    ma = movavg.MovingAverage(n, mode)
+    out = np.concatenate([ma.process(p) for p in np.split(x, cuts)] + [ma.flush()])
+    assert np.allclose(out, whole, rtol=0, atol=1e-6)
+
+
+def test_short_stream():
+    x = np.arange(5.0)
+    ma = movavg.MovingAverage(50)
+    assert len(ma.process(x)) == 0
+    assert np.allclose(ma.flush(), movavg.boxcar(x, 5))
+
+
+def test_bad_window():
+    with pytest.raises(ValueError):
+        movavg.boxcar(np.arange(5.0), 6)
+    with pytest.raises(ValueError):
+        movavg.boxcar(np.arange(5.0), 0)
+    with pytest.raises(ValueError):
+        movavg.MovingAverage(5, "mirror")
@@ -0,0 +1,94 @@
+import numpy as np
+import obspy
+import pytest
+
+import RShake_EventFind as R
+
+
+@pytest.fixture(scope="module")
+def dayfile(tmp_path_factory):
+    """2 h of 100 Hz noise with 20 s, 14 Hz 'vehicles'; the noise floor triples halfway."""
+    rng = np.random.default_rng(1)
+    fs = 100.0
+    n = int(2 * 3600 * fs)
+    t = np.arange(n) / fs
+    floor = 200 * (1 + 2 * (t > 3600))
+    x = rng.normal(0, 1, n) * floor
+    for tc in np.arange(120, 2 * 3600 - 120, 240) + rng.uniform(-60, 60, 29):
+        i = int(tc * fs)
+        L = int(20 * fs)
+        x[i:i+L] += 8 * floor[i] * np.hanning(L) * np.sin(2 * np.pi * 14 * t[:L])
+    tr = obspy.Trace(x.astype(np.int32))
+    tr.stats.update(dict(network="AM", station="R79D5", location="00", channel="EHZ",
+                         sampling_rate=fs, starttime=obspy.UTCDateTime(2020, 4, 19)))
+    d = tmp_path_factory.mktemp("rshake")
+    fname = d / "AM.R79D5.00.EHZ.D.2020.110"
+    tr.write(str(fname), format="MSEED", reclen=512)
+    return str(fname), x.astype(np.int32)
+
+
+def feed_split(det, x, rng, maxlen):
+    """Feed x to a StreamDetector in random-size pieces, return all events."""
+    events = []
+    i = 0
+    while i < len(x):
+        n = int(rng.integers(1, maxlen))
+        events += det.feed(x[i:i+n])
+        i += n
+    return events + det.finish()
+
+
+def test_read_chunks_reads_every_sample(dayfile):
+    fname, x = dayfile
+    parts = [data for stats, data in R.read_chunks(fname, 7)]
+    assert len(parts) > 10
+    assert np.array_equal(np.concatenate(parts), x)
+
+
+def test_envelope_filter_any_split(dayfile):
+    _, data = dayfile
+    rng = np.random.default_rng(2)
+    for maxlen, npts in ((3, 30001), (977, len(data)), (200000, len(data))):
+        x = data[:npts]
+        whole = R.decimated_envelope(x, 100.0)
+        assert len(whole) == -(-len(x) // R.Drate)
+        ef = R.EnvelopeFilter(100.0)
+        parts = []
+        i = 0
+        while i < len(x):
+            n = int(rng.integers(1, maxlen))
+            parts.append(ef.process(x[i:i+n]))
+            i += n
+        parts.append(ef.flush())
+        assert np.array_equal(np.concatenate(parts), whole)
+
+
+@pytest.mark.parametrize("chunkmin", [60, 7, 1])
+@pytest.mark.parametrize("stalta", [None, R.staLta])
+def test_stream_matches_batch(dayfile, tmp_path, chunkmin, stalta):
+    fname, x = dayfile
+    vThresh = 6.3                   # log envelope: noise ~4.7 then ~5.8, events peak at ~7 / ~8
+    _, batch = R.process_file(fname, str(tmp_path), vThresh, verbose=False, stalta=stalta)
+    _, stream = R.process_stream(fname, str(tmp_path), vThresh, chunkmin, verbose=False, stalta=stalta)
+    assert len(batch) >= 25
+    assert stream == batch
+
+
+def test_near_threshold_events_identical(dayfile, tmp_path):
+    # thresholds exactly at log envelope values on event edges and peaks,
+    # where any difference in the last bit would move or split an event
+    fname, x = dayfile
+    M = int(int(100.0 / R.cutoff) / R.Drate)
+    envf = np.log(R.boxcar_filter(R.decimated_envelope(x, 100.0), M))
+    rng = np.random.default_rng(3)
+    peaks = np.flatnonzero((envf[1:-1] > envf[:-2]) & (envf[1:-1] >= envf[2:]) & (envf[1:-1] > 6.5)) + 1
+    picks = list(envf[rng.choice(peaks, 3, replace=False)])
+    edges = np.flatnonzero(np.diff((envf > 6.3).astype(np.int8)))
+    picks += list(envf[rng.choice(edges, 3, replace=False)])
+    found = 0
+    for vThresh in picks:
+        _, batch = R.process_file(fname, str(tmp_path), vThresh, verbose=False)
+        stream = feed_split(R.StreamDetector(100.0, vThresh), x, rng, 50000)
+        assert stream == batch
+        found += len(batch)
+    assert found > 0
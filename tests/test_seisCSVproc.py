@@ -0,0 +1,42 @@
+import numpy as np
+
+from seisCSVproc import coincidences
+
+
+def station(t, dur):
+    t = np.atleast_1d(np.asarray(t, dtype=float))
+    return t, np.zeros(len(t)), np.atleast_1d(np.asarray(dur, dtype=float))
+
+
+def groups(events, k):
+    tA, idx, dt = coincidences(events, k)
+    return [tuple(r) for r in idx], tA
+
+
+def test_mixed_durations_k3():
+    # A's own window (1 s) misses C, but C's window (5 s) sees A and B
+    events = [station(0.0, 2), station(0.5, 2), station(1.5, 10)]
+    idx, tA = groups(events, 3)
+    assert idx == [(0, 0, 0)]
+    assert tA[0] == 0.0
+
+
+def test_mixed_durations_k2_reports_largest_group_once():
+    events = [station(0.0, 2), station(0.5, 2), station(1.5, 10)]
+    idx, tA = groups(events, 2)
+    assert idx == [(0, 0, 0)]
+
+
+def test_separate_groups_and_dt():
+    events = [station([0.0, 100.0], [2, 2]), station([0.4, 100.2], [2, 2]),
+              station([50.0], [2])]
+    tA, idx, dt = coincidences(events, 2)
+    assert [tuple(r) for r in idx] == [(0, 0, -1), (1, 1, -1)]
+    assert np.allclose(tA, [0.0, 100.0])
+    assert np.allclose(dt[:, :2], [[0.0, 0.4], [0.0, 0.2]])
+    assert np.isnan(dt[:, 2]).all()
+
+
+def test_no_events():
+    tA, idx, dt = coincidences([station([], []), station([], [])], 2)
+    assert len(tA) == 0 and idx.shape == (0, 2)
@@ -23,6 +23,7 @@ import time
 from datetime import datetime
 import os       # to flush buffer to disk
 import math     # math.floor()
+from logwriter import LogWriter
 
 # ==============================================================
 
@@ -103,7 +104,8 @@ if __name__ == '__main__':
 
     cam = cv.VideoCapture(vidname)  # open a video file or stream
 
-    logf = open(logFname, 'a')
+    # events are written out within 5 sec and fsync'd within a minute, not once per event
+    logf = LogWriter(logFname, 'a', flush_lines=None, max_latency=5, fsync_secs=60)
     tnow = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
     print("%s Start: %s" % (CNAME,tnow))
     s = "%s Start: %s\n" % (CNAME,tnow)
@@ -239,8 +241,7 @@ if __name__ == '__main__':
                   logf.write(buf)
                   print(buf,end='')  # without extra newline
                   #print(buf)
-                  logf.flush()  # after event, actually write the buffered output to disk
-                  os.fsync(logf.fileno())      
+                  logf.flush()  # after event, hand the buffered output to the OS (fsync on schedule)
                   dt = time.strftime("%y%m%d_%H%M%S", tBest)
                   fname3 = fPrefix + dt + ".jpg"  # full-size image
                   fname4 = tPrefix + dt + ".png"  # thumbnail image
@@ -302,7 +303,5 @@ if __name__ == '__main__':
           #  show_vt = not show_vt
           #  print('VelThresh is', ['off', 'on'][show_vt])
             
-    logf.flush()  # after event, actually write the buffered output to disk
-    #os.fsync()            
-    logf.close()            
+    logf.close()            # final flush + fsync
     cv.destroyAllWindows()